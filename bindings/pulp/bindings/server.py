@@ -1,8 +1,12 @@
 from types import NoneType
 import base64
+import httplib
 import locale
 import logging
 import os
+import select
+import socket
+import threading
 import urllib
 try:
     import oauth2 as oauth
@@ -19,6 +23,10 @@ from pulp.common.constants import DEFAULT_CA_PATH
 from pulp.common.util import ensure_utf_8, encode_unicode
 
 
+# Requests that can be sent again without changing their effect on the server
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+
+
 class PulpConnection(object):
     """
     Stub for invoking methods against the Pulp server. By default, the
@@ -262,12 +270,22 @@ class HTTPSServerWrapper(object):
         :type pulp_connection: PulpConnection
         """
         self.pulp_connection = pulp_connection
+        # Each thread keeps its own connection to the server open between requests, so threads
+        # sharing a PulpConnection can make requests in parallel. The SSL context is shared; it
+        # is built on first use, and again whenever the SSL settings change.
+        self._local = threading.local()
+        self._ssl_context = None
+        self._ssl_settings = None
+        self._ssl_lock = threading.Lock()
 
     def request(self, method, url, body):
         """
         Make the request against the Pulp server, returning a tuple of (status_code, respose_body).
-        This method creates a new connection each time since HTTPSConnection has problems
-        reusing a connection for multiple calls (as claimed by a prior comment in this module).
+        The connection to the server is reused by subsequent requests, so only the first request
+        pays for the TCP and SSL handshakes. A connection that the server closed while it was idle
+        is replaced before the request is sent. If the server closes a reused connection anyway,
+        an idempotent request is sent again over a new one. Other requests are only sent again
+        if they could not be sent at all.
 
         :param method: The HTTP method to be used for the request (GET, POST, etc.)
         :type  method: str
@@ -283,34 +301,10 @@ class HTTPSServerWrapper(object):
         """
         headers = dict(self.pulp_connection.headers)  # copy so we don't affect the calling method
 
-        # Despite the confusing name, 'sslv23' configures m2crypto to use any available protocol in
-        # the underlying openssl implementation.
-        ssl_context = SSL.Context('sslv23')
-        # This restricts the protocols we are willing to do by configuring m2 not to do SSLv2.0 or
-        # SSLv3.0. EL 5 does not have support for TLS > v1.0, so we have to leave support for
-        # TLSv1.0 enabled.
-        ssl_context.set_options(m2.SSL_OP_NO_SSLv2 | m2.SSL_OP_NO_SSLv3)
-
-        if self.pulp_connection.verify_ssl:
-            ssl_context.set_verify(SSL.verify_peer, depth=100)
-            # We need to stat the ca_path to see if it exists (error if it doesn't), and if so
-            # whether it is a file or a directory. m2crypto has different directives depending on
-            # which type it is.
-            if os.path.isfile(self.pulp_connection.ca_path):
-                ssl_context.load_verify_locations(cafile=self.pulp_connection.ca_path)
-            elif os.path.isdir(self.pulp_connection.ca_path):
-                ssl_context.load_verify_locations(capath=self.pulp_connection.ca_path)
-            else:
-                # If it's not a file and it's not a directory, it's not a valid setting
-                raise exceptions.MissingCAPathException(self.pulp_connection.ca_path)
-        ssl_context.set_session_timeout(self.pulp_connection.timeout)
-
         if self.pulp_connection.username and self.pulp_connection.password:
             raw = ':'.join((self.pulp_connection.username, self.pulp_connection.password))
             encoded = base64.encodestring(raw)[:-1]
             headers['Authorization'] = 'Basic ' + encoded
-        elif self.pulp_connection.cert_filename:
-            ssl_context.load_cert(self.pulp_connection.cert_filename)
 
         # oauth configuration. This block is only True if oauth is not None, so it won't run on RHEL
         # 5.
@@ -331,28 +325,183 @@ class HTTPSServerWrapper(object):
             headers.update(oauth_header)
             headers['pulp-user'] = self.pulp_connection.oauth_user
 
-        connection = httpslib.HTTPSConnection(
-            self.pulp_connection.host, self.pulp_connection.port, ssl_context=ssl_context)
-
+        previous = getattr(self._local, 'connection', None)
+        connection = self._get_connection()
+        reused = connection is previous
         try:
-            # Request against the server
-            connection.request(method, url, body=body, headers=headers)
-            response = connection.getresponse()
+            try:
+                response = self._send(connection, method, url, body, headers)
+            except (httplib.BadStatusLine, httplib.CannotSendRequest, socket.error,
+                    SSL.SSLError), err:
+                # A connection that was idle may have been closed by the server. The request
+                # may have reached the server before the connection failed, so only a request
+                # that was not sent, or that can safely be repeated, is sent again.
+                self.close()
+                retry = method in IDEMPOTENT_METHODS or isinstance(err, httplib.CannotSendRequest)
+                if not (reused and retry):
+                    raise
+                connection = self._get_connection()
+                response = self._send(connection, method, url, body, headers)
+
+            # Attempt to deserialize the body (should pass unless the server is busted)
+            response_body = response.read()
         except SSL.SSLError, err:
-            # Translate stale login certificate to an auth exception
-            if 'sslv3 alert certificate expired' == str(err):
-                raise exceptions.ClientCertificateExpiredException(
-                    self.pulp_connection.cert_filename)
-            elif 'certificate verify failed' in str(err):
-                raise exceptions.CertificateVerificationException()
-            else:
-                raise exceptions.ConnectionException(None, str(err), None)
+            self.close()
+            self._raise_ssl_error(err)
+        except Exception:
+            self.close()
+            raise
 
-        # Attempt to deserialize the body (should pass unless the server is busted)
-        response_body = response.read()
+        if response.will_close:
+            self.close()
 
         try:
             response_body = json.loads(response_body)
         except:
             pass
         return response.status, response_body
+
+    def close(self):
+        """
+        Close the calling thread's connection to the server, if it is open. The next request
+        opens a new one.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _send(self, connection, method, url, body, headers):
+        """
+        Send a request over the given connection and get the server's response.
+
+        :param connection: connection to the server
+        :type  connection: M2Crypto.httpslib.HTTPSConnection
+        :param method:     The HTTP method to be used for the request (GET, POST, etc.)
+        :type  method:     str
+        :param url:        The Pulp URL to make the request against
+        :type  url:        str
+        :param body:       The body to pass with the request
+        :type  body:       str
+        :param headers:    The headers to send with the request
+        :type  headers:    dict
+        :return:           the response, whose body has not been read yet
+        :rtype:            httplib.HTTPResponse
+        """
+        # Request against the server
+        connection.request(method, url, body=body, headers=headers)
+        return connection.getresponse()
+
+    def _raise_ssl_error(self, err):
+        """
+        Translate an SSL error of a request into the matching bindings exception and raise it.
+
+        :param err: the error raised by the request
+        :type  err: M2Crypto.SSL.SSLError
+        :raises exceptions.ClientCertificateExpiredException: if the client certificate expired
+        :raises exceptions.CertificateVerificationException: if the server's certificate could
+                                                             not be verified
+        :raises exceptions.ConnectionException: for any other SSL error
+        """
+        # Translate stale login certificate to an auth exception
+        if 'sslv3 alert certificate expired' == str(err):
+            raise exceptions.ClientCertificateExpiredException(
+                self.pulp_connection.cert_filename)
+        elif 'certificate verify failed' in str(err):
+            raise exceptions.CertificateVerificationException()
+        else:
+            raise exceptions.ConnectionException(None, str(err), None)
+
+    def _get_connection(self):
+        """
+        Get the calling thread's connection to the server, creating it if it isn't open. The
+        SSL context is built once, and only built again if the SSL settings of the pulp
+        connection change.
+
+        :return: connection to the server
+        :rtype:  M2Crypto.httpslib.HTTPSConnection
+        """
+        ssl_settings = (self.pulp_connection.verify_ssl, self.pulp_connection.ca_path,
+                        self.pulp_connection.timeout, self._client_cert_filename())
+        with self._ssl_lock:
+            if ssl_settings != self._ssl_settings:
+                self._ssl_context = self._build_ssl_context()
+                self._ssl_settings = ssl_settings
+            ssl_context = self._ssl_context
+
+        if getattr(self._local, 'ssl_context', None) is not ssl_context:
+            # The connection was made with outdated SSL settings
+            self.close()
+        elif self._is_closed(getattr(self._local, 'connection', None)):
+            self.close()
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = httpslib.HTTPSConnection(
+                self.pulp_connection.host, self.pulp_connection.port, ssl_context=ssl_context)
+            self._local.ssl_context = ssl_context
+        return self._local.connection
+
+    @staticmethod
+    def _is_closed(connection):
+        """
+        Check whether the server has closed an idle connection. Nothing is expected from the
+        server between requests, so if the socket is readable, the server has either closed
+        the connection or sent something that is not the response to the next request.
+
+        :param connection: connection to the server, if any
+        :type  connection: M2Crypto.httpslib.HTTPSConnection or None
+        :return: True if the connection must not be used for another request
+        :rtype:  bool
+        """
+        sock = getattr(connection, 'sock', None)
+        if sock is None:
+            # Not connected yet
+            return False
+        try:
+            readable = select.select([sock], [], [], 0)[0]
+        except (select.error, socket.error, ValueError):
+            return True
+        return bool(readable)
+
+    def _client_cert_filename(self):
+        """
+        :return: the path to the client certificate to authenticate with, or None if basic
+                 authentication is used instead
+        :rtype:  str or None
+        """
+        if self.pulp_connection.username and self.pulp_connection.password:
+            return None
+        return self.pulp_connection.cert_filename
+
+    def _build_ssl_context(self):
+        """
+        Build the SSL context used to connect to the server.
+
+        :return: SSL context configured with the pulp connection's SSL settings
+        :rtype:  M2Crypto.SSL.Context
+        """
+        # Despite the confusing name, 'sslv23' configures m2crypto to use any available protocol in
+        # the underlying openssl implementation.
+        ssl_context = SSL.Context('sslv23')
+        # This restricts the protocols we are willing to do by configuring m2 not to do SSLv2.0 or
+        # SSLv3.0. EL 5 does not have support for TLS > v1.0, so we have to leave support for
+        # TLSv1.0 enabled.
+        ssl_context.set_options(m2.SSL_OP_NO_SSLv2 | m2.SSL_OP_NO_SSLv3)
+
+        if self.pulp_connection.verify_ssl:
+            ssl_context.set_verify(SSL.verify_peer, depth=100)
+            # We need to stat the ca_path to see if it exists (error if it doesn't), and if so
+            # whether it is a file or a directory. m2crypto has different directives depending on
+            # which type it is.
+            if os.path.isfile(self.pulp_connection.ca_path):
+                ssl_context.load_verify_locations(cafile=self.pulp_connection.ca_path)
+            elif os.path.isdir(self.pulp_connection.ca_path):
+                ssl_context.load_verify_locations(capath=self.pulp_connection.ca_path)
+            else:
+                # If it's not a file and it's not a directory, it's not a valid setting
+                raise exceptions.MissingCAPathException(self.pulp_connection.ca_path)
+        ssl_context.set_session_timeout(self.pulp_connection.timeout)
+
+        cert_filename = self._client_cert_filename()
+        if cert_filename:
+            ssl_context.load_cert(cert_filename)
+        return ssl_context
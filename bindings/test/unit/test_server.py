@@ -3,6 +3,7 @@ This module contains tests for the pulp.bindings.server module.
 """
 import locale
 import logging
+import socket
 import unittest
 
 from M2Crypto import m2, SSL
@@ -15,6 +16,12 @@ class TestHTTPSServerWrapper(unittest.TestCase):
     """
     This class contains tests for the HTTPSServerWrapper class.
     """
+    def setUp(self):
+        # Idle connections have nothing to read unless a test says otherwise
+        patcher = mock.patch('pulp.bindings.server.select.select', return_value=([], [], []))
+        self.select = patcher.start()
+        self.addCleanup(patcher.stop)
+
     @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection.request')
     def test_request_handles_untrusted_server_cert(self, request):
         """
@@ -75,6 +82,7 @@ class TestHTTPSServerWrapper(unittest.TestCase):
                 return '{}'
 
             status = 200
+            will_close = False
 
         getresponse.return_value = FakeResponse()
 
@@ -127,6 +135,7 @@ class TestHTTPSServerWrapper(unittest.TestCase):
                 return '{}'
 
             status = 200
+            will_close = False
 
         getresponse.return_value = FakeResponse()
 
@@ -160,6 +169,7 @@ class TestHTTPSServerWrapper(unittest.TestCase):
                 return '{"it": "worked!"}'
 
             status = 200
+            will_close = False
 
         getresponse.return_value = FakeResponse()
 
@@ -171,6 +181,206 @@ class TestHTTPSServerWrapper(unittest.TestCase):
         set_verify.assert_called_once_with(SSL.verify_peer, depth=100)
         load_verify_locations.assert_called_once_with(cafile=ca_path)
 
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    def test_request_reuses_connection(self, Context, HTTPSConnection):
+        """
+        Assert that the SSL context and the connection are created once for several requests.
+        """
+        conn = server.PulpConnection('host', verify_ssl=False)
+        wrapper = server.HTTPSServerWrapper(conn)
+        response = HTTPSConnection.return_value.getresponse.return_value
+        response.read.return_value = '{}'
+        response.status = 200
+        response.will_close = False
+
+        self.assertEqual(wrapper.request('GET', '/awesome/api/', ''), (200, {}))
+        self.assertEqual(wrapper.request('GET', '/awesome/api/', ''), (200, {}))
+
+        Context.assert_called_once_with('sslv23')
+        HTTPSConnection.assert_called_once_with('host', 443, ssl_context=Context.return_value)
+        self.assertEqual(HTTPSConnection.return_value.request.call_count, 2)
+        self.assertEqual(HTTPSConnection.return_value.close.call_count, 0)
+
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    def test_request_will_close(self, Context, HTTPSConnection):
+        """
+        Assert that the connection is not reused when the server closes it.
+        """
+        conn = server.PulpConnection('host', verify_ssl=False)
+        wrapper = server.HTTPSServerWrapper(conn)
+        response = HTTPSConnection.return_value.getresponse.return_value
+        response.read.return_value = '{}'
+        response.status = 200
+        response.will_close = True
+
+        wrapper.request('GET', '/awesome/api/', '')
+        wrapper.request('GET', '/awesome/api/', '')
+
+        Context.assert_called_once_with('sslv23')
+        self.assertEqual(HTTPSConnection.call_count, 2)
+        self.assertEqual(HTTPSConnection.return_value.close.call_count, 2)
+
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    def test_request_reconnects(self, Context, HTTPSConnection):
+        """
+        Assert that a request is sent again over a new connection when the server has closed the
+        reused one.
+        """
+        conn = server.PulpConnection('host', verify_ssl=False)
+        wrapper = server.HTTPSServerWrapper(conn)
+        response = mock.MagicMock(status=200, will_close=False)
+        response.read.return_value = '{}'
+        connection = HTTPSConnection.return_value
+        connection.getresponse.side_effect = [response, server.httplib.BadStatusLine(''),
+                                              response]
+
+        wrapper.request('GET', '/awesome/api/', '')
+        status, body = wrapper.request('PUT', '/awesome/api/', 'data')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(HTTPSConnection.call_count, 2)
+        connection.close.assert_called_once_with()
+        self.assertEqual(connection.request.mock_calls[1:],
+                         [mock.call('PUT', '/awesome/api/', body='data', headers=mock.ANY)] * 2)
+
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    def test_request_reconnects_ssl_error(self, Context, HTTPSConnection):
+        """
+        Assert that an SSL error on a reused connection is handled like a socket error.
+        """
+        conn = server.PulpConnection('host', verify_ssl=False)
+        wrapper = server.HTTPSServerWrapper(conn)
+        response = mock.MagicMock(status=200, will_close=False)
+        response.read.return_value = '{}'
+        connection = HTTPSConnection.return_value
+        connection.getresponse.side_effect = [response, SSL.SSLError('unexpected eof'),
+                                              response]
+
+        wrapper.request('GET', '/awesome/api/', '')
+        status, body = wrapper.request('GET', '/awesome/api/', '')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(HTTPSConnection.call_count, 2)
+        self.assertEqual(connection.request.call_count, 3)
+
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    def test_request_post_not_retried(self, Context, HTTPSConnection):
+        """
+        Assert that a POST that may have reached the server is not sent again.
+        """
+        conn = server.PulpConnection('host', verify_ssl=False)
+        wrapper = server.HTTPSServerWrapper(conn)
+        response = mock.MagicMock(status=200, will_close=False)
+        response.read.return_value = '{}'
+        connection = HTTPSConnection.return_value
+        connection.getresponse.side_effect = [response, server.httplib.BadStatusLine('')]
+
+        wrapper.request('GET', '/awesome/api/', '')
+        self.assertRaises(server.httplib.BadStatusLine, wrapper.request, 'POST', '/awesome/api/',
+                          'data')
+
+        self.assertEqual(connection.request.call_count, 2)
+        connection.close.assert_called_once_with()
+
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    def test_request_post_not_sent_retried(self, Context, HTTPSConnection):
+        """
+        Assert that a POST that could not be sent over a reused connection is sent again.
+        """
+        conn = server.PulpConnection('host', verify_ssl=False)
+        wrapper = server.HTTPSServerWrapper(conn)
+        response = mock.MagicMock(status=200, will_close=False)
+        response.read.return_value = '{}'
+        connection = HTTPSConnection.return_value
+        connection.request.side_effect = [None, server.httplib.CannotSendRequest(), None]
+        connection.getresponse.return_value = response
+
+        wrapper.request('GET', '/awesome/api/', '')
+        status, body = wrapper.request('POST', '/awesome/api/', 'data')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(HTTPSConnection.call_count, 2)
+        self.assertEqual(connection.request.call_count, 3)
+
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    def test_request_post_after_server_closed(self, Context, HTTPSConnection):
+        """
+        Assert that a POST is sent over a new connection when the server closed the idle one.
+        """
+        conn = server.PulpConnection('host', verify_ssl=False)
+        wrapper = server.HTTPSServerWrapper(conn)
+        response = mock.MagicMock(status=200, will_close=False)
+        response.read.return_value = '{}'
+        connection = HTTPSConnection.return_value
+        connection.getresponse.return_value = response
+
+        wrapper.request('GET', '/awesome/api/', '')
+        # The server closes the connection, so the socket is readable at EOF
+        self.select.return_value = ([connection.sock], [], [])
+        status, body = wrapper.request('POST', '/awesome/api/', 'data')
+
+        self.assertEqual(status, 200)
+        self.select.assert_called_with([connection.sock], [], [], 0)
+        self.assertEqual(HTTPSConnection.call_count, 2)
+        connection.close.assert_called_once_with()
+        self.assertEqual(connection.request.call_count, 2)
+
+    @mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+    @mock.patch('pulp.bindings.server.SSL.Context')
+    def test_request_new_connection_not_retried(self, Context, HTTPSConnection):
+        """
+        Assert that a request that fails over a new connection is not sent again.
+        """
+        conn = server.PulpConnection('host', verify_ssl=False)
+        wrapper = server.HTTPSServerWrapper(conn)
+        connection = HTTPSConnection.return_value
+        connection.getresponse.side_effect = server.httplib.BadStatusLine('')
+
+        self.assertRaises(server.httplib.BadStatusLine, wrapper.request, 'GET', '/awesome/api/',
+                          '')
+        self.assertEqual(connection.request.call_count, 1)
+        connection.close.assert_called_once_with()
+
+
+class TestHTTPSServerWrapperIsClosed(unittest.TestCase):
+    """
+    This class contains tests for detecting idle connections that the server has closed.
+    """
+    def setUp(self):
+        self.client, self.server = socket.socketpair()
+        self.addCleanup(self.client.close)
+
+    def test_open(self):
+        """
+        Assert that an idle connection is usable while the server keeps it open.
+        """
+        self.addCleanup(self.server.close)
+        connection = mock.MagicMock(sock=self.client)
+        self.assertFalse(server.HTTPSServerWrapper._is_closed(connection))
+
+    def test_closed_by_server(self):
+        """
+        Assert that an idle connection is detected once the server has closed it.
+        """
+        self.server.close()
+        connection = mock.MagicMock(sock=self.client)
+        self.assertTrue(server.HTTPSServerWrapper._is_closed(connection))
+
+    def test_not_connected(self):
+        """
+        Assert that a connection that has not connected yet is usable.
+        """
+        self.addCleanup(self.server.close)
+        self.assertFalse(server.HTTPSServerWrapper._is_closed(mock.MagicMock(sock=None)))
+        self.assertFalse(server.HTTPSServerWrapper._is_closed(None))
+
 
 class TestPulpConnection(unittest.TestCase):
     """
@@ -13,6 +13,7 @@ DEFAULT = {
         'verify_ssl': 'true',
         'ca_path': '/etc/pki/tls/certs/ca-bundle.crt',
         'upload_chunk_size': '1048576',
+        'upload_concurrency': '4',
     },
     'client': {
         'role': 'admin'
@@ -41,6 +42,7 @@ SCHEMA = (
             ('verify_ssl', REQUIRED, BOOL),
             ('ca_path', REQUIRED, ANY),
             ('upload_chunk_size', REQUIRED, NUMBER),
+            ('upload_concurrency', REQUIRED, NUMBER),
         )
      ),
     ('client', REQUIRED,
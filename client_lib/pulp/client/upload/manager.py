@@ -9,11 +9,17 @@ import copy
 import errno
 import os
 import pickle
+import Queue
+import sys
+import threading
+import time
 
 from pulp.common.lock import LockFile
 
 
 DEFAULT_CHUNKSIZE = 1048576  # 1 MB per upload call
+DEFAULT_CONCURRENCY = 1  # number of upload calls in flight at once
+TRACKER_SAVE_INTERVAL = 5  # seconds between saves of the tracker file during an upload
 
 
 class ManagerUninitializedException(Exception):
@@ -71,7 +77,8 @@ class UploadManager(object):
     on disk state files.
     """
 
-    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE):
+    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE,
+                 concurrency=DEFAULT_CONCURRENCY):
         """
         @param upload_working_dir: directory in which to store client-side files
                to track upload requests; if it doesn't exist it will be created
@@ -84,10 +91,15 @@ class UploadManager(object):
         @param chunk_size: size in bytes of data to upload on each call to the
                server
         @type  chunk_size: int
+
+        @param concurrency: number of upload calls to the server to have in
+               flight at the same time
+        @type  concurrency: int
         """
         self.upload_working_dir = upload_working_dir
         self.bindings = bindings
         self.chunk_size = chunk_size
+        self.concurrency = concurrency
 
         # Internal state
         self.tracker_files = {}
@@ -111,7 +123,9 @@ class UploadManager(object):
         upload_working_dir = os.path.join(context.config['filesystem']['upload_working_dir'],
                                           'default')
         upload_working_dir = os.path.expanduser(upload_working_dir)
-        return cls(upload_working_dir, context.server)
+        concurrency = context.config.get('server', {}).get('upload_concurrency',
+                                                           DEFAULT_CONCURRENCY)
+        return cls(upload_working_dir, context.server, concurrency=int(concurrency))
 
     def initialize(self):
         """
@@ -184,15 +198,22 @@ class UploadManager(object):
         Begins or resumes the upload process for the given upload request.
         This call will not return until the upload is complete. The other
         expected exit point is a KeyboardError to kill the process. The
-        client-side on disk tracker files will store the current offset and
-        resume the upload from where it left off on the next call to this method.
+        client-side on disk tracker files will store the ranges of the file
+        that have been uploaded and resume the upload with the rest of the file
+        on the next call to this method.
+
+        The file is uploaded in segments of chunk_size bytes, with up to
+        concurrency upload segment calls to the server in flight at once. The
+        tracker file is saved at most every TRACKER_SAVE_INTERVAL seconds while
+        uploading, so an interrupted upload may send a few segments again when
+        it is resumed.
 
         The callback_func is used to get feedback on the upload process. After
         each successful upload segment call to the server, this function
-        will be invoked with the new offset in the file and the file size
-        (intended to be fed into a progress indicator). As this is called
-        after each upload segment call, the granularity at which it is called
-        depends on the chunk_size value for this instance.
+        will be invoked with the number of bytes of the file uploaded so far
+        and the file size (intended to be fed into a progress indicator). As
+        this is called after each upload segment call, the granularity at which
+        it is called depends on the chunk_size value for this instance.
 
         The callback_func should have a signature of (int, int).
 
@@ -234,23 +255,21 @@ class UploadManager(object):
             tracker_file.save()
 
             source_file_size = os.path.getsize(tracker_file.source_filename)
+            segments = tracker_file.missing_segments(source_file_size, self.chunk_size)
+            uploaded = source_file_size - sum(length for offset, length in segments)
 
-            f = open(tracker_file.source_filename, 'r')
-            while True:
-                # Load the chunk to upload
-                f.seek(tracker_file.offset)
-                data = f.read(self.chunk_size)
-                if not data:
-                    break
-
-                # Server request
-                self.bindings.uploads.upload_segment(upload_id, tracker_file.offset, data)
-
+            last_save = time.time()
+            for offset, length in self._upload_segments(upload_id, tracker_file.source_filename,
+                                                        segments):
                 # Status update and callback notification
-                tracker_file.offset = min(tracker_file.offset + self.chunk_size, source_file_size)
-                tracker_file.save()
+                tracker_file.add_completed_range(offset, offset + length)
+                uploaded += length
+                if time.time() - last_save >= TRACKER_SAVE_INTERVAL:
+                    tracker_file.save()
+                    last_save = time.time()
 
-                callback_func(tracker_file.offset, source_file_size)
+                if callback_func:
+                    callback_func(uploaded, source_file_size)
 
             tracker_file.is_finished_uploading = True
         finally:
@@ -259,6 +278,79 @@ class UploadManager(object):
             tracker_file.is_running = False
             tracker_file.save()
 
+    def _upload_segments(self, upload_id, source_filename, segments):
+        """
+        Upload the given segments of a file, with up to concurrency upload
+        calls to the server in flight at once. This is a generator that yields
+        each segment as soon as it has been uploaded, so the segments may be
+        yielded out of order.
+
+        @param upload_id: identifies the upload request
+        @type  upload_id: str
+
+        @param source_filename: path to the file being uploaded
+        @type  source_filename: str
+
+        @param segments: (offset, length) of each segment to upload
+        @type  segments: list
+
+        @return: generator of (offset, length) of the uploaded segments
+        """
+        if self.concurrency <= 1 or len(segments) <= 1:
+            f = open(source_filename, 'r')
+            try:
+                for offset, length in segments:
+                    f.seek(offset)
+                    self.bindings.uploads.upload_segment(upload_id, offset, f.read(length))
+                    yield offset, length
+            finally:
+                f.close()
+            return
+
+        pending = Queue.Queue()
+        for segment in segments:
+            pending.put(segment)
+        finished = Queue.Queue()
+        stopped = threading.Event()
+
+        def upload_pending_segments():
+            f = open(source_filename, 'r')
+            try:
+                while not stopped.is_set():
+                    try:
+                        offset, length = pending.get_nowait()
+                    except Queue.Empty:
+                        break
+                    f.seek(offset)
+                    self.bindings.uploads.upload_segment(upload_id, offset, f.read(length))
+                    finished.put(((offset, length), None))
+            except Exception:
+                finished.put((None, sys.exc_info()))
+            finally:
+                f.close()
+
+        workers = [threading.Thread(target=upload_pending_segments)
+                   for i in range(min(self.concurrency, len(segments)))]
+        try:
+            for worker in workers:
+                # Don't keep the process alive if the upload is interrupted
+                worker.daemon = True
+                worker.start()
+
+            for i in range(len(segments)):
+                while True:
+                    # Wait with a timeout so a KeyboardInterrupt isn't held up
+                    try:
+                        segment, exc_info = finished.get(timeout=1)
+                        break
+                    except Queue.Empty:
+                        pass
+                if exc_info is not None:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                yield segment
+        finally:
+            stopped.set()
+
     def import_upload(self, upload_id):
         """
         Once the file is finished uploading, this call will request the server
@@ -397,7 +489,8 @@ class UploadTracker(object):
         # Upload call information
         self.upload_id = None
         self.location = None  # URL to the upload request on the server
-        self.offset = None  # start of next chunk to upload
+        self.offset = None  # end of the uploaded data at the start of the file
+        self.completed_ranges = []  # [start, end) of each uploaded range of the file
         self.source_filename = None  # path on disk to the file to upload
 
         # Import call information
@@ -433,6 +526,64 @@ class UploadTracker(object):
         if lock_file:
             lock_file.release()
 
+    def add_completed_range(self, start, end):
+        """
+        Record that the data between the start and end offsets of the source
+        file has been uploaded.
+
+        @param start: offset of the first uploaded byte
+        @type  start: int
+
+        @param end: offset just after the last uploaded byte
+        @type  end: int
+        """
+        ranges = []
+        for range_start, range_end in sorted(self._get_completed_ranges() + [[start, end]]):
+            if ranges and range_start <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], range_end)
+            else:
+                ranges.append([range_start, range_end])
+        self.completed_ranges = ranges
+
+        if ranges and ranges[0][0] == 0:
+            self.offset = ranges[0][1]
+        else:
+            self.offset = 0
+
+    def missing_segments(self, size, segment_size):
+        """
+        Determine the segments of the source file that have not been uploaded.
+
+        @param size: size of the source file
+        @type  size: int
+
+        @param segment_size: maximum size of each segment
+        @type  segment_size: int
+
+        @return: (offset, length) of each segment that still has to be uploaded
+        @rtype:  list
+        """
+        segments = []
+        offset = 0
+        for range_start, range_end in self._get_completed_ranges() + [[size, size]]:
+            while offset < min(range_start, size):
+                length = min(segment_size, range_start - offset, size - offset)
+                segments.append((offset, length))
+                offset += length
+            offset = max(offset, range_end)
+        return segments
+
+    def _get_completed_ranges(self):
+        """
+        @return: sorted [start, end) of each uploaded range of the source file
+        @rtype:  list
+        """
+        completed_ranges = getattr(self, 'completed_ranges', None)
+        if completed_ranges is None:
+            # Trackers saved before ranges were recorded only know the offset
+            completed_ranges = self.offset and [[0, self.offset]] or []
+        return sorted([list(r) for r in completed_ranges])
+
     def delete(self):
         os.remove(self.filename)
 
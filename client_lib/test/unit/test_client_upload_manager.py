@@ -54,6 +54,16 @@ class UploadManagerTests(unittest.TestCase):
 
         self.assertTrue(isinstance(manager, upload_util.UploadManager))
         self.assertEqual(manager.upload_working_dir, '/a/b/c/default')
+        self.assertEqual(manager.concurrency, upload_util.DEFAULT_CONCURRENCY)
+
+    def test_init_with_defaults_concurrency(self):
+        context = mock.MagicMock()
+        context.config = {'filesystem': {'upload_working_dir': '/a/b/c'},
+                          'server': {'upload_concurrency': '4'}}
+
+        manager = upload_util.UploadManager.init_with_defaults(context)
+
+        self.assertEqual(manager.concurrency, 4)
 
     def test_initialize_no_trackers(self):
         os.makedirs(self.upload_working_dir)
@@ -289,6 +299,84 @@ class UploadManagerTests(unittest.TestCase):
         tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
         self.assertEqual(rpm_size, tracker.offset)
 
+    def test_upload_parallel(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 4
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+
+        mock_callback = mock.Mock()
+
+        # Test
+        self.upload_manager.upload(upload_id, mock_callback.update_status)
+
+        # Verify
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        num_upload_calls = int(math.ceil(float(rpm_size) / float(self.upload_manager.chunk_size)))
+
+        # Every segment was sent exactly once, in whatever order
+        self.assertEqual(num_upload_calls, self.mock_upload_bindings.upload_segment.call_count)
+        f = open(TEST_RPM_FILENAME, 'r')
+        expected_body = f.read()
+        f.close()
+        segments = sorted(c[0][1:] for c in self.mock_upload_bindings.upload_segment.call_args_list)
+        self.assertEqual(expected_body, ''.join(data for offset, data in segments))
+        self.assertEqual(range(0, rpm_size, 100), [offset for offset, data in segments])
+
+        # The callback reports the number of bytes uploaded so far
+        self.assertEqual(num_upload_calls, mock_callback.update_status.call_count)
+        self.assertEqual((rpm_size, rpm_size), mock_callback.update_status.call_args[0])
+
+        tf_filename = self.upload_manager._tracker_filename(upload_id)
+        tracker = upload_util.UploadTracker.load(tf_filename)
+        self.assertEqual(rpm_size, tracker.offset)
+        self.assertEqual([[0, rpm_size]], tracker.completed_ranges)
+        self.assertTrue(tracker.is_finished_uploading)
+        self.assertFalse(tracker.is_running)
+
+    def test_upload_parallel_failure(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 4
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        self.mock_upload_bindings.upload_segment.side_effect = ValueError()
+
+        # Test
+        self.assertRaises(ValueError, self.upload_manager.upload, upload_id)
+
+        # Verify
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        self.assertEqual([], tracker.completed_ranges)
+        self.assertFalse(tracker.is_finished_uploading)
+        self.assertFalse(tracker.is_running)
+
+    def test_upload_resume(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        tracker.add_completed_range(0, 250)
+        tracker.add_completed_range(300, rpm_size)
+
+        mock_callback = mock.Mock()
+
+        # Test
+        self.upload_manager.upload(upload_id, mock_callback.update_status)
+
+        # Verify only the missing range was uploaded
+        self.mock_upload_bindings.upload_segment.assert_called_once_with(upload_id, 250, mock.ANY)
+        self.assertEqual(50, len(self.mock_upload_bindings.upload_segment.call_args[0][2]))
+        mock_callback.update_status.assert_called_once_with(rpm_size, rpm_size)
+        self.assertEqual([[0, rpm_size]], tracker.completed_ranges)
+        self.assertTrue(tracker.is_finished_uploading)
+
     def test_upload_concurrent_upload(self):
         # Setup
         self.upload_manager.initialize()
@@ -444,3 +532,43 @@ class UploadManagerTests(unittest.TestCase):
         Configures the mock bindings to return a valid response on importing an upload.
         """
         self.mock_upload_bindings.import_upload.return_value = Response(200, {})
+
+
+class UploadTrackerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = upload_util.UploadTracker('/tmp/pulp-upload-tracker-test')
+        self.tracker.offset = 0
+
+    def test_add_completed_range(self):
+        self.tracker.add_completed_range(20, 30)
+        self.assertEqual([[20, 30]], self.tracker.completed_ranges)
+        self.assertEqual(0, self.tracker.offset)
+
+        self.tracker.add_completed_range(0, 10)
+        self.tracker.add_completed_range(40, 50)
+        self.assertEqual([[0, 10], [20, 30], [40, 50]], self.tracker.completed_ranges)
+        self.assertEqual(10, self.tracker.offset)
+
+        self.tracker.add_completed_range(10, 20)
+        self.assertEqual([[0, 30], [40, 50]], self.tracker.completed_ranges)
+        self.assertEqual(30, self.tracker.offset)
+
+    def test_missing_segments(self):
+        self.assertEqual([(0, 4), (4, 4), (8, 2)], self.tracker.missing_segments(10, 4))
+
+        self.tracker.add_completed_range(2, 5)
+        self.tracker.add_completed_range(9, 10)
+        self.assertEqual([(0, 2), (5, 4)], self.tracker.missing_segments(10, 4))
+
+        self.tracker.add_completed_range(0, 10)
+        self.assertEqual([], self.tracker.missing_segments(10, 4))
+
+    def test_missing_segments_offset_only(self):
+        """
+        Trackers saved before completed ranges were recorded resume from their offset.
+        """
+        del self.tracker.completed_ranges
+        self.tracker.offset = 6
+
+        self.assertEqual([(6, 4)], self.tracker.missing_segments(10, 4))
@@ -154,6 +154,7 @@ pushd streamer
 popd
 
 mkdir -p %{buildroot}/%{_var}/www/streamer/
+mkdir -p %{buildroot}/%{_var}/cache/%{name}/streamer/
 mkdir -p %{buildroot}/%{_sysconfdir}/default/
 mkdir -p %{buildroot}/%{_sysconfdir}/%{name}/
 mkdir -p %{buildroot}/%{_sysconfdir}/httpd/conf.d/
@@ -677,6 +678,7 @@ The streamer component of the Pulp Lazy Sync feature.
 # - apache:apache
 %defattr(-,apache,apache,-)
 %{_var}/www/streamer
+%{_var}/cache/%{name}/streamer/
 
 # Uninstall scriptlet
 %preun -n python-pulp-streamer
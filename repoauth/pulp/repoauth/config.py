@@ -0,0 +1,74 @@
+'''
+Cached access to the repo auth configuration file. The configuration is consulted
+on every request served by Apache, so it is only parsed again when the file has
+been modified since it was last read.
+'''
+
+from ConfigParser import SafeConfigParser
+import os
+from threading import Lock
+
+# This needs to be accessible on both Pulp and the CDS instances, so a
+# separate config file for repo auth purposes is used.
+CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
+
+# -- constants ----------------------------------------------------------------------
+
+CACHE_LOCK = Lock()
+
+# filename -> (modification time, parsed configuration)
+_CACHE = {}
+
+
+def get_config(filename=CONFIG_FILENAME):
+    '''
+    Returns the parsed configuration file, reusing the configuration parsed by an
+    earlier call unless the modification time of the file has changed.
+
+    The returned configuration is shared and must not be modified.
+
+    @param filename: path of the configuration file
+    @type  filename: str
+
+    @return: the parsed configuration
+    @rtype:  SafeConfigParser
+    '''
+    mtime = get_mtime(filename)
+    CACHE_LOCK.acquire()
+    try:
+        cached = _CACHE.get(filename)
+        if cached is not None and mtime is not None and cached[0] == mtime:
+            return cached[1]
+        config = SafeConfigParser()
+        config.read(filename)
+        _CACHE[filename] = (mtime, config)
+        return config
+    finally:
+        CACHE_LOCK.release()
+
+
+def get_mtime(filename=CONFIG_FILENAME):
+    '''
+    Returns the modification time of the configuration file.
+
+    @param filename: path of the configuration file
+    @type  filename: str
+
+    @return: the modification time, or None if the file cannot be accessed
+    @rtype:  float or None
+    '''
+    try:
+        return os.stat(filename).st_mtime
+    except OSError:
+        return None
+
+
+def clear_cache():
+    '''
+    Discards all the cached configuration, forcing it to be read again.
+    '''
+    CACHE_LOCK.acquire()
+    try:
+        _CACHE.clear()
+    finally:
+        CACHE_LOCK.release()
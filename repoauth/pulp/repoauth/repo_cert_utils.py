@@ -30,10 +30,13 @@ The validate_cert_bundle method is used to ensure that only these keys are prese
 in a cert bundle dict.
 '''
 
+from collections import OrderedDict
+import calendar
+import hashlib
 import logging
 import shutil
 import time
-from threading import RLock
+from threading import Lock, RLock
 import os
 
 from M2Crypto import X509, BIO
@@ -55,6 +58,33 @@ WRITE_LOCK = RLock()
 
 GLOBAL_BUNDLE_PREFIX = 'pulp-global-repo'
 
+# Verification results are cached per process since the same few client certificates are
+# presented over and over; the lock guards both of the caches below.
+CACHE_LOCK = Lock()
+
+# Maximum number of distinct CA bundles whose parsed chain is kept
+CA_CHAIN_CACHE_SIZE = 32
+
+# CA bundle digest -> (parsed X509 CA chain, openssl Certificate CA chain), in
+# least-recently-used order
+_CA_CHAINS = OrderedDict()
+
+# (client cert fingerprint, CA bundle digest) -> (expiration, verdict), in
+# least-recently-used order
+_VERDICTS = OrderedDict()
+
+
+def clear_cache():
+    '''
+    Discards all the cached CA chains and verification verdicts.
+    '''
+    CACHE_LOCK.acquire()
+    try:
+        _CA_CHAINS.clear()
+        _VERDICTS.clear()
+    finally:
+        CACHE_LOCK.release()
+
 
 class RepoCertUtils:
     def __init__(self, config):
@@ -62,6 +92,7 @@ class RepoCertUtils:
         self.log_failed_cert = True
         self.log_failed_cert_verbose = False
         self.max_num_certs_in_chain = 100
+        self.verification_cache_size = 1000
         try:
             self.log_failed_cert = self.config.getboolean('main', 'log_failed_cert')
         except:
@@ -74,6 +105,10 @@ class RepoCertUtils:
             self.max_num_certs_in_chain = self.config.getint('main', 'max_num_certs_in_chain')
         except:
             pass
+        try:
+            self.verification_cache_size = self.config.getint('main', 'verification_cache_size')
+        except:
+            pass
 
     def delete_for_repo(self, repo_id):
         '''
@@ -270,6 +305,10 @@ class RepoCertUtils:
         Validates a certificate against a CA certificate.
         Input expects PEM encoded strings.
 
+        The verdict is cached per process, keyed by the certificate fingerprint and
+        the CA bundle digest, until the certificate or any of the CA certificates
+        expires.
+
         @param cert_pem: PEM encoded certificate
         @type  cert_pem: str
 
@@ -286,10 +325,39 @@ class RepoCertUtils:
         if not log_func:
             log_func = LOG.info
         cert = X509.load_cert_string(cert_pem)
-        ca_chain = self.get_certs_from_string(ca_pem, log_func)
-        return self.x509_verify_cert(cert, ca_chain, log_func=log_func)
+        ca_digest = hashlib.sha256(ca_pem).hexdigest()
+        key = (cert.get_fingerprint('sha256'), ca_digest)
 
-    def x509_verify_cert(self, cert, ca_certs, log_func=None):
+        now = time.time()
+        CACHE_LOCK.acquire()
+        try:
+            cached = _VERDICTS.get(key)
+            if cached is not None:
+                if cached[0] > now:
+                    # Mark the verdict as the most recently used one
+                    _VERDICTS[key] = _VERDICTS.pop(key)
+                    if not cached[1] and log_func:
+                        log_func("Cert verification failed (cached result)")
+                    return cached[1]
+                del _VERDICTS[key]
+        finally:
+            CACHE_LOCK.release()
+
+        ca_certs, ca_chain = self._get_ca_chain(ca_pem, ca_digest, log_func)
+        verdict = self.x509_verify_cert(cert, ca_certs, log_func=log_func, ca_chain=ca_chain)
+
+        expiration = self._verdict_expiration([cert] + ca_certs, now)
+        if self.verification_cache_size > 0 and expiration > now:
+            CACHE_LOCK.acquire()
+            try:
+                _VERDICTS[key] = (expiration, verdict)
+                while len(_VERDICTS) > self.verification_cache_size:
+                    _VERDICTS.popitem(last=False)
+            finally:
+                CACHE_LOCK.release()
+        return verdict
+
+    def x509_verify_cert(self, cert, ca_certs, log_func=None, ca_chain=None):
         """
         Validates a Certificate against a CA Certificate.
 
@@ -302,11 +370,16 @@ class RepoCertUtils:
         @param  log_func:  Logging function
         @param  log_func:  Function accepting a single string
 
+        @param  ca_chain:  ca_certs already converted to openssl Certificates; they are
+                           converted here if not given
+        @type   ca_chain:  [pulp.repoauth.openssl.Certificate]
+
         @return: true if the certificate is verified by OpenSSL APIs, false otherwise
         @rtype:  boolean
         """
         certificate = Certificate(cert.as_pem())
-        ca_chain = [Certificate(c.as_pem()) for c in ca_certs]
+        if ca_chain is None:
+            ca_chain = [Certificate(c.as_pem()) for c in ca_certs]
         retval = certificate.verify(ca_chain)
         if retval != 1 and log_func:
             msg = "Cert verification failed against %d ca cert(s)" % len(ca_certs)
@@ -433,6 +506,72 @@ class RepoCertUtils:
 
     # -- private ----------------------------------------------------------------------------
 
+    def _get_ca_chain(self, ca_pem, ca_digest, log_func=None):
+        '''
+        Returns the parsed certificates of a CA bundle, only parsing the bundle the
+        first time it is seen.
+
+        @param ca_pem: PEM encoded CA certificates
+        @type  ca_pem: str
+
+        @param ca_digest: SHA-256 digest of ca_pem
+        @type  ca_digest: str
+
+        @param log_func: logging function
+        @type  log_func: function accepting a single string
+
+        @return the CA certificates both as X509 Certificates and as openssl Certificates
+        @rtype: ([M2Crypto.X509.X509], [pulp.repoauth.openssl.Certificate])
+        '''
+        CACHE_LOCK.acquire()
+        try:
+            ca_chain = _CA_CHAINS.pop(ca_digest, None)
+            if ca_chain is not None:
+                _CA_CHAINS[ca_digest] = ca_chain
+                return ca_chain
+        finally:
+            CACHE_LOCK.release()
+
+        ca_certs = self.get_certs_from_string(ca_pem, log_func)
+        ca_chain = (ca_certs, [Certificate(c.as_pem()) for c in ca_certs])
+
+        CACHE_LOCK.acquire()
+        try:
+            _CA_CHAINS[ca_digest] = ca_chain
+            while len(_CA_CHAINS) > CA_CHAIN_CACHE_SIZE:
+                _CA_CHAINS.popitem(last=False)
+        finally:
+            CACHE_LOCK.release()
+        return ca_chain
+
+    @staticmethod
+    def _verdict_expiration(certs, now):
+        '''
+        Returns the time until which the verification verdict for a certificate may be
+        reused: the first time at which the validity of the certificate or of one of
+        the CA certificates changes. That is the end of the validity period of a
+        certificate, or the start of it for a certificate that is not valid yet.
+
+        @param certs: the verified certificate and the CA certificates it was verified
+                      against
+        @type  certs: [M2Crypto.X509.X509]
+
+        @param now: the time of the verification, in seconds since the epoch
+        @type  now: float
+
+        @return: the expiration time, in seconds since the epoch
+        @rtype:  float
+        '''
+        expirations = []
+        for cert in certs:
+            not_before = calendar.timegm(cert.get_not_before().get_datetime().utctimetuple())
+            if not_before > now:
+                expirations.append(not_before)
+            else:
+                expirations.append(
+                    calendar.timegm(cert.get_not_after().get_datetime().utctimetuple()))
+        return min(expirations)
+
     def _write_cert_bundle(self, file_prefix, cert_dir, bundle):
         '''
         Writes the files represented by the cert bundle to a directory on the
@@ -1,10 +1,14 @@
-from ConfigParser import SafeConfigParser
 from pkg_resources import iter_entry_points
 
 from pulp.repoauth import auth_enabled_validation
+from pulp.repoauth import config as repoauth_config
 
 AUTH_ENTRY_POINT = 'pulp_content_authenticators'
-CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
+CONFIG_FILENAME = repoauth_config.CONFIG_FILENAME
+
+# (configuration file modification time, {name: authenticator}) of the loaded
+# authenticator entry points
+_loaded_authenticators = None
 
 
 def allow_access(environ, host):
@@ -29,9 +33,7 @@ def allow_access(environ, host):
         return True
 
     # find all of the authenticator methods we need to try
-    authenticators = {}
-    for ep in iter_entry_points(group=AUTH_ENTRY_POINT):
-        authenticators.update({ep.name: ep.load()})
+    authenticators = _get_authenticators()
 
     # load our list of disabled authenticators
     disabled_authenticators = _get_disabled_authenticators()
@@ -47,10 +49,28 @@ def allow_access(environ, host):
     return True
 
 
+def _get_authenticators():
+    """
+    Load the authenticator entry points. They are loaded once per process and loaded
+    again only when the configuration file is modified.
+
+    :return: The authenticator callables keyed by entry point name.
+    :rtype:  dict
+    """
+    global _loaded_authenticators
+    mtime = repoauth_config.get_mtime(CONFIG_FILENAME)
+    loaded = _loaded_authenticators
+    if loaded is None or loaded[0] != mtime:
+        authenticators = {}
+        for ep in iter_entry_points(group=AUTH_ENTRY_POINT):
+            authenticators.update({ep.name: ep.load()})
+        loaded = _loaded_authenticators = (mtime, authenticators)
+    return loaded[1]
+
+
 def _get_disabled_authenticators():
     disabled_authenticators = []
-    config = SafeConfigParser()
-    config.read(CONFIG_FILENAME)
+    config = repoauth_config.get_config(CONFIG_FILENAME)
 
     if config.has_option('main', 'disabled_authenticators'):
         disabled_authenticators = config.get('main', 'disabled_authenticators').split(',')
@@ -2,11 +2,15 @@ import mock
 import unittest
 
 import pulp.repoauth.auth_enabled_validation as auth_enabled_validation
+from pulp.repoauth import config as repoauth_config
 
 
 class TestAuthEnabledValiation(unittest.TestCase):
 
-    @mock.patch("pulp.repoauth.auth_enabled_validation.SafeConfigParser")
+    def setUp(self):
+        repoauth_config.clear_cache()
+
+    @mock.patch("pulp.repoauth.config.SafeConfigParser")
     def test_config_read(self, mock_parser):
         mock_parser_instance = mock.Mock()
         mock_parser.return_value = mock_parser_instance
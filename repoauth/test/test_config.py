@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp.repoauth import config as repoauth_config
+
+
+class TestGetConfig(unittest.TestCase):
+
+    def setUp(self):
+        repoauth_config.clear_cache()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'repo_auth.conf')
+        self._write('true')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        repoauth_config.clear_cache()
+
+    def _write(self, enabled, mtime=1000):
+        f = open(self.filename, 'w')
+        f.write('[main]\nenabled: %s\n' % enabled)
+        f.close()
+        os.utime(self.filename, (mtime, mtime))
+
+    def test_read(self):
+        config = repoauth_config.get_config(self.filename)
+        self.assertTrue(config.getboolean('main', 'enabled'))
+
+    def test_cached_until_modified(self):
+        """
+        Test that the file is only parsed again once its modification time changes
+        """
+        config = repoauth_config.get_config(self.filename)
+        self.assertTrue(repoauth_config.get_config(self.filename) is config)
+
+        self._write('false', mtime=2000)
+        config = repoauth_config.get_config(self.filename)
+        self.assertFalse(config.getboolean('main', 'enabled'))
+
+    @mock.patch('pulp.repoauth.config.SafeConfigParser')
+    def test_missing_file_not_cached(self, mock_parser):
+        """
+        Test that a missing file is looked for again on the next call
+        """
+        missing = os.path.join(self.tmp_dir, 'missing.conf')
+        repoauth_config.get_config(missing)
+        repoauth_config.get_config(missing)
+        self.assertEquals(mock_parser.return_value.read.call_count, 2)
+
+    def test_get_mtime_missing(self):
+        self.assertTrue(repoauth_config.get_mtime(os.path.join(self.tmp_dir, 'missing')) is None)
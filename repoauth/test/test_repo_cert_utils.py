@@ -4,6 +4,7 @@ import os
 import unittest
 
 from M2Crypto import X509
+import mock
 
 from pulp.repoauth import repo_cert_utils
 
@@ -341,6 +342,7 @@ class TestCertStorage(unittest.TestCase):
 
 class TestCertVerify(unittest.TestCase):
     def setUp(self):
+        repo_cert_utils.clear_cache()
         self.utils = repo_cert_utils.RepoCertUtils(CONFIG)
 
     def test_valid(self):
@@ -466,3 +468,131 @@ class TestCertVerify(unittest.TestCase):
         ca_chain_pems = open(ca_chain_path).read()
         test_cert_pem = open(test_cert_path).read()
         self.assertTrue(self.utils.validate_certificate_pem(test_cert_pem, ca_chain_pems))
+
+
+# Within the validity period of both CERT and the chain test certificate
+VALID_TIME = 1433116800  # 2015-06-01
+
+# After the validity period of both certificates
+EXPIRED_TIME = 1546300800  # 2019-01-01
+
+# After VALID_CA expired, but before CERT did
+CA_EXPIRED_TIME = 1459113000  # 2016-03-27 21:10
+
+
+@mock.patch('pulp.repoauth.repo_cert_utils.time')
+@mock.patch('pulp.repoauth.repo_cert_utils.RepoCertUtils.x509_verify_cert', return_value=True)
+class TestVerificationCache(unittest.TestCase):
+    def setUp(self):
+        repo_cert_utils.clear_cache()
+        self.utils = repo_cert_utils.RepoCertUtils(CONFIG)
+        self.ca = open(VALID_CA).read()
+        self.cert = open(CERT).read()
+
+    def tearDown(self):
+        repo_cert_utils.clear_cache()
+
+    def test_verdict_cached(self, mock_verify, mock_time):
+        """
+        Tests that a certificate is only verified once against the same CA bundle.
+        """
+        mock_time.time.return_value = VALID_TIME
+
+        self.assertTrue(self.utils.validate_certificate_pem(self.cert, self.ca))
+        self.assertTrue(self.utils.validate_certificate_pem(self.cert, self.ca))
+
+        self.assertEqual(mock_verify.call_count, 1)
+
+    def test_failed_verdict_cached(self, mock_verify, mock_time):
+        """
+        Tests that a failed verification is cached as well.
+        """
+        mock_time.time.return_value = VALID_TIME
+        mock_verify.return_value = False
+
+        self.assertFalse(self.utils.validate_certificate_pem(self.cert, self.ca))
+        self.assertFalse(self.utils.validate_certificate_pem(self.cert, self.ca))
+
+        self.assertEqual(mock_verify.call_count, 1)
+
+    def test_different_ca_bundle(self, mock_verify, mock_time):
+        """
+        Tests that the verdict is not reused for a different CA bundle.
+        """
+        mock_time.time.return_value = VALID_TIME
+        invalid_ca = open(INVALID_CA).read()
+
+        self.utils.validate_certificate_pem(self.cert, self.ca)
+        self.utils.validate_certificate_pem(self.cert, invalid_ca)
+
+        self.assertEqual(mock_verify.call_count, 2)
+
+    def test_verdict_expires_with_cert(self, mock_verify, mock_time):
+        """
+        Tests that the verdict is discarded once the certificate has expired.
+        """
+        mock_time.time.return_value = VALID_TIME
+        self.utils.validate_certificate_pem(self.cert, self.ca)
+
+        mock_time.time.return_value = EXPIRED_TIME
+        self.utils.validate_certificate_pem(self.cert, self.ca)
+        self.utils.validate_certificate_pem(self.cert, self.ca)
+
+        # expired certificates are verified every time
+        self.assertEqual(mock_verify.call_count, 3)
+
+    def test_verdict_expires_with_ca(self, mock_verify, mock_time):
+        """
+        Tests that the verdict is discarded once a CA certificate has expired, even
+        though the certificate itself has not.
+        """
+        mock_time.time.return_value = VALID_TIME
+        self.utils.validate_certificate_pem(self.cert, self.ca)
+
+        mock_time.time.return_value = CA_EXPIRED_TIME
+        self.utils.validate_certificate_pem(self.cert, self.ca)
+
+        self.assertEqual(mock_verify.call_count, 2)
+
+    def test_cache_disabled(self, mock_verify, mock_time):
+        """
+        Tests that nothing is cached when the cache size is 0.
+        """
+        mock_time.time.return_value = VALID_TIME
+        self.utils.verification_cache_size = 0
+
+        self.utils.validate_certificate_pem(self.cert, self.ca)
+        self.utils.validate_certificate_pem(self.cert, self.ca)
+
+        self.assertEqual(mock_verify.call_count, 2)
+
+    def test_cache_bounded(self, mock_verify, mock_time):
+        """
+        Tests that the least recently used verdict is evicted once the cache is full.
+        """
+        mock_time.time.return_value = VALID_TIME
+        self.utils.verification_cache_size = 1
+        other_cert = open(os.path.join(CA_CHAIN_TEST_DATA, 'certs/test_cert.pem')).read()
+
+        self.utils.validate_certificate_pem(self.cert, self.ca)
+        self.utils.validate_certificate_pem(other_cert, self.ca)
+        self.utils.validate_certificate_pem(self.cert, self.ca)
+
+        self.assertEqual(mock_verify.call_count, 3)
+
+    def test_ca_chain_parsed_once(self, mock_verify, mock_time):
+        """
+        Tests that a CA bundle is only parsed once for different certificates.
+        """
+        mock_time.time.return_value = VALID_TIME
+        other_cert = open(os.path.join(CA_CHAIN_TEST_DATA, 'certs/test_cert.pem')).read()
+
+        with mock.patch.object(self.utils, 'get_certs_from_string',
+                               wraps=self.utils.get_certs_from_string) as mock_parse:
+            self.utils.validate_certificate_pem(self.cert, self.ca)
+            self.utils.validate_certificate_pem(other_cert, self.ca)
+
+        self.assertEqual(mock_parse.call_count, 1)
+        first_call, second_call = mock_verify.call_args_list
+        self.assertEqual(first_call[0][1], second_call[0][1])
+        self.assertTrue(first_call[1]['ca_chain'] is second_call[1]['ca_chain'])
@@ -1,6 +1,8 @@
 import unittest
 import mock
 
+from pulp.repoauth import config as repoauth_config
+from pulp.repoauth import wsgi
 from pulp.repoauth.wsgi import allow_access, _get_disabled_authenticators
 
 
@@ -10,6 +12,10 @@ class TestWsgi(unittest.TestCase):
         """
         set up authenticators
         """
+        # discard the authenticators and configuration cached by other tests
+        wsgi._loaded_authenticators = None
+        repoauth_config.clear_cache()
+
         # build authenticators w/ entry points
         self.auth_one = mock.Mock()
         entrypoint_one = mock.Mock()
@@ -120,7 +126,7 @@ class TestWsgi(unittest.TestCase):
 
         self.assertTrue(allow_access(environ, 'fake.host.name'))
 
-    @mock.patch("pulp.repoauth.wsgi.SafeConfigParser")
+    @mock.patch("pulp.repoauth.config.SafeConfigParser")
     def test_config_read(self, mock_parser):
         """
         Test that we are reading the file we think we are reading
@@ -133,3 +139,24 @@ class TestWsgi(unittest.TestCase):
 
         mock_parser_instance.read.assert_called_once_with('/etc/pulp/repo_auth.conf')
         mock_parser_instance.has_option.assert_called_once_with('main', 'disabled_authenticators')
+
+    @mock.patch('pulp.repoauth.config.get_mtime')
+    @mock.patch('pulp.repoauth.auth_enabled_validation.authenticate')
+    @mock.patch('pulp.repoauth.wsgi.iter_entry_points')
+    def test_authenticators_cached(self, iter_ep, auth_enabled, get_mtime):
+        """
+        Test that entry points are loaded once until the config file is modified
+        """
+        auth_enabled.return_value = False
+        get_mtime.return_value = 1.0
+        iter_ep.return_value = self.entrypoint_list
+        environ = mock.Mock()
+
+        self.assertTrue(allow_access(environ, 'fake.host.name'))
+        self.assertTrue(allow_access(environ, 'fake.host.name'))
+        self.assertEquals(iter_ep.call_count, 1)
+        self.assertEquals(self.auth_one.call_count, 2)
+
+        get_mtime.return_value = 2.0
+        self.assertTrue(allow_access(environ, 'fake.host.name'))
+        self.assertEquals(iter_ep.call_count, 2)
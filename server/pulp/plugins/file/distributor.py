@@ -5,6 +5,7 @@ import logging
 import os
 import shutil
 import traceback
+import uuid
 
 from pulp.common.plugins.distributor_constants import MANIFEST_FILENAME
 from pulp.common.plugins.progress import ProgressReport
@@ -93,12 +94,12 @@ class FileDistributor(Distributor):
                 # Finalize the processing
                 self.finalize_metadata()
 
-            # Let's unpublish, and then republish
-            self.unpublish_repo(repo, config)
-
+            # Bring each hosting location up to date with the build_dir. Only the links that
+            # changed are touched, so the published repository stays available throughout.
             hosting_locations = self.get_hosting_locations(repo, config)
+            self.unpublish_stale_locations(repo, config, hosting_locations)
             for location in hosting_locations:
-                copytree(build_dir, location, symlinks=True)
+                self._publish_build_dir(build_dir, location)
 
             self.post_repo_publish(repo, config)
 
@@ -133,6 +134,28 @@ class FileDistributor(Distributor):
         for location in hosting_locations:
             self._rmtree_if_exists(location)
 
+    def unpublish_stale_locations(self, repo, config, hosting_locations):
+        """
+        Delete the files published for the repository anywhere other than the given hosting
+        locations, which are updated in place afterwards.
+
+        The base class only ever publishes to the hosting locations, so there is nothing to
+        delete. A subclass that overrides unpublish_repo may delete more than that, such as
+        locations it no longer publishes to, so the repository is unpublished entirely and
+        republished from scratch. Such a subclass can override this method to delete only what
+        is no longer published.
+
+        :param repo:              metadata describing the repository
+        :type  repo:              pulp.plugins.model.Repository
+        :param config:            plugin configuration
+        :type  config:            pulp.plugins.config.PluginCallConfiguration
+        :param hosting_locations: the paths the repository is about to be published to
+        :type  hosting_locations: list of str
+        """
+        unpublish_repo = getattr(type(self).unpublish_repo, '__func__', None)
+        if unpublish_repo is not FileDistributor.unpublish_repo.__func__:
+            self.unpublish_repo(repo, config)
+
     def validate_config(self, repo, config, config_conduit):
         raise NotImplementedError()
 
@@ -238,6 +261,93 @@ class FileDistributor(Distributor):
             # so now we should recreate it.
             os.symlink(unit.storage_path, symlink_filename)
 
+    def _publish_build_dir(self, build_dir, location):
+        """
+        Make the published tree at location the same as the build_dir. If something is already
+        published there, only the entries that differ are replaced or removed, each of them
+        atomically, and the manifest is replaced last. Otherwise the build_dir is copied.
+
+        :param build_dir: The path to the freshly built tree of symlinks and metadata.
+        :type  build_dir: basestring
+        :param location:  The path where the tree is published.
+        :type  location:  basestring
+        """
+        if os.path.islink(location) or not os.path.isdir(location):
+            self._remove_if_exists(location)
+            copytree(build_dir, location, symlinks=True)
+            return
+
+        self._update_tree(build_dir, location, skip_list=[MANIFEST_FILENAME])
+        self._replace_entry(os.path.join(build_dir, MANIFEST_FILENAME),
+                            os.path.join(location, MANIFEST_FILENAME))
+
+    def _update_tree(self, source_dir, target_dir, skip_list=()):
+        """
+        Recursively make target_dir contain the same entries as source_dir, leaving the entries
+        that are already the same untouched.
+
+        :param source_dir: The directory whose contents should be replicated.
+        :type  source_dir: basestring
+        :param target_dir: The existing directory that should be updated.
+        :type  target_dir: basestring
+        :param skip_list:  Names of entries of source_dir that should not be updated, but that
+                           should not be removed from target_dir either.
+        :type  skip_list:  list of basestring
+        """
+        source_names = set(os.listdir(source_dir))
+        for name in source_names:
+            if name in skip_list:
+                continue
+            source = os.path.join(source_dir, name)
+            target = os.path.join(target_dir, name)
+            if os.path.islink(source):
+                if os.path.islink(target) and os.readlink(target) == os.readlink(source):
+                    continue
+                self._replace_entry(source, target)
+            elif os.path.isdir(source):
+                if os.path.islink(target) or not os.path.isdir(target):
+                    self._remove_if_exists(target)
+                    os.makedirs(target)
+                self._update_tree(source, target)
+            else:
+                self._replace_entry(source, target)
+
+        # Remove whatever is no longer part of the tree
+        for name in set(os.listdir(target_dir)) - source_names:
+            self._remove_if_exists(os.path.join(target_dir, name))
+
+    def _replace_entry(self, source, target):
+        """
+        Atomically replace target with a copy of the symlink or file at source.
+
+        :param source: The path of the symlink or file to copy.
+        :type  source: basestring
+        :param target: The path to put the copy at.
+        :type  target: basestring
+        """
+        if os.path.isdir(target) and not os.path.islink(target):
+            # A directory can't be renamed over, so this entry can't be replaced atomically
+            shutil.rmtree(target)
+
+        tmp_target = '%s.%s' % (target, uuid.uuid4().hex)
+        if os.path.islink(source):
+            os.symlink(os.readlink(source), tmp_target)
+        else:
+            shutil.copy(source, tmp_target)
+        os.rename(tmp_target, target)
+
+    def _remove_if_exists(self, path):
+        """
+        Remove the file, symlink or directory at the given path, if there is one.
+
+        :param path: The path you want to remove.
+        :type  path: basestring
+        """
+        if os.path.islink(path) or os.path.isfile(path):
+            os.remove(path)
+        else:
+            self._rmtree_if_exists(path)
+
     def _rmtree_if_exists(self, path):
         """
         If the given path exists, remove it recursively. Else, do nothing.
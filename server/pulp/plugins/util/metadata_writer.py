@@ -11,12 +11,42 @@ from xml.sax.saxutils import XMLGenerator
 
 from pulp.common import error_codes
 from pulp.server.exceptions import PulpCodedValidationException, PulpCodedException
-from verification import CHECKSUM_FUNCTIONS
+from verification import CHECKSUM_FUNCTIONS, VALIDATION_CHUNK_SIZE
 
 _LOG = logging.getLogger(__name__)
 BUFFER_SIZE = 1024
 
 
+class ChecksumWriter(object):
+    """
+    File-like wrapper that updates a checksum with everything written to the wrapped file.
+    Any other attribute access is passed through to the wrapped file.
+    """
+
+    def __init__(self, file_object, hasher):
+        """
+        :param file_object: the file to write to
+        :type  file_object: file
+        :param hasher: a hashlib object to update with the data written
+        :type  hasher: hashlib.HASH
+        """
+        self.file_object = file_object
+        self.hasher = hasher
+
+    def write(self, data):
+        """
+        Write data to the wrapped file and add it to the checksum.
+
+        :param data: the data to write
+        :type  data: str
+        """
+        self.hasher.update(data)
+        self.file_object.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file_object, name)
+
+
 class MetadataFileContext(object):
     """
     Context manager class for metadata file generation.
@@ -36,6 +66,7 @@ class MetadataFileContext(object):
         self.metadata_file_handle = None
         self.checksum_type = checksum_type
         self.checksum = None
+        self.checksum_hasher = None
         if self.checksum_type is not None:
             checksum_function = CHECKSUM_FUNCTIONS.get(checksum_type)
             if not checksum_function:
@@ -96,9 +127,7 @@ class MetadataFileContext(object):
         # Add calculated checksum to the filename
         file_name = os.path.basename(self.metadata_file_path)
         if self.checksum_type is not None:
-            with open(self.metadata_file_path, 'rb') as file_handle:
-                content = file_handle.read()
-                checksum = self.checksum_constructor(content).hexdigest()
+            checksum = self._calculate_checksum()
 
             self.checksum = checksum
             file_name_with_checksum = checksum + '-' + file_name
@@ -109,12 +138,35 @@ class MetadataFileContext(object):
 
         # Set the metadata_file_handle to None so we don't double call finalize
         self.metadata_file_handle = None
+        self.checksum_hasher = None
+
+    def _calculate_checksum(self):
+        """
+        Get the checksum of the metadata file as written to disk. The checksum is normally
+        calculated while the file is written; the file is only read back if its handle was
+        not opened by _open_metadata_file_handle.
+
+        :return: hex digest of the metadata file
+        :rtype:  str
+        """
+        if self.checksum_hasher is not None:
+            return self.checksum_hasher.hexdigest()
+
+        hasher = self.checksum_constructor()
+        with open(self.metadata_file_path, 'rb') as file_handle:
+            content = file_handle.read(VALIDATION_CHUNK_SIZE)
+            while content:
+                hasher.update(content)
+                content = file_handle.read(VALIDATION_CHUNK_SIZE)
+        return hasher.hexdigest()
 
     def _open_metadata_file_handle(self):
         """
         Open the metadata file handle, creating any missing parent directories.
 
-        If the file already exists, this will overwrite it.
+        If the file already exists, this will overwrite it. If a checksum type was given, the
+        handle updates the checksum with every byte written to disk, so the file does not
+        have to be read back when it is finalized.
         """
         assert self.metadata_file_handle is None
         _LOG.debug('Opening metadata file: %s' % self.metadata_file_path)
@@ -142,11 +194,26 @@ class MetadataFileContext(object):
         msg = _('Opening metadata file handle for [%(p)s]')
         _LOG.debug(msg % {'p': self.metadata_file_path})
 
+        if self.checksum_type is None:
+            if self.metadata_file_path.endswith('.gz'):
+                self.metadata_file_handle = gzip.open(self.metadata_file_path, 'w')
+            else:
+                self.metadata_file_handle = open(self.metadata_file_path, 'w')
+            return
+
+        self.checksum_hasher = self.checksum_constructor()
+        file_handle = open(self.metadata_file_path, 'wb')
+        checksum_writer = ChecksumWriter(file_handle, self.checksum_hasher)
+
         if self.metadata_file_path.endswith('.gz'):
-            self.metadata_file_handle = gzip.open(self.metadata_file_path, 'w')
+            # the checksum covers the compressed data, so it is calculated below the gzip layer
+            gzip_handle = gzip.GzipFile(self.metadata_file_path, 'wb', fileobj=checksum_writer)
+            # like gzip.open, make the GzipFile own the underlying file so closing it closes both
+            gzip_handle.myfileobj = file_handle
+            self.metadata_file_handle = gzip_handle
 
         else:
-            self.metadata_file_handle = open(self.metadata_file_path, 'w')
+            self.metadata_file_handle = checksum_writer
 
     def _write_file_header(self):
         """
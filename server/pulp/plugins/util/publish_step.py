@@ -30,6 +30,9 @@ from pulp.server.util import copytree
 
 _logger = logging.getLogger(__name__)
 
+# The minimum number of seconds between two progress reports that are not forced
+PROGRESS_REPORT_INTERVAL = 1
+
 
 def _post_order(step):
     """
@@ -270,8 +273,17 @@ class Step(object):
                     pass
                 parent = parent.parent
             raise
-
-        self.state = reporting_constants.STATE_COMPLETE
+        else:
+            self.state = reporting_constants.STATE_COMPLETE
+        finally:
+            # Always write out the final progress of the step, whether it completed, failed or
+            # was canceled, since progress written while it ran may have been throttled
+            try:
+                self.report_progress(force=True)
+            except Exception:
+                # Don't let a failed report replace the exception raised by the step
+                _logger.exception(_('Failed to report the final progress of step [%(s)s]') %
+                                  {'s': self.step_id})
 
     def on_error(self):
         """
@@ -314,7 +326,9 @@ class Step(object):
     def report_progress(self, force=False):
         """
         Bubble up that something has changed where progress should be reported.
-        It is up to the parent to determine what actions should be taken.
+        It is up to the parent to determine what actions should be taken. The root step
+        writes the progress report at most once every PROGRESS_REPORT_INTERVAL seconds,
+        unless the write is forced or the state of the step has changed.
         :param force: Whether or not a write to the database should be forced
         :type force: bool
         """
@@ -328,14 +342,10 @@ class Step(object):
         if self.parent:
             self.parent.report_progress(force)
         else:
-            if force:
+            current_time = time.time()
+            if force or current_time - self.last_report_time >= PROGRESS_REPORT_INTERVAL:
                 self.get_status_conduit().set_progress(self.get_progress_report())
-            else:
-                current_time = time.time()
-                if current_time != self.last_report_time:
-                    # Update at most once a second
-                    self.get_status_conduit().set_progress(self.get_progress_report())
-                    self.last_report_time = current_time
+                self.last_report_time = current_time
 
     def get_progress_report(self):
         """
@@ -861,9 +871,12 @@ class AtomicDirectoryPublishStep(PluginStep):
             link each file in the source directory to a file with the same name in the target
             directory
     :type only_publish_directory_contents: bool
+    :param incremental: If true, files that are unchanged since the previous publish are hard
+            linked from the previous master directory instead of being copied again
+    :type incremental: bool
     """
     def __init__(self, source_dir, publish_locations, master_publish_dir, step_type=None,
-                 only_publish_directory_contents=False):
+                 only_publish_directory_contents=False, incremental=True):
         step_type = step_type if step_type else reporting_constants.PUBLISH_STEP_DIRECTORY
         super(AtomicDirectoryPublishStep, self).__init__(step_type)
         self.context = None
@@ -871,6 +884,7 @@ class AtomicDirectoryPublishStep(PluginStep):
         self.publish_locations = publish_locations
         self.master_publish_dir = master_publish_dir
         self.only_publish_directory_contents = only_publish_directory_contents
+        self.incremental = incremental
 
     def process_main(self, item=None):
         """
@@ -886,8 +900,14 @@ class AtomicDirectoryPublishStep(PluginStep):
         # Given that it is timestamped for this publish/repo we could skip the copytree
         # for items where http & https are published to a separate directory
 
+        # Files that haven't changed since the previous publish are linked from the previous
+        # master rather than written again. The previous master is removed below, which leaves
+        # the linked files in place.
+        previous_master_dir = self._previous_master_dir() if self.incremental else None
+
         _logger.debug('Copying tree from %s to %s' % (self.source_dir, timestamp_master_dir))
-        copytree(self.source_dir, timestamp_master_dir, symlinks=True)
+        copytree(self.source_dir, timestamp_master_dir, symlinks=True,
+                 link_dir=previous_master_dir)
 
         for source_relative_location, publish_location in self.publish_locations:
             if source_relative_location.startswith('/'):
@@ -928,6 +948,32 @@ class AtomicDirectoryPublishStep(PluginStep):
         # Clear out any previously published masters
         misc.clear_directory(self.master_publish_dir, skip_list=[self.parent.timestamp])
 
+    def _previous_master_dir(self):
+        """
+        Find the master directory of the most recent previous publish.
+
+        :return: path to the previous master directory, or None if there is none
+        :rtype: str or None
+        """
+        if not os.path.isdir(self.master_publish_dir):
+            return None
+
+        masters = []
+        for name in os.listdir(self.master_publish_dir):
+            # Master directories are named after the timestamp of their publish
+            try:
+                timestamp = float(name)
+            except ValueError:
+                continue
+            path = os.path.join(self.master_publish_dir, name)
+            if name != self.parent.timestamp and os.path.isdir(path) and \
+                    not os.path.islink(path):
+                masters.append((timestamp, path))
+
+        if not masters:
+            return None
+        return max(masters)[1]
+
 
 class SaveTarFilePublishStep(PublishStep):
     """
@@ -1221,9 +1267,12 @@ class GetLocalUnitsStep(SaveUnitsStep):
             # Get this group of units
             query = units_controller.find_units(units_group)
 
+            found_units = []
             for found_unit in query:
                 units_we_already_had.add(hash(found_unit))
-                repo_controller.associate_single_unit(self.get_repo().repo_obj, found_unit)
+                found_units.append(found_unit)
+            if found_units:
+                repo_controller.associate_units(self.get_repo().repo_obj, found_units)
 
             for unit in units_group:
                 if hash(unit) not in units_we_already_had:
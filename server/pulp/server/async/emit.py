@@ -1,18 +1,51 @@
 import logging
-from kombu import Connection, Exchange, Producer
+import threading
 
+from kombu import Connection, Exchange
+from kombu.exceptions import LimitExceeded
+from kombu.pools import producers
+
+from pulp.common.constants import CALL_COMPLETE_STATES
 from pulp.server.config import config
+from pulp.server.util import TTLCache
 
 DEFAULT_EXCHANGE_NAME = 'pulp.api.v2'
+# The maximum number of routing keys whose most recently sent state is remembered
+THROTTLE_CACHE_SIZE = 10000
+# How long the most recent update dropped for a routing key is kept, waiting to be sent
+# before the next change of state
+DROPPED_UPDATE_TTL = 24 * 60 * 60
+# Publishing is retried once, right away, after the connection to the broker is lost, so a
+# broker that is down does not hold up the save of the document
+PUBLISH_RETRY_POLICY = {'max_retries': 1, 'interval_start': 0, 'interval_step': 0,
+                        'interval_max': 0}
 _logger = logging.getLogger(__name__)
 
+_connection = None
+_connection_lock = threading.Lock()
+
+# routing key -> the state of the most recently sent document
+_recently_sent = TTLCache(THROTTLE_CACHE_SIZE, 0)
+
+# routing key -> (state, payload) of the most recent document that was not sent
+_dropped = TTLCache(THROTTLE_CACHE_SIZE, DROPPED_UPDATE_TTL)
+
 
 def send(document, routing_key=None):
     """
     Attempt to send a message to the AMQP broker.
 
-    If we cannot obtain a new connection then the message will be dropped. Note
-    that we do not block when waiting for a connection.
+    Messages are published with a producer from the per-process kombu producer pool,
+    so the connection to the broker is kept open between messages and re-established
+    if it is lost. If every producer in the pool is busy the message will be dropped;
+    we do not block when waiting for a connection.
+
+    Successive documents that are sent with the same routing key and in the same state
+    within event_notification_interval seconds of each other are collapsed: only the
+    first one is sent. A change of state is always sent, preceded by the last document
+    that was dropped in the previous state so listeners see its final progress. Documents
+    in a complete state are never collapsed, since no later change of state would send a
+    dropped one.
 
     :param document: the taskstatus Document we want to send
     :type  document: mongoengine.Document
@@ -31,11 +64,60 @@ def send(document, routing_key=None):
         _logger.warn("unable to convert document to JSON; event message not sent")
         return
 
-    broker_url = config.get('messaging', 'event_notification_url')
+    state = getattr(document, 'state', None)
+    if state is None or routing_key is None:
+        _publish(payload, routing_key)
+        return
+
+    if state not in CALL_COMPLETE_STATES and _recently_sent.get(routing_key) == state:
+        _dropped.set(routing_key, (state, payload))
+        return
+
+    dropped = _dropped.get(routing_key)
+    _dropped.invalidate(routing_key)
+    if dropped is not None and dropped[0] != state:
+        _publish(dropped[1], routing_key)
+
+    if _publish(payload, routing_key):
+        interval = config.getfloat('messaging', 'event_notification_interval')
+        _recently_sent.set(routing_key, state, ttl=interval)
+
 
+def _publish(payload, routing_key):
+    """
+    Publish a message to the event notification exchange.
+
+    :param payload: the body of the message
+    :type  payload: basestring
+    :param routing_key: The routing key for the message
+    :type  routing_key: str
+    :return: True if the message was published, False if it was dropped
+    :rtype:  bool
+    """
     notification_topic = Exchange(name=DEFAULT_EXCHANGE_NAME, type='topic')
 
-    with Connection(broker_url) as connection:
-        producer = Producer(connection)
-        producer.maybe_declare(notification_topic)
-        producer.publish(payload, exchange=notification_topic, routing_key=routing_key)
+    try:
+        with producers[_get_connection()].acquire(block=False) as producer:
+            producer.publish(payload, exchange=notification_topic, routing_key=routing_key,
+                             declare=[notification_topic], retry=True,
+                             retry_policy=PUBLISH_RETRY_POLICY)
+    except LimitExceeded:
+        _logger.warn("no connection to the message broker is available; event message not sent")
+        return False
+    return True
+
+
+def _get_connection():
+    """
+    Get the connection to the broker that producers are pooled for. The connection is
+    created the first time it is needed and shared by every thread of the process; it
+    only connects once a producer is acquired from the pool.
+
+    :return: the connection to the event notification broker
+    :rtype:  kombu.Connection
+    """
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            _connection = Connection(config.get('messaging', 'event_notification_url'))
+        return _connection
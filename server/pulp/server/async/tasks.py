@@ -224,6 +224,17 @@ def _get_unreserved_worker():
         raise NoWorkers()
 
 
+def get_worker_count():
+    """
+    Return the number of workers that can be assigned work. The scheduler and the resource
+    manager are not counted.
+
+    :returns: The number of workers that can be assigned work
+    :rtype:   int
+    """
+    return len(filter(_is_worker, Worker.objects().distinct('name')))
+
+
 def _delete_worker(name, normal_shutdown=False):
     """
     Delete the Worker with _id name from the database, cancel any associated tasks and reservations
@@ -48,6 +48,8 @@ _default_values = {
     'authentication': {
         'rsa_key': '/etc/pki/pulp/rsa.key',
         'rsa_pub': '/etc/pki/pulp/rsa_pub.key',
+        'authorization_cache_ttl': '5',
+        'password_cache_ttl': '60',
     },
     'consumer_history': {
         'lifetime': '180',  # in days
@@ -100,6 +102,7 @@ _default_values = {
         'topic_exchange': 'amq.topic',
         'event_notifications_enabled': 'false',
         'event_notification_url': 'qpid://localhost:5672/',
+        'event_notification_interval': '1',
     },
     'security': {
         'cacert': '/etc/pki/pulp/ca.crt',
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
 from gettext import gettext as _
 import itertools
 from logging import getLogger
@@ -21,6 +22,7 @@ from pulp.plugins.conduits.mixins import (ContentSourcesConduitException,
                                           LazyStatusConduitException, StatusMixin,
                                           PublishReportMixin)
 from pulp.plugins.loader import api as plugin_api
+from pulp.plugins.util.misc import paginate
 from pulp.plugins.util.publish_step import Step
 from pulp.plugins.util.verification import (InvalidChecksumType, VerificationException,
                                             verify_checksum)
@@ -234,58 +236,108 @@ def _get_deferred_content_units():
 
 def _create_download_requests(content_units):
     """
-    Make a list of Nectar DownloadRequests for the given content units using
-    the lazy catalog.
+    Generate Nectar DownloadRequests for the given content units using
+    the lazy catalog. The units and their catalog entries are fetched a page
+    at a time and the requests are generated lazily, so downloading can begin
+    before every unit has been processed.
 
-    :param content_units: The content units to build a list of DownloadRequests for.
-    :type  content_units: list of pulp.server.db.model.FileContentUnit
+    :param content_units: The content units to build DownloadRequests for.
+    :type  content_units: iterable of pulp.server.db.model.FileContentUnit
 
-    :return: A list of DownloadRequests; each request includes a ``data``
+    :return: A generator of DownloadRequests; each request includes a ``data``
              instance variable which is a dict containing the FileContentUnit,
              the list of files in the unit, and the downloaded file's storage
              path.
-    :rtype:  list of nectar.request.DownloadRequest
+    :rtype:  generator of nectar.request.DownloadRequest
     """
-    requests = []
     working_dir = get_working_directory()
     signing_key = Key.load(pulp_conf.get('authentication', 'rsa_key'))
 
+    for page in _get_unit_pages(content_units):
+        catalog = _get_catalog_entries(page)
+        for content_unit in page:
+            # All files in the unit; every request for a unit has a reference to this dict.
+            # Requests are downloaded as soon as they are generated, so the dict is filled for
+            # every file of the unit before the unit's first request is yielded.
+            unit_files = {}
+            requests = []
+            unit_working_dir = os.path.join(working_dir, content_unit.id)
+            for file_path in content_unit.list_files():
+                catalog_entry = catalog.get((content_unit.type_id, content_unit.id, file_path))
+                if catalog_entry is None:
+                    continue
+                signed_url = _get_streamer_url(catalog_entry, signing_key)
+
+                temporary_destination = os.path.join(
+                    unit_working_dir,
+                    os.path.basename(catalog_entry.path)
+                )
+                mkdir(unit_working_dir)
+                unit_files[temporary_destination] = {
+                    CATALOG_ENTRY: catalog_entry,
+                    PATH_DOWNLOADED: None,
+                }
+
+                request = DownloadRequest(signed_url, temporary_destination)
+                # For memory reasons, only hold onto the id and type_id so we can reload the unit
+                # once it's successfully downloaded.
+                request.data = {
+                    TYPE_ID: content_unit.type_id,
+                    UNIT_ID: content_unit.id,
+                    UNIT_FILES: unit_files,
+                }
+                requests.append(request)
+            for request in requests:
+                yield request
+
+
+def _get_unit_pages(content_units):
+    """
+    Generate pages of the given content units. The IDs of all the units are read before
+    the first page is returned and every page is then fetched by ID, so no database cursor
+    is left idle while the units of a page are downloaded. Downloading a page can take
+    longer than the database keeps an idle cursor open.
+
+    :param content_units: The content units to page through.
+    :type  content_units: iterable of pulp.server.db.model.FileContentUnit
+
+    :return: A generator of pages of content units.
+    :rtype:  generator of list of pulp.server.db.model.FileContentUnit
+    """
+    unit_ids = defaultdict(list)
     for content_unit in content_units:
-        # All files in the unit; every request for a unit has a reference to this dict.
-        unit_files = {}
-        unit_working_dir = os.path.join(working_dir, content_unit.id)
-        for file_path in content_unit.list_files():
-            qs = LazyCatalogEntry.objects.filter(
-                unit_id=content_unit.id,
-                unit_type_id=content_unit.type_id,
-                path=file_path
-            )
-            catalog_entry = qs.order_by('revision').first()
-            if catalog_entry is None:
-                continue
-            signed_url = _get_streamer_url(catalog_entry, signing_key)
-
-            temporary_destination = os.path.join(
-                unit_working_dir,
-                os.path.basename(catalog_entry.path)
-            )
-            mkdir(unit_working_dir)
-            unit_files[temporary_destination] = {
-                CATALOG_ENTRY: catalog_entry,
-                PATH_DOWNLOADED: None,
-            }
+        unit_ids[content_unit.type_id].append(content_unit.id)
+
+    for unit_type_id, ids in unit_ids.iteritems():
+        unit_model = plugin_api.get_unit_model_by_id(unit_type_id)
+        for page in paginate(ids):
+            yield list(unit_model.objects(id__in=page))
 
-            request = DownloadRequest(signed_url, temporary_destination)
-            # For memory reasons, only hold onto the id and type_id so we can reload the unit
-            # once it's successfully downloaded.
-            request.data = {
-                TYPE_ID: content_unit.type_id,
-                UNIT_ID: content_unit.id,
-                UNIT_FILES: unit_files,
-            }
-            requests.append(request)
 
-    return requests
+def _get_catalog_entries(content_units):
+    """
+    Fetch the lazy catalog entries for a page of content units, using one query
+    per content type. When there are several entries for a file, the entry with
+    the lowest revision is used.
+
+    :param content_units: The content units to fetch the catalog entries for.
+    :type  content_units: iterable of pulp.server.db.model.FileContentUnit
+
+    :return: The catalog entries keyed by (unit_type_id, unit_id, path).
+    :rtype:  dict
+    """
+    unit_ids = defaultdict(list)
+    for content_unit in content_units:
+        unit_ids[content_unit.type_id].append(content_unit.id)
+
+    entries = {}
+    for unit_type_id, ids in unit_ids.items():
+        query_set = LazyCatalogEntry.objects(unit_type_id=unit_type_id, unit_id__in=ids)
+        # Entries with lower revisions are seen last and replace those with higher ones.
+        for catalog_entry in query_set.order_by('-revision'):
+            key = (catalog_entry.unit_type_id, catalog_entry.unit_id, catalog_entry.path)
+            entries[key] = catalog_entry
+    return entries
 
 
 def _get_streamer_url(catalog_entry, signing_key):
@@ -345,7 +397,7 @@ class LazyUnitDownloadStep(Step, DownloadEventListener):
     to download from the Pulp Streamer components.
 
     :ivar download_requests: The download requests the step will process.
-    :type download_requests: list of nectar.request.DownloadRequest
+    :type download_requests: iterable of nectar.request.DownloadRequest
     :ivar download_config:   The keyword args used to initialize the Nectar
                              downloader configuration.
     :type download_config:   dict
@@ -359,8 +411,10 @@ class LazyUnitDownloadStep(Step, DownloadEventListener):
 
         :param lazy_status_conduit: Conduit used to update the task status.
         :type  lazy_status_conduit: LazyStatusConduit
-        :param download_requests:   List of download requests to process.
-        :type  download_requests:   list of nectar.request.DownloadRequest
+        :param download_requests:   The download requests to process. When this is a
+                                    generator, the total reported in the progress grows
+                                    as the requests are generated.
+        :type  download_requests:   iterable of nectar.request.DownloadRequest
         """
         super(LazyUnitDownloadStep, self).__init__(
             step_type=step_type,
@@ -390,19 +444,40 @@ class LazyUnitDownloadStep(Step, DownloadEventListener):
         :param item: Unused.
         :type  item: None
         """
-        self.downloader.download(self.download_requests)
+        if hasattr(self.download_requests, '__len__'):
+            self.downloader.download(self.download_requests)
+        else:
+            self.downloader.download(self._count_requests(self.download_requests))
+
+    def _count_requests(self, download_requests):
+        """
+        Count the download requests as they are generated, updating the total
+        used for progress reporting.
+
+        :param download_requests: The download requests to count.
+        :type  download_requests: iterable of nectar.request.DownloadRequest
+
+        :return: A generator of the same download requests.
+        :rtype:  generator of nectar.request.DownloadRequest
+        """
+        for request in download_requests:
+            self.total_units += 1
+            yield request
 
     def get_total(self):
         """
         The total number of download requests so progress reporting occurs at
-        the file level.
+        the file level. When the requests are generated lazily, the total starts
+        at 0 and is counted while the requests are downloaded.
 
         Inherited from Step.
 
         :return: The number of download requests this step will process.
         :rtype:  int
         """
-        return len(self.download_requests)
+        if hasattr(self.download_requests, '__len__'):
+            return len(self.download_requests)
+        return 0
 
     def download_started(self, report):
         """
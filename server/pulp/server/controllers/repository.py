@@ -1,10 +1,13 @@
 from gettext import gettext as _
 from itertools import chain
+import hashlib
+import json
 import logging
 import sys
 
 from mongoengine import NotUniqueError, OperationError, ValidationError, DoesNotExist
 from bson.objectid import ObjectId, InvalidId
+from pymongo.errors import BulkWriteError
 import celery
 
 from pulp.common import dateutils, error_codes, tags
@@ -30,6 +33,13 @@ from pulp.server.managers.repo import _common as common_utils
 
 _logger = logging.getLogger(__name__)
 
+# The error code reported by mongo when a write violates a unique index
+DUPLICATE_KEY_ERROR = 11000
+
+# The default order of the results of find_repo_content_units, supported by the unique index
+# of the associations
+DEFAULT_ASSOCIATION_SORT = ('unit_type_id', 'unit_id')
+
 
 def get_associated_unit_ids(repo_id, unit_type, repo_content_unit_q=None):
     """
@@ -126,7 +136,7 @@ def get_mongoengine_unit_querysets(repo_id, repo_content_unit_q=None):
 def find_repo_content_units(
         repository, repo_content_unit_q=None,
         units_q=None, unit_fields=None, limit=None, skip=None,
-        yield_content_unit=False):
+        yield_content_unit=False, sort=None):
     """
     Search content units associated with a given repository.
 
@@ -135,6 +145,11 @@ def find_repo_content_units(
     ContentUnit. If yield_content_unit is set to true then the ContentUnit will be yielded instead
     of the RepoContentUnit.
 
+    Results are returned in the order of the associations. When no units_q is given, skip and
+    limit are applied by the database to the associations. Otherwise the associations are read
+    in batches, the units of each batch that match units_q are fetched with one query per unit
+    type, and reading stops as soon as limit units have been found.
+
     :param repository: The repository to search.
     :type repository: pulp.server.db.model.Repository
     :param repo_content_unit_q: Any query filters to apply to the RepoContentUnits.
@@ -150,6 +165,9 @@ def find_repo_content_units(
     :param yield_content_unit: Whether we should yield a ContentUnit or RepositoryContentUnit.
         If True then a ContentUnit will be yielded. Defaults to False
     :type yield_content_unit: bool
+    :param sort: RepositoryContentUnit fields to order the results by, in mongoengine
+        order_by() format. Defaults to ordering by unit type and unit id.
+    :type sort: list of str
 
     :return: Content unit assoociations matching the query.
     :rtype: generator of pulp.server.db.model.ContentUnit or
@@ -159,26 +177,38 @@ def find_repo_content_units(
 
     qs = model.RepositoryContentUnit.objects(q_obj=repo_content_unit_q,
                                              repo_id=repository.repo_id)
+    qs = qs.order_by(*(sort or DEFAULT_ASSOCIATION_SORT))
 
-    type_map = {}
-    content_units = {}
+    if units_q is None:
+        # Every association with a unit is returned, so the database can select the page
+        if skip:
+            qs = qs.skip(skip)
+        if limit:
+            qs = qs.limit(limit)
+        skip = None
 
-    yield_count = 1
+    yield_count = 0
     skip_count = 0
 
-    for repo_content_unit in qs:
-        id_set = type_map.setdefault(repo_content_unit.unit_type_id, set())
-        id_set.add(repo_content_unit.unit_id)
-        content_unit_set = content_units.setdefault(repo_content_unit.unit_type_id, dict())
-        content_unit_set[repo_content_unit.unit_id] = repo_content_unit
-
-    for unit_type, unit_ids in type_map.iteritems():
-        _model = plugin_api.get_unit_model_by_id(unit_type)
-        qs = _model.objects(q_obj=units_q, __raw__={'_id': {'$in': list(unit_ids)}})
-        if unit_fields:
-            qs = qs.only(*unit_fields)
+    for repo_content_units in paginate(qs):
+        # unit type -> unit id -> unit, for the units of this batch that match units_q
+        units = {}
+        for repo_content_unit in repo_content_units:
+            units.setdefault(repo_content_unit.unit_type_id, {})[repo_content_unit.unit_id] = None
+
+        for unit_type, type_units in units.iteritems():
+            _model = plugin_api.get_unit_model_by_id(unit_type)
+            unit_qs = _model.objects(q_obj=units_q, __raw__={'_id': {'$in': list(type_units)}})
+            if unit_fields:
+                unit_qs = unit_qs.only(*unit_fields)
+            for unit in unit_qs:
+                type_units[unit.id] = unit
+
+        for repo_content_unit in repo_content_units:
+            unit = units[repo_content_unit.unit_type_id][repo_content_unit.unit_id]
+            if unit is None:
+                continue
 
-        for unit in qs:
             if skip and skip_count < skip:
                 skip_count += 1
                 continue
@@ -186,15 +216,12 @@ def find_repo_content_units(
             if yield_content_unit:
                 yield unit
             else:
-                cu = content_units[unit_type][unit.id]
-                cu.unit = unit
-                yield cu
-
-            if limit:
-                if yield_count >= limit:
-                    return
+                repo_content_unit.unit = unit
+                yield repo_content_unit
 
             yield_count += 1
+            if limit and yield_count >= limit:
+                return
 
 
 def find_units_not_downloaded(repo_id):
@@ -287,6 +314,52 @@ def associate_single_unit(repository, unit):
         upsert=True)
 
 
+def associate_units(repository, units):
+    """
+    Associate units to a repository.
+
+    Associations that do not exist yet are created and the updated timestamp of the ones
+    that already exist is refreshed, the same as associate_single_unit. The associations
+    are written with one unordered bulk upsert per page of units rather than one round trip
+    per unit.
+
+    :param repository: The repository to update.
+    :type repository: pulp.server.db.model.Repository
+    :param units: The units to associate to the repository.
+    :type units: iterable of pulp.server.db.model.ContentUnit
+    :return: the number of associations that were created and the number that already existed
+    :rtype: tuple of (int, int)
+    """
+    current_timestamp = dateutils.now_utc_timestamp()
+    formatted_datetime = dateutils.format_iso8601_utc_timestamp(current_timestamp)
+    update = {'$setOnInsert': {'created': formatted_datetime},
+              '$set': {'updated': formatted_datetime}}
+    collection = model.RepositoryContentUnit._get_collection()
+
+    inserted = 0
+    existing = 0
+    for unit_group in paginate(units):
+        bulk = collection.initialize_unordered_bulk_op()
+        for unit in unit_group:
+            spec = {'repo_id': repository.repo_id,
+                    'unit_type_id': unit._content_type_id,
+                    'unit_id': unit.id}
+            bulk.find(spec).upsert().update_one(update)
+        try:
+            result = bulk.execute()
+        except BulkWriteError, e:
+            # An association created concurrently by another process makes the upsert of
+            # the same unit fail on the unique index; the association exists either way.
+            result = e.details
+            errors = result['writeErrors']
+            if any(error['code'] != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+            existing += len(errors)
+        inserted += result['nUpserted']
+        existing += result['nMatched']
+    return inserted, existing
+
+
 def disassociate_units(repository, unit_iterable):
     """
     Disassociate all units in the iterable from the repository
@@ -431,6 +504,30 @@ def get_importer_by_id(object_id):
     return plugin, call_conf
 
 
+def get_importer_revision(object_id):
+    """
+    Get the revision of a repository-importer association document. The revision
+    changes whenever the importer type or the importer configuration changes, so it
+    can be used to detect that objects built from the importer are stale.
+
+    :param object_id: The document ID.
+    :type object_id: str
+    :return: A digest of the importer type and configuration.
+    :rtype: str
+    :raise pulp.plugins.loader.exceptions.PluginNotFound: not found.
+    """
+    try:
+        object_id = ObjectId(object_id)
+    except InvalidId:
+        raise plugin_exceptions.PluginNotFound()
+    document = model.Importer.objects(id=object_id).only('importer_type_id', 'config').first()
+    if document is None:
+        raise plugin_exceptions.PluginNotFound()
+    digest = hashlib.sha256(document.importer_type_id)
+    digest.update(json.dumps(document.config, sort_keys=True, default=str))
+    return digest.hexdigest()
+
+
 @celery.task(base=Task, name='pulp.server.tasks.repository.delete')
 def delete(repo_id):
     """
@@ -631,6 +728,34 @@ def update_last_unit_removed(repo_id):
     repo_obj.save()
 
 
+def update_last_unit_added_of_sharing_repos(repo_obj, since):
+    """
+    Updates the UTC date record for the time the last unit was added on every other repository
+    that contains a unit of the given repository that was updated since the given time. Units
+    are shared between repositories, so updating a unit changes the content of all of them.
+
+    :param repo_obj: the repository whose units were updated
+    :type  repo_obj: pulp.server.db.model.Repository
+    :param since:    UNIX timestamp of the time since when units count as updated
+    :type  since:    float
+    """
+    now = dateutils.now_utc_datetime_with_tzinfo()
+    for type_id in repo_obj.content_unit_counts:
+        unit_model = plugin_api.get_unit_model_by_id(type_id)
+        if unit_model is None:
+            continue
+        unit_ids = model.RepositoryContentUnit.objects(
+            repo_id=repo_obj.repo_id, unit_type_id=type_id).distinct('unit_id')
+        for page in paginate(unit_ids):
+            updated_ids = unit_model.objects(id__in=page, _last_updated__gte=since).distinct('id')
+            if not updated_ids:
+                continue
+            repo_ids = model.RepositoryContentUnit.objects(
+                unit_id__in=updated_ids, repo_id__ne=repo_obj.repo_id).distinct('repo_id')
+            if repo_ids:
+                model.Repository.objects(repo_id__in=repo_ids).update(set__last_unit_added=now)
+
+
 @celery.task(base=PulpTask)
 def queue_sync_with_auto_publish(repo_id, overrides=None, scheduled_call_id=None):
     """
@@ -700,7 +825,10 @@ def sync(repo_id, sync_config_override=None, scheduled_call_id=None):
 
     # Perform the sync
     sync_start_timestamp = _now_timestamp()
+    units_updated_since = dateutils.now_utc_timestamp()
     sync_result = None
+    # Unknown until the importer reports otherwise
+    added_count = updated_count = removed_count = -1
 
     try:
         # Replace the Importer's sync_repo() method with our register_sigterm_handler decorator,
@@ -751,6 +879,14 @@ def sync(repo_id, sync_config_override=None, scheduled_call_id=None):
         sync_result_collection.save(sync_result, safe=True)
         # Ensure counts are updated
         rebuild_content_unit_counts(repo_obj)
+        # Record the change of content, which is what applicability regeneration relies on to
+        # tell whether a repository changed since applicability was last calculated
+        if added_count or updated_count:
+            update_last_unit_added(repo_obj.repo_id)
+        if updated_count:
+            update_last_unit_added_of_sharing_repos(repo_obj, units_updated_since)
+        if removed_count:
+            update_last_unit_removed(repo_obj.repo_id)
 
     fire_manager.fire_repo_sync_finished(sync_result)
     if sync_result.result == RepoSyncResult.RESULT_FAILED:
@@ -3,10 +3,19 @@ from gettext import gettext as _
 from mongoengine import NotUniqueError, ValidationError
 
 from pulp.server import exceptions as pulp_exceptions
+from pulp.server.config import config
 from pulp.server.constants import SUPER_USER_ROLE
 from pulp.server.db import model
 from pulp.server.db.model.auth import Permission, Role
 from pulp.server.managers import factory as manager_factory
+from pulp.server.util import TTLCache
+
+
+# The maximum number of users whose authorization data is cached by each process
+AUTHORIZATION_CACHE_SIZE = 1000
+
+# login -> (user, mapping of resources to the operations granted to the user on them)
+_authorization_cache = TTLCache(AUTHORIZATION_CACHE_SIZE, 0)
 
 
 def create_user(login, password=None, name=None, roles=None):
@@ -84,6 +93,7 @@ def update_user(login, delta):
         user.save()
     except ValidationError, e:
         raise pulp_exceptions.InvalidValue(e.to_dict().keys())
+    invalidate_authorization_cache()
 
     return user
 
@@ -107,6 +117,7 @@ def delete_user(login):
     permission_manager = manager_factory.permission_manager()
     permission_manager.revoke_all_permissions_from_user(login)
     user.delete()
+    invalidate_authorization_cache()
 
 
 def is_last_super_user(login):
@@ -149,25 +160,63 @@ def is_authorized(resource, login, operation):
     :return: True if the user is authorized for the operation on the resource, False otherwise
     :rtype: bool
     """
-    user = model.User.objects.get_or_404(login=login)
+    user, permissions = get_authorization(login)
     if user.is_superuser():
         return True
 
-    permission_query_manager = manager_factory.permission_query_manager()
-
     # User is authorized if they have access to the resource or any of the its base resources.
     parts = [p for p in resource.split('/') if p]
     while parts:
         current_resource = '/%s/' % '/'.join(parts)
-        permission = permission_query_manager.find_by_resource(current_resource)
-        if permission is not None:
-            if operation in permission_query_manager.find_user_permission(permission, login):
-                return True
+        if operation in permissions.get(current_resource, []):
+            return True
         parts = parts[:-1]
 
-    permission = Permission.get_collection().find_one({'resource': '/'})
-    return (permission is not None and
-            operation in permission_query_manager.find_user_permission(permission, login))
+    return operation in permissions.get('/', [])
+
+
+def get_authorization(login):
+    """
+    Get a user together with the operations it has been granted on each resource.
+
+    The result is cached by each process for [authentication] authorization_cache_ttl seconds,
+    so authenticating repeated requests of the same user does not need to query the database.
+    The cache of a process is emptied whenever that process changes a user, a role or a
+    permission; other processes pick up the change once their cached entry expires.
+
+    :param login: login of the user
+    :type  login: str
+
+    :return: the user, and a dictionary mapping resource urls to the list of operations
+             granted to the user on them. The permissions of super users are not looked up.
+    :rtype:  tuple of (pulp.server.db.model.User, dict)
+
+    :raise pulp_exceptions.MissingResource: if the user does not exist
+    """
+    authorization = _authorization_cache.get(login)
+    if authorization is not None:
+        return authorization
+
+    user = model.User.objects.get_or_404(login=login)
+    permissions = {}
+    if not user.is_superuser():
+        permission_query_manager = manager_factory.permission_query_manager()
+        for permission in Permission.get_collection().find({'users.username': login}):
+            permissions[permission['resource']] = \
+                permission_query_manager.find_user_permission(permission, login)
+
+    authorization = (user, permissions)
+    ttl = config.getfloat('authentication', 'authorization_cache_ttl')
+    _authorization_cache.set(login, authorization, ttl=ttl)
+    return authorization
+
+
+def invalidate_authorization_cache():
+    """
+    Remove all the authorization data cached by this process. This must be called whenever
+    a user, a role or a permission is changed.
+    """
+    _authorization_cache.clear()
 
 
 def find_users_belonging_to_role(role_id):
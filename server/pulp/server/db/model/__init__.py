@@ -17,12 +17,13 @@ from pulp.server import exceptions
 from pulp.server.constants import SUPER_USER_ROLE
 from pulp.server.content.storage import FileStorage, SharedStorage
 from pulp.server.async.emit import send as send_taskstatus_message
+from pulp.server.config import config
 from pulp.server.db.connection import UnsafeRetry
 from pulp.server.compat import digestmod
 from pulp.server.db.fields import ISO8601StringField, UTCDateTimeField
 from pulp.server.db.model.reaper_base import ReaperMixin
 from pulp.server.db.querysets import CriteriaQuerySet, RepoQuerySet
-from pulp.server.util import Singleton
+from pulp.server.util import Singleton, TTLCache
 from pulp.server.webservices.views import serializers
 
 
@@ -32,6 +33,14 @@ _logger = logging.getLogger(__name__)
 SYSTEM_ID = '00000000-0000-0000-0000-000000000000'
 SYSTEM_LOGIN = u'SYSTEM'
 PASSWORD_ITERATIONS = 5000
+# The maximum number of successful password checks remembered by each process
+PASSWORD_CACHE_SIZE = 1000
+
+# Successful password checks are remembered by a digest of the credentials that is keyed with
+# a secret that never leaves the memory of this process, so the cache holds nothing that could
+# be used to recover or brute force a password.
+_password_cache_secret = os.urandom(32)
+_verified_passwords = TTLCache(PASSWORD_CACHE_SIZE, 0)
 
 
 class AutoRetryDocument(Document):
@@ -872,6 +881,12 @@ class LazyCatalogEntry(AutoRetryDocument):
                 ],
                 'unique': True
             },
+            {
+                'fields': [
+                    '-unit_id',
+                    '-unit_type_id',
+                ],
+            },
         ],
     }
 
@@ -994,17 +1009,46 @@ class User(AutoRetryDocument):
         """
         Checks a plaintext password against the hashed password stored on the User object.
 
+        Successful checks are remembered for [authentication] password_cache_ttl seconds, so
+        clients that authenticate on every request don't pay for the key derivation each time.
+        The stored hashed password is part of the cache key, so changing the password makes
+        the remembered checks stale immediately.
+
         :param plain_password: plaintext password to check against the stored hashed password
         :type  plain_password: str
 
         :return: True if password is correct, False otherwise
         :rtype:  bool
         """
+        cache_key = self._password_cache_key(plain_password)
+        if _verified_passwords.get(cache_key):
+            return True
+
         salt, hashed_password = self.password.split(",")
         salt = salt.decode("base64")
         hashed_password = hashed_password.decode("base64")
         pbkdbf = self._pbkdf_sha256(plain_password, salt, PASSWORD_ITERATIONS)
-        return hashed_password == pbkdbf
+        if hashed_password != pbkdbf:
+            return False
+
+        ttl = config.getfloat('authentication', 'password_cache_ttl')
+        _verified_passwords.set(cache_key, True, ttl=ttl)
+        return True
+
+    def _password_cache_key(self, plain_password):
+        """
+        Create the key that a successful check of a plaintext password is remembered by.
+
+        :param plain_password: plaintext password being checked
+        :type  plain_password: str
+
+        :return: keyed digest of the login, the stored hashed password and plain_password
+        :rtype:  str
+        """
+        parts = [self.login, self.password, plain_password]
+        message = '\0'.join(p.encode('utf-8') if isinstance(p, unicode) else str(p)
+                             for p in parts)
+        return HMAC(_password_cache_secret, message, digestmod).digest()
 
     def _hash_password(self, plain_password):
         """
@@ -9,6 +9,7 @@ from celery import task
 
 from pulp.server.async.tasks import Task
 from pulp.server.auth import authorization
+from pulp.server.controllers import user as user_controller
 from pulp.server.db import model
 from pulp.server.db.model.auth import Permission
 from pulp.server.exceptions import (
@@ -76,6 +77,7 @@ class PermissionManager(object):
             raise PulpDataException(_("Update Keyword [%s] is not supported" % key))
 
         Permission.get_collection().save(found)
+        user_controller.invalidate_authorization_cache()
 
     @staticmethod
     def delete_permission(resource_uri):
@@ -98,6 +100,7 @@ class PermissionManager(object):
             raise MissingResource(resource_uri)
 
         Permission.get_collection().remove({'resource': resource_uri})
+        user_controller.invalidate_authorization_cache()
 
     @staticmethod
     def grant(resource, login, operations):
@@ -139,6 +142,7 @@ class PermissionManager(object):
             current_ops.append(o)
 
         Permission.get_collection().save(permission)
+        user_controller.invalidate_authorization_cache()
 
     @staticmethod
     def revoke(resource, login, operations):
@@ -186,6 +190,7 @@ class PermissionManager(object):
             return
 
         Permission.get_collection().save(permission)
+        user_controller.invalidate_authorization_cache()
 
     def grant_automatic_permissions_for_resource(self, resource):
         """
@@ -254,6 +259,7 @@ class PermissionManager(object):
             else:
                 # Delete entire permission if there are no more users
                 Permission.get_collection().remove({'resource': permission['resource']})
+        user_controller.invalidate_authorization_cache()
 
     def operation_name_to_value(self, name):
         """
@@ -139,6 +139,7 @@ class RoleManager(object):
         for user in users_with_role:
             user.roles.remove(role_id)
             user.save()
+        user_controller.invalidate_authorization_cache()
 
         Role.get_collection().remove({'id': role_id})
 
@@ -262,6 +263,7 @@ class RoleManager(object):
 
         user.roles.append(role_id)
         user.save()
+        user_controller.invalidate_authorization_cache()
         for item in role['permissions']:
             factory.permission_manager().grant(item['resource'], login,
                                                item.get('permission', []))
@@ -295,6 +297,7 @@ class RoleManager(object):
 
         user.roles.remove(role_id)
         user.save()
+        user_controller.invalidate_authorization_cache()
 
         for item in role['permissions']:
             other_roles = factory.role_query_manager().get_other_roles(role, user.roles)
@@ -3,16 +3,21 @@ Contains content applicability management classes
 """
 
 from gettext import gettext as _
+import hashlib
+import itertools
+import json
 from logging import getLogger
+import math
 from uuid import uuid4
 
 from celery import task
+import pkg_resources
 
 from pulp.plugins.conduits.profiler import ProfilerConduit
 from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.loader import api as plugin_api, exceptions as plugin_exceptions
 from pulp.plugins.profiler import Profiler
-from pulp.server.async.tasks import Task
+from pulp.server.async.tasks import get_worker_count, Task, TaskResult
 from pulp.server.db import model
 from pulp.server.db.model.consumer import Bind, RepoProfileApplicability, UnitProfile
 from pulp.server.db.model.criteria import Criteria
@@ -23,6 +28,9 @@ from pulp.plugins.util.misc import paginate
 
 _logger = getLogger(__name__)
 
+# The smallest number of applicabilities worth regenerating in a task of their own
+MIN_REGENERATION_BATCH_SIZE = 10
+
 
 class ApplicabilityRegenerationManager(object):
     @staticmethod
@@ -30,8 +38,14 @@ class ApplicabilityRegenerationManager(object):
         """
         Regenerate and save applicability data for given updated consumers.
 
+        The (repo, profile) pairs that need applicability are split into shards by profile
+        hash, one per available worker. If there is more than one shard, each shard is
+        regenerated by a task of its own.
+
         :param consumer_criteria: The consumer selection criteria
         :type consumer_criteria: dict
+        :return: the tasks that were spawned to regenerate the shards, if any
+        :rtype: pulp.server.async.tasks.TaskResult or None
         """
         consumer_criteria = Criteria.from_dict(consumer_criteria)
         consumer_query_manager = managers.consumer_query_manager()
@@ -92,41 +106,104 @@ class ApplicabilityRegenerationManager(object):
                     for unit_profile_tuple in consumer_unit_profiles_map[consumer_id]:
                         repo_profile_hashes.add((repo_id, unit_profile_tuple))
 
-        # Iterate through each tuple in repo_profile_hashes set and regenerate applicability,
-        # if it doesn't exist. These are all guaranteed to be unique tuples because of the logic
-        # used to create maps and sets above, eliminating multiple unnecessary queries
+        # Iterate through each tuple in repo_profile_hashes set and collect the ones whose
+        # applicability doesn't exist. These are all guaranteed to be unique tuples because of
+        # the logic used to create maps and sets above, eliminating multiple unnecessary queries
         # to check for existing applicability for same profiles.
-        manager = managers.applicability_regeneration_manager()
+        repo_profiles = []
         for repo_id, (profile_hash, content_type) in repo_profile_hashes:
             # Check if applicability for given profile_hash and repo_id already exists
             if ApplicabilityRegenerationManager._is_existing_applicability(repo_id, profile_hash):
                 continue
-            # If applicability does not exist, generate applicability data for given profile
-            # and repo id.
             profile_id = profile_hash_profile_id_map[profile_hash]
-            manager.regenerate_applicability(profile_hash, content_type, profile_id, repo_id)
+            repo_profiles.append((repo_id, profile_hash, content_type, profile_id))
+
+        shards = ApplicabilityRegenerationManager._profile_hash_shards(repo_profiles)
+        if len(shards) <= 1:
+            for shard in shards:
+                ApplicabilityRegenerationManager.regenerate_applicability_for_profiles(shard)
+            return
+
+        spawned_tasks = [regenerate_applicability_for_profiles_task.apply_async((shard,))
+                         for shard in shards]
+        return TaskResult(spawned_tasks=spawned_tasks)
+
+    @staticmethod
+    def regenerate_applicability_for_profiles(repo_profiles):
+        """
+        Regenerate and save applicability data for a shard of repos and unit profiles.
+
+        :param repo_profiles: the (repo_id, profile_hash, content_type, profile_id) of each
+                              applicability to generate
+        :type repo_profiles: list of tuples
+        """
+        cache = RegenerationCache()
+        for repo_id, profile_hash, content_type, profile_id in repo_profiles:
+            ApplicabilityRegenerationManager.regenerate_applicability(
+                profile_hash, content_type, profile_id, repo_id, cache=cache)
 
     @staticmethod
-    def queue_regenerate_applicability_for_repos(repo_criteria):
+    def _profile_hash_shards(repo_profiles):
+        """
+        Split the repos and unit profiles that need applicability into one shard per available
+        worker. All the pairs of a profile hash are put in the same shard, and no shard is
+        made smaller than MIN_REGENERATION_BATCH_SIZE pairs unless there are too few pairs.
+
+        :param repo_profiles: (repo_id, profile_hash, content_type, profile_id) tuples
+        :type repo_profiles: list
+        :return: shards of the given tuples, none of which is empty
+        :rtype: list of lists
+        """
+        if not repo_profiles:
+            return []
+
+        shard_count = int(math.ceil(float(len(repo_profiles)) / MIN_REGENERATION_BATCH_SIZE))
+        shard_count = min(shard_count, max(get_worker_count(), 1))
+        if shard_count == 1:
+            return [repo_profiles]
+
+        profile_hash_repo_profiles_map = {}
+        for repo_profile in repo_profiles:
+            profile_hash_repo_profiles_map.setdefault(repo_profile[1], []).append(repo_profile)
+
+        shards = [[] for i in range(shard_count)]
+        for i, profile_hash in enumerate(sorted(profile_hash_repo_profiles_map)):
+            shards[i % shard_count].extend(profile_hash_repo_profiles_map[profile_hash])
+        return [shard for shard in shards if shard]
+
+    @staticmethod
+    def queue_regenerate_applicability_for_repos(repo_criteria, force=False):
         """
         Queue a group of tasks to generate and save applicability data affected by given updated
-        repositories.
+        repositories. Unless forced, applicabilities that were calculated against the current
+        revision of their repository are skipped. The rest are split into one batch per
+        available worker.
 
         :param repo_criteria: The repo selection criteria
         :type repo_criteria: dict
+        :param force: regenerate all the existing applicabilities of the repositories
+        :type force: bool
         """
         repo_criteria = Criteria.from_dict(repo_criteria)
 
         # Process repo criteria
-        repo_criteria.fields = ['id']
-        repo_ids = [r.repo_id for r in model.Repository.objects.find_by_criteria(repo_criteria)]
+        repo_criteria.fields = ['id', 'last_unit_added', 'last_unit_removed',
+                                'content_unit_counts']
+        repos = model.Repository.objects.find_by_criteria(repo_criteria)
 
         task_group_id = uuid4()
+        worker_count = max(get_worker_count(), 1)
 
-        for repo_id in repo_ids:
+        for repo in repos:
+            repo_id = repo.repo_id
+            query = {'repo_id': repo_id}
+            if not force:
+                query['repo_revision'] = {'$ne': repo_revision(repo)}
             existing_applicability_ids = RepoProfileApplicability.get_collection().find(
-                {'repo_id': repo_id}, {'_id': 1})
-            for batch in paginate(existing_applicability_ids, 10):
+                query, {'_id': 1})
+            batch_size = int(math.ceil(float(existing_applicability_ids.count()) / worker_count))
+            batch_size = max(batch_size, MIN_REGENERATION_BATCH_SIZE)
+            for batch in paginate(existing_applicability_ids, batch_size):
                 batch_regenerate_applicability_task.apply_async((repo_id, batch),
                                                                 **{'group_id': task_group_id})
         return task_group_id
@@ -144,6 +221,7 @@ class ApplicabilityRegenerationManager(object):
         id_list = [id['_id'] for id in existing_applicability_ids]
         existing_applicabilities = RepoProfileApplicability.get_collection().find(
             {"_id": {"$in": id_list}})
+        cache = RegenerationCache()
         for existing_applicability in existing_applicabilities:
                 # Convert cursor to RepoProfileApplicability object
             existing_applicability = RepoProfileApplicability(**dict(existing_applicability))
@@ -160,11 +238,11 @@ class ApplicabilityRegenerationManager(object):
             # Regenerate applicability data for given unit_profile and repo id
             ApplicabilityRegenerationManager.regenerate_applicability(
                 profile_hash, unit_profile['content_type'], unit_profile['id'], repo_id,
-                existing_applicability)
+                existing_applicability, cache)
 
     @staticmethod
     def regenerate_applicability(profile_hash, content_type, profile_id,
-                                 bound_repo_id, existing_applicability=None):
+                                 bound_repo_id, existing_applicability=None, cache=None):
         """
         Regenerate and save applicability data for given profile and bound repo id.
         If existing_applicability is not None, replace it with the new applicability data.
@@ -184,10 +262,17 @@ class ApplicabilityRegenerationManager(object):
 
         :param existing_applicability: existing RepoProfileApplicability object to be replaced
         :type existing_applicability: pulp.server.db.model.consumer.RepoProfileApplicability
+
+        :param cache: lookups shared by the regenerations of the same run
+        :type cache: RegenerationCache
         """
+        cache = cache or RegenerationCache()
+        # The revision is read before the applicability is calculated, so content that changes
+        # during the calculation is picked up by the next regeneration.
+        bound_repo_revision = cache.repo_revision(bound_repo_id)
         profiler_conduit = ProfilerConduit()
         # Get the profiler for content_type of given unit_profile
-        profiler, profiler_cfg = ApplicabilityRegenerationManager._profiler(content_type)
+        profiler, profiler_cfg = cache.profiler(content_type)
 
         # Check if the profiler supports applicability, else return
         if profiler.calculate_applicable_units == Profiler.calculate_applicable_units:
@@ -196,8 +281,7 @@ class ApplicabilityRegenerationManager(object):
             return
 
         # Find out which content types have unit counts greater than zero in the bound repo
-        repo_content_types = ApplicabilityRegenerationManager._get_existing_repo_content_types(
-            bound_repo_id)
+        repo_content_types = cache.repo_content_types(bound_repo_id)
         # Get the intersection of existing types in the repo and the types that the profiler
         # handles. If the intersection is not empty, regenerate applicability
         if (set(repo_content_types) & set(profiler.metadata()['types'])):
@@ -223,13 +307,15 @@ class ApplicabilityRegenerationManager(object):
             if existing_applicability:
                 # Update existing applicability object
                 existing_applicability.applicability = applicability
+                existing_applicability.repo_revision = bound_repo_revision
                 existing_applicability.save()
             else:
                 # Create a new RepoProfileApplicability object and save it in the db
                 RepoProfileApplicability.objects.create(profile_hash,
                                                         bound_repo_id,
                                                         unit_profile['profile'],
-                                                        applicability)
+                                                        applicability,
+                                                        bound_repo_revision)
 
     @staticmethod
     def _get_existing_repo_content_types(repo_id):
@@ -290,9 +376,96 @@ class ApplicabilityRegenerationManager(object):
         return plugin, cfg
 
 
+class RegenerationCache(object):
+    """
+    Remembers the profilers and the content types of repositories that are looked up while
+    regenerating applicability. Neither changes during a regeneration run, so a cache is created
+    for each run and discarded when the run ends.
+    """
+
+    def __init__(self):
+        self._profilers = {}
+        self._repo_content_types = {}
+        self._repo_revisions = {}
+
+    def profiler(self, type_id):
+        """
+        Find the profiler for the given content type.
+
+        :param type_id: The content type ID.
+        :type type_id: str
+
+        :return: (profiler, cfg)
+        :rtype: tuple
+        """
+        if type_id not in self._profilers:
+            self._profilers[type_id] = ApplicabilityRegenerationManager._profiler(type_id)
+        return self._profilers[type_id]
+
+    def repo_content_types(self, repo_id):
+        """
+        Get the content types that have units in the given repository.
+
+        :param repo_id: The repo_id for the repository
+        :type  repo_id: basestring
+        :return:        A list of content type ids that have unit counts greater than 0
+        :rtype:         list
+        """
+        if repo_id not in self._repo_content_types:
+            self._repo_content_types[repo_id] = \
+                ApplicabilityRegenerationManager._get_existing_repo_content_types(repo_id)
+        return self._repo_content_types[repo_id]
+
+    def repo_revision(self, repo_id):
+        """
+        Get the revision of the given repository's content.
+
+        :param repo_id: The repo_id for the repository
+        :type  repo_id: basestring
+        :return:        the revision, or None if the repository does not exist
+        :rtype:         basestring or None
+        """
+        if repo_id not in self._repo_revisions:
+            repo_obj = model.Repository.objects(repo_id=repo_id).only(
+                'last_unit_added', 'last_unit_removed', 'content_unit_counts').first()
+            self._repo_revisions[repo_id] = repo_revision(repo_obj) if repo_obj else None
+        return self._repo_revisions[repo_id]
+
+
+def repo_revision(repo_obj):
+    """
+    Calculate the revision of a repository's content and of the profilers that calculate
+    applicability against it. The revision changes whenever units of the repository are added,
+    removed or updated, and whenever a profiler is installed, removed or upgraded.
+
+    :param repo_obj: the repository
+    :type  repo_obj: pulp.server.db.model.Repository
+    :return:         the revision of the repository's content
+    :rtype:          str
+    """
+    revision = [repo_obj.last_unit_added, repo_obj.last_unit_removed,
+                sorted(repo_obj.content_unit_counts.items()), _profiler_versions()]
+    return hashlib.sha256(json.dumps(revision, default=str)).hexdigest()
+
+
+def _profiler_versions():
+    """
+    Find the versions of the packages that provide the installed profilers.
+
+    :return: the entry point name and package version of each profiler, sorted by name
+    :rtype:  list of lists
+    """
+    return sorted([entry_point.name, entry_point.dist.version if entry_point.dist else None]
+                  for entry_point in pkg_resources.iter_entry_points(
+                      plugin_api.ENTRY_POINT_PROFILERS))
+
+
 regenerate_applicability_for_consumers = task(
     ApplicabilityRegenerationManager.regenerate_applicability_for_consumers, base=Task,
     ignore_result=True)
+regenerate_applicability_for_profiles_task = task(
+    ApplicabilityRegenerationManager.regenerate_applicability_for_profiles, base=Task,
+    ignore_result=True)
 batch_regenerate_applicability_task = task(
     ApplicabilityRegenerationManager.batch_regenerate_applicability, base=Task,
     ignore_results=True)
@@ -318,9 +491,12 @@ class RepoProfileApplicabilityManager(object):
     """
     This class is useful for querying for RepoProfileApplicability objects in the database.
     """
-    def create(self, profile_hash, repo_id, profile, applicability):
+    def create(self, profile_hash, repo_id, profile, applicability, repo_revision=None):
         """
-        Create and return a RepoProfileApplicability object.
+        Create and return a RepoProfileApplicability object. Applicability shards run
+        concurrently, so if another task has already stored applicability for the same
+        profile_hash and repo_id, that document is replaced instead of raising a duplicate key
+        error.
 
         :param profile_hash:  The hash of the profile that this object contains applicability data
                               for
@@ -332,14 +508,18 @@ class RepoProfileApplicabilityManager(object):
         :param applicability: A dictionary structure mapping unit type IDs to lists of applicable
                               Unit IDs.
         :type  applicability: dict
+        :param repo_revision: The revision of the repository's content that the applicability
+                              data was calculated against
+        :type  repo_revision: basestring
         :return:              A new RepoProfileApplicability object
         :rtype:               pulp.server.db.model.consumer.RepoProfileApplicability
         """
-        applicability = RepoProfileApplicability(
-            profile_hash=profile_hash, repo_id=repo_id, profile=profile,
-            applicability=applicability)
-        applicability.save()
-        return applicability
+        document = RepoProfileApplicability.get_collection().find_and_modify(
+            query={'profile_hash': profile_hash, 'repo_id': repo_id},
+            update={'$set': {'profile': profile, 'applicability': applicability,
+                             'repo_revision': repo_revision}},
+            upsert=True, new=True)
+        return RepoProfileApplicability(**dict(document))
 
     def filter(self, query_params):
         """
@@ -442,64 +622,38 @@ def retrieve_consumer_applicability(consumer_criteria, content_types=None):
     :return: applicability data matching the consumer criteria query
     :rtype:  list
     """
+    if content_types is not None and not content_types:
+        # Nothing can be reported when no content types are wanted
+        return []
+
     # We only need the consumer ids
     consumer_criteria['fields'] = ['id']
     consumer_ids = [c['id'] for c in ConsumerQueryManager.find_by_criteria(consumer_criteria)]
     consumer_map = dict([(c, {'profiles': [], 'repo_ids': []}) for c in consumer_ids])
 
-    # Fill out the mapping of consumer_ids to profiles, and store the list of profile_hashes
-    profile_hashes = _add_profiles_to_consumer_map_and_get_hashes(consumer_ids, consumer_map)
+    # Fill out the mapping of consumer_ids to profiles
+    _add_profiles_to_consumer_map_and_get_hashes(consumer_ids, consumer_map)
 
     # Now add in repo_ids that the consumers are bound to
     _add_repo_ids_to_consumer_map(consumer_ids, consumer_map)
     # We don't need the list of consumer_ids anymore, so let's free a little RAM
     del consumer_ids
 
-    # Now lets get all RepoProfileApplicability objects that have the profile hashes for our
-    # consumers
-    applicability_map = _get_applicability_map(profile_hashes, content_types)
-    # We don't need the profile_hashes anymore, so let's free some RAM
-    del profile_hashes
-
-    # Now we need to add consumers who match the applicability data to the applicability_map
-    _add_consumers_to_applicability_map(consumer_map, applicability_map)
+    # Find the consumers that each combination of profile and repository applies to
+    repo_profile_consumers = _get_repo_profile_consumers(consumer_map)
     # We don't need the consumer_map anymore, so let's free it up
     del consumer_map
 
-    # Collate all the entries for the same sets of consumers together
-    consumer_applicability_map = _get_consumer_applicability_map(applicability_map)
-    # Free the applicability_map, we don't need it anymore
-    del applicability_map
+    # Collate the applicability data for the same sets of consumers together
+    consumer_applicability_map = _get_consumer_applicability_map(repo_profile_consumers,
+                                                                 content_types)
+    # Free the repo_profile_consumers, we don't need it anymore
+    del repo_profile_consumers
 
     # Form the data into the expected output format and return
     return _format_report(consumer_applicability_map)
 
 
-def _add_consumers_to_applicability_map(consumer_map, applicability_map):
-    """
-    For all consumers in the consumer_map, look for their profiles and repos in the
-    applicability_map, and if found, add the consumer_ids to the applicability_map.
-
-    :param consumer_map:      A dictionary mapping consumer_ids to dictionaries with keys
-                              'profiles' and 'repo_ids'. 'profiles' indexes a list of profiles
-                              for each consumer_id, and 'repo_ids' indexes a list of repo_ids
-                              that the consumer is bound to.
-    :type  consumer_map:      dict
-    :param applicability_map: The mapping of (profile_hash, repo_id) to applicability_data and
-                              consumer_ids the data applies to. This method appends
-                              consumer_ids to the appropriate lists of consumer_ids
-    :type  applicability_map: dict
-    """
-    for consumer_id, repo_profile_data in consumer_map.items():
-        for profile in repo_profile_data['profiles']:
-            for repo_id in repo_profile_data['repo_ids']:
-                repo_profile = (profile['profile_hash'], repo_id)
-                # Only add the consumer to the applicability map if there is applicability_data
-                # for this combination of repository and profile
-                if repo_profile in applicability_map:
-                    applicability_map[repo_profile]['consumers'].append(consumer_id)
-
-
 def _add_profiles_to_consumer_map_and_get_hashes(consumer_ids, consumer_map):
     """
     Query for all the profiles associated with the given list of consumer_ids, add those
@@ -548,12 +702,52 @@ def _add_repo_ids_to_consumer_map(consumer_ids, consumer_map):
         consumer_map[b['consumer_id']]['repo_ids'].append(b['repo_id'])
 
 
+def _aggregate_applicability(match, group_id, content_types):
+    """
+    Collect the applicable units of the documents that match the given query into a set for
+    each group and content type in the database.
+
+    The unit lists of each content type are unwound and added to the set of their group, so
+    the database builds the union of the data of each group rather than returning every
+    document's lists. The groups are read through a cursor, and the aggregation may spill to
+    disk, so neither the size of the result nor the memory limit of a pipeline stage bounds
+    the number of groups.
+
+    :param match:         query selecting the RepoProfileApplicability documents to group
+    :type  match:         dict
+    :param group_id:      the aggregation expression that the documents are grouped by
+    :type  group_id:      basestring or dict
+    :param content_types: the content types to collect the applicable units of
+    :type  content_types: list
+    :return:              a dictionary for each group and content type with keys '_id', which
+                          is the value of group_id for the group, 'content_type', and 'units',
+                          which indexes the list of applicable units of that type. The list
+                          contains None if the group has data for the type but no units.
+    :rtype:               generator
+    """
+    collection = RepoProfileApplicability.get_collection()
+    for content_type in content_types:
+        units = '$applicability.%s' % content_type
+        pipeline = [
+            {'$match': dict(match, **{'applicability.%s' % content_type: {'$exists': True}})},
+            # $unwind drops documents whose list is empty, which would drop the type from the
+            # report, so an empty list is unwound as a single None instead
+            {'$project': {'profile_hash': 1, 'repo_id': 1, 'units': {
+                '$cond': [{'$eq': [units, {'$literal': []}]}, {'$literal': [None]}, units]}}},
+            {'$unwind': '$units'},
+            {'$group': {'_id': group_id, 'units': {'$addToSet': '$units'}}}]
+        for group in collection.aggregate(pipeline, cursor={}, allowDiskUse=True):
+            group['content_type'] = content_type
+            yield group
+
+
 def _format_report(consumer_applicability_map):
     """
     Turn the consumer_applicability_map into the expected response format for this API call.
 
     :param consumer_applicability_map: A mapping of frozensets of consumers to their
-                                       applicability data
+                                       applicability data, which maps content types to
+                                       collections of units
     :type  consumer_applicability_map: dict
     :return:                           A list of dictionaries that have two keys, consumers
                                        and applicability. consumers indexes a list of
@@ -567,86 +761,103 @@ def _format_report(consumer_applicability_map):
         # it in the report
         if consumers:
             applicability_data = {'consumers': list(consumers),
-                                  'applicability': applicability}
+                                  'applicability': dict(
+                                      (content_type, list(units))
+                                      for content_type, units in applicability.iteritems())}
             report.append(applicability_data)
 
     return report
 
 
-def _get_applicability_map(profile_hashes, content_types):
+def _get_consumer_applicability_map(repo_profile_consumers, content_types):
     """
-    Build an "applicability_map", which is a dictionary that maps tuples of
-    (profile_hash, repo_id) to a dictionary of applicability data and consumer_ids. The
-    consumer_ids are just initialized to an empty list, so that a later method can add
-    consumers to it. For example, it might look like:
-
-    {('profile_hash_1', 'repo_1'): {'applicability': {<applicability_data>}, 'consumers': []}}
-
-    :param profile_hashes: A list of profile hashes that the applicabilities should be queried
-                           with. The applicability map is initialized with all applicability
-                           data for all the given profile_hashes.
-    :type  profile_hashes: list
-    :param content_types:  If not None, content_types is a list of content_types to
-                           be included in the applicability data within the
-                           applicability_map
-    :type  content_types:  list or None
-    :return:               The applicability map
-    :rtype:                dict
+    Collate the applicability data of the given profile and repository combinations by the
+    sets of consumers they apply to.
+
+    Consumers that share a profile and are bound to the same repositories share all of the
+    profile's applicability data, so the database groups the data of such profiles together.
+    The data of a profile whose repositories are not all bound to the same consumers is
+    grouped for each repository instead.
+
+    :param repo_profile_consumers: A mapping of (profile_hash, repo_id) to the frozenset of
+                                   consumer_ids that the combination applies to
+    :type  repo_profile_consumers: dict
+    :param content_types:          If not None, content_types is a list of content_types to
+                                   be included in the applicability data
+    :type  content_types:          list or None
+    :return:                       The consumer_applicability_map, which maps frozensets of
+                                   consumer_ids to their collective applicability data, a
+                                   mapping of content types to sets of units
+    :rtype:                        dict
     """
-    applicabilities = RepoProfileApplicability.get_collection().find(
-        {'profile_hash': {'$in': profile_hashes}},
-        fields=['profile_hash', 'repo_id', 'applicability'])
-    return_value = {}
-    for a in applicabilities:
-        if content_types is not None:
-            # The caller has requested us to filter by content_type, so we need to look through
-            # the applicability data and filter out the unwanted content types. Some
-            # applicabilities may end up being empty if they don't have any data for the
-            # requested types, so we'll build a list of those to remove
-            for key in a['applicability'].keys():
-                if key not in content_types:
-                    del a['applicability'][key]
-            # If a doesn't have anything worth reporting, move on to the next applicability
-            if not a['applicability']:
-                continue
-        return_value[(a['profile_hash'], a['repo_id'])] = {'applicability': a['applicability'],
-                                                           'consumers': []}
-    return return_value
+    if content_types is None:
+        # Applicability data is kept by unit type, so any type may have some
+        content_types = plugin_api.list_content_types()
+
+    profile_hash_repos = {}
+    for (profile_hash, repo_id), consumers in repo_profile_consumers.iteritems():
+        profile_hash_repos.setdefault(profile_hash, {})[repo_id] = consumers
+
+    # The consumers of each group, keyed by profile_hash for a profile that is grouped as a
+    # whole and by (profile_hash, repo_id) otherwise. Profiles grouped as a whole are queried
+    # together with the other profiles bound to exactly the same repositories, and the others
+    # together with the other profiles bound to the same repository, so that every query
+    # selects exactly the wanted documents.
+    group_consumers = {}
+    repos_profile_hashes = {}
+    repo_profile_hashes = {}
+    for profile_hash, repo_consumers in profile_hash_repos.iteritems():
+        consumer_sets = set(repo_consumers.values())
+        if len(consumer_sets) == 1:
+            group_consumers[profile_hash] = consumer_sets.pop()
+            repo_ids = frozenset(repo_consumers)
+            repos_profile_hashes.setdefault(repo_ids, []).append(profile_hash)
+        else:
+            for repo_id, consumers in repo_consumers.iteritems():
+                group_consumers[(profile_hash, repo_id)] = consumers
+                repo_profile_hashes.setdefault(repo_id, []).append(profile_hash)
+
+    groups = []
+    for repo_ids, profile_hashes in repos_profile_hashes.iteritems():
+        for page in paginate(profile_hashes):
+            groups.append(_aggregate_applicability(
+                {'profile_hash': {'$in': list(page)}, 'repo_id': {'$in': list(repo_ids)}},
+                '$profile_hash', content_types))
+    for repo_id, profile_hashes in repo_profile_hashes.iteritems():
+        for page in paginate(profile_hashes):
+            groups.append(_aggregate_applicability(
+                {'profile_hash': {'$in': list(page)}, 'repo_id': repo_id},
+                {'profile_hash': '$profile_hash', 'repo_id': '$repo_id'}, content_types))
+
+    consumer_applicability_map = {}
+    for group in itertools.chain.from_iterable(groups):
+        group_id = group['_id']
+        if isinstance(group_id, dict):
+            group_id = (group_id['profile_hash'], group_id['repo_id'])
+        applicability = consumer_applicability_map.setdefault(group_consumers[group_id], {})
+        units = applicability.setdefault(group['content_type'], set())
+        units.update(unit for unit in group['units'] if unit is not None)
+    return consumer_applicability_map
 
 
-def _get_consumer_applicability_map(applicability_map):
+def _get_repo_profile_consumers(consumer_map):
     """
-    Massage the applicability_map into a form that will help us to collate applicability
-    groups that contain the same data together.
-
-    :param applicability_map: The mapping of (profile_hash, repo_id) to applicability_data and
-                              consumer_ids it applies to. This method appends consumer_ids to
-                              the appropriate lists of consumer_ids
-    :type  applicability_map: dict
-    :return:                  The consumer_applicability_map, which maps frozensets of
-                              consumer_ids to their collective applicability data.
-    :rtype:                   dict
+    Find the consumers that each combination of profile and bound repository applies to.
+
+    :param consumer_map: A dictionary mapping consumer_ids to dictionaries with keys
+                         'profiles' and 'repo_ids'. 'profiles' indexes a list of profiles
+                         for each consumer_id, and 'repo_ids' indexes a list of repo_ids
+                         that the consumer is bound to.
+    :type  consumer_map: dict
+    :return:             A mapping of (profile_hash, repo_id) to the frozenset of consumer_ids
+                         that have the profile and are bound to the repository
+    :rtype:              dict
     """
-    consumer_applicability_map = {}
-    for repo_profile, data in applicability_map.iteritems():
-        # This will be the key for our map, a set of the consumers that share data
-        consumers = frozenset(data['consumers'])
-        if consumers in consumer_applicability_map:
-            for content_type, applicability in data['applicability'].iteritems():
-                if content_type in consumer_applicability_map[consumers]:
-                    # There is already applicability data for this consumer set and
-                    # content type. We will convert the existing data and the new data to
-                    # sets, generate the union of those sets, and turn it back into a list
-                    # so that we can report unique units.
-                    consumer_applicability_map[consumers][content_type] = list(
-                        set(consumer_applicability_map[consumers][content_type]) |
-                        set(applicability))
-                else:
-                    # This consumer set does not already have applicability data for this type, so
-                    # let's set applicability as the data for it
-                    consumer_applicability_map[consumers][content_type] = applicability
-        else:
-            # This consumer set is not already part of the consumer_applicability_map, so we can
-            # set all the applicability data we have to this consumer set
-            consumer_applicability_map[consumers] = data['applicability']
-    return consumer_applicability_map
+    repo_profile_consumers = {}
+    for consumer_id, repo_profile_data in consumer_map.iteritems():
+        for profile in repo_profile_data['profiles']:
+            for repo_id in repo_profile_data['repo_ids']:
+                repo_profile = (profile['profile_hash'], repo_id)
+                repo_profile_consumers.setdefault(repo_profile, set()).add(consumer_id)
+    return dict((repo_profile, frozenset(consumers))
+                for repo_profile, consumers in repo_profile_consumers.iteritems())
@@ -103,15 +103,17 @@ class OrphanManager(object):
         content_units_collection = content_types_db.type_units_collection(content_type_id)
         repo_content_units_collection = RepoContentUnit.get_collection()
 
-        for content_unit in content_units_collection.find({}, fields=fields):
-
-            repo_content_units_cursor = repo_content_units_collection.find(
-                {'unit_id': content_unit['_id']})
-
-            if repo_content_units_cursor.count() > 0:
-                continue
-
-            yield content_unit
+        content_units = content_units_collection.find({}, fields=fields)
+        for content_units_page in plugin_misc.paginate(content_units):
+            # Look up which units of the page are associated to a repository with a
+            # single query rather than one query per unit
+            unit_ids = [content_unit['_id'] for content_unit in content_units_page]
+            associated_unit_ids = set(repo_content_units_collection.find(
+                {'unit_id': {'$in': unit_ids}}, fields=['unit_id']).distinct('unit_id'))
+
+            for content_unit in content_units_page:
+                if content_unit['_id'] not in associated_unit_ids:
+                    yield content_unit
 
     @staticmethod
     def generate_orphans_by_type_with_unit_keys(content_type_id):
@@ -150,12 +152,14 @@ class OrphanManager(object):
                                  given content type and unit id
         """
 
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id):
-
-            if content_unit['_id'] != content_unit_id:
-                continue
+        content_units_collection = content_types_db.type_units_collection(content_type_id)
+        content_unit = content_units_collection.find_one({'_id': content_unit_id}, fields=['_id'])
 
-            return content_unit
+        if content_unit is not None:
+            association = RepoContentUnit.get_collection().find_one(
+                {'unit_id': content_unit_id}, fields=['_id'])
+            if association is None:
+                return content_unit
 
         raise pulp_exceptions.MissingResource(content_type=content_type_id,
                                               content_unit=content_unit_id)
@@ -214,22 +218,21 @@ class OrphanManager(object):
         """
 
         content_units_collection = content_types_db.type_units_collection(content_type_id)
-
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id,
-                                                                   fields=['_id', '_storage_path']):
-
-            if content_unit_ids is not None and content_unit['_id'] not in content_unit_ids:
-                continue
-
-            model.LazyCatalogEntry.objects(
-                unit_id=content_unit['_id'],
-                unit_type_id=content_type_id
-            ).delete()
-            content_units_collection.remove(content_unit['_id'], safe=False)
-
-            storage_path = content_unit.get('_storage_path', None)
-            if storage_path is not None:
-                OrphanManager.delete_orphaned_file(storage_path)
+        if content_unit_ids is not None:
+            content_unit_ids = set(content_unit_ids)
+
+        def remove_units(unit_ids):
+            content_units_collection.remove({'_id': {'$in': unit_ids}})
+
+        orphans = OrphanManager.generate_orphans_by_type(content_type_id,
+                                                         fields=['_id', '_storage_path'])
+        for orphans_page in plugin_misc.paginate(orphans):
+            storage_paths = dict((content_unit['_id'], content_unit.get('_storage_path'))
+                                 for content_unit in orphans_page
+                                 if content_unit_ids is None or
+                                 content_unit['_id'] in content_unit_ids)
+            if storage_paths:
+                OrphanManager._delete_orphan_batch(content_type_id, storage_paths, remove_units)
 
     @staticmethod
     def delete_orphan_content_units_by_type(type_id, content_unit_ids=None):
@@ -246,6 +249,10 @@ class OrphanManager(object):
         """
         # get the model matching the type
         content_model = plugin_api.get_unit_model_by_id(type_id)
+
+        def remove_units(unit_ids):
+            content_model.objects(id__in=unit_ids).delete()
+
         if content_unit_ids:
             query_sets = []
             for page in plugin_misc.paginate(content_unit_ids):
@@ -270,15 +277,41 @@ class OrphanManager(object):
             for non_orphan_id in non_orphan:
                 unit_dict.pop(non_orphan_id)
 
-            # Remove the unit, lazy catalog entries, and any content in storage.
-            for unit_to_delete in unit_dict.itervalues():
-                model.LazyCatalogEntry.objects(
-                    unit_id=str(unit_to_delete.id),
-                    unit_type_id=str(type_id)
-                ).delete()
-                unit_to_delete.delete()
-                if unit_to_delete._storage_path:
-                    OrphanManager.delete_orphaned_file(unit_to_delete._storage_path)
+            # Remove the units, lazy catalog entries, and any content in storage.
+            storage_paths = dict((unit_id, unit._storage_path)
+                                 for unit_id, unit in unit_dict.iteritems())
+            if storage_paths:
+                OrphanManager._delete_orphan_batch(type_id, storage_paths, remove_units)
+
+    @staticmethod
+    def _delete_orphan_batch(content_type_id, storage_paths, remove_units):
+        """
+        Delete a batch of orphaned content units of the given content type, along with their
+        lazy catalog entries and their content in storage.
+
+        The unit documents are removed last. If the deletion is interrupted, the units that
+        remain are still orphans, so deleting orphans again finishes the job; files that
+        were already removed are skipped.
+
+        :param content_type_id: id of the content type
+        :type content_type_id: basestring
+        :param storage_paths: mapping of the ids of the units to delete to their storage path,
+                              which is None for units without content in storage
+        :type storage_paths: dict
+        :param remove_units: function that deletes the unit documents with the given ids
+        :type remove_units: callable
+        """
+        unit_ids = list(storage_paths)
+        model.LazyCatalogEntry.objects(
+            unit_id__in=unit_ids,
+            unit_type_id=content_type_id
+        ).delete()
+
+        for storage_path in storage_paths.itervalues():
+            if storage_path and os.path.lexists(storage_path):
+                OrphanManager.delete_orphaned_file(storage_path)
+
+        remove_units(unit_ids)
 
     @staticmethod
     def delete_orphaned_file(path):
@@ -208,6 +208,7 @@ class ContentUploadManager(object):
             result = importer_instance.upload_unit(transfer_repo, unit_type_id, unit_key,
                                                    unit_metadata, file_path, conduit, call_config)
             repo_controller.rebuild_content_unit_counts(repo_obj)
+            repo_controller.update_last_unit_added(repo_id)
             return result
 
         except PulpException:
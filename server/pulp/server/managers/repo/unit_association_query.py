@@ -6,6 +6,7 @@ import itertools
 import pymongo
 
 from pulp.plugins.types import database as types_db
+from pulp.plugins.util import misc as plugin_misc
 from pulp.server.db.model.criteria import UnitAssociationCriteria
 from pulp.server.db.model.repository import RepoContentUnit
 
@@ -22,6 +23,9 @@ SORT_DESCENDING = pymongo.DESCENDING
 
 _VALID_DIRECTIONS = (SORT_ASCENDING, SORT_DESCENDING)
 
+# Associations are ordered by unit type and then unit id when no association sort is given
+DEFAULT_ASSOCIATION_SORT = (('unit_type_id', SORT_ASCENDING), ('unit_id', SORT_ASCENDING))
+
 
 class RepoUnitAssociationQueryManager(object):
 
@@ -43,7 +47,7 @@ class RepoUnitAssociationQueryManager(object):
         """
         return RepoContentUnit.get_collection().query(criteria)
 
-    def get_units(self, repo_id, criteria=None, as_generator=False):
+    def get_units(self, repo_id, criteria=None, as_generator=False, after=None):
         """
         Get the units associated with the repository based on the provided unit
         association criteria.
@@ -57,32 +61,139 @@ class RepoUnitAssociationQueryManager(object):
         :param as_generator: if true, return a generator; if false, a list
         :type  as_generator: bool
 
+        :param after: if specified, only units whose association comes after the one with this
+                      position are returned; the position is one returned by
+                      association_position. Only supported when the units are generated in
+                      association order.
+        :type  after: list
+
         :return: generator or list of units associated with the repo
         :rtype: generator or list
+
+        :raises ValueError: if after is specified for units generated in unit order
         """
 
         criteria = criteria or UnitAssociationCriteria()
 
+        if self.in_association_order(criteria):
+            # Without a unit sort, the units are generated in the order of their associations,
+            # which can be read from the database one page at a time.
+            units_generator = self._units_in_association_order(repo_id, criteria, after)
+
+        elif after is not None:
+            raise ValueError('units sorted by unit fields cannot be continued')
+
+        else:
+            units_generator = self._units_in_unit_order(repo_id, criteria)
+
+        if as_generator:
+            return units_generator
+
+        # If as_generator isn't set, evaluate the whole pipeline by casting it
+        # to a list. Should probably log this. Is there a log-level "stupid"?
+        return list(units_generator)
+
+    @staticmethod
+    def in_association_order(criteria):
+        """
+        Determine whether units found with the given criteria are generated in the order of
+        their associations rather than in the order of a unit sort.
+
+        :type criteria: UnitAssociationCriteria
+        :rtype: bool
+        """
+        return criteria.unit_sort is None or bool(criteria.association_sort)
+
+    @staticmethod
+    def association_order(criteria):
+        """
+        Get the sort that associations are generated in when the units are generated in
+        association order. If no association sort is specified, the associations are sorted
+        by unit type and unit id, which identify an association within a repository. An
+        association sort is completed with the association id, so the position of every
+        association in the order is distinct.
+
+        :type criteria: UnitAssociationCriteria
+        :return: list of (field, direction) tuples
+        :rtype: list
+        """
+        if not criteria.association_sort:
+            return list(DEFAULT_ASSOCIATION_SORT)
+        sort = list(criteria.association_sort)
+        if '_id' not in [field for field, direction in sort]:
+            sort.append(('_id', SORT_ASCENDING))
+        return sort
+
+    @classmethod
+    def association_position(cls, criteria, unit):
+        """
+        Get the position of a unit's association in the association order, which can be
+        passed as the "after" argument of get_units to continue a search after the unit.
+
+        :param criteria: the criteria the unit was found with
+        :type  criteria: UnitAssociationCriteria
+        :param unit: a unit returned by get_units
+        :type  unit: dict
+        :return: the values of the association order fields of the association
+        :rtype: list
+        """
+        return [unit.get(field) for field, direction in cls.association_order(criteria)]
+
+    def _units_in_association_order(self, repo_id, criteria, after=None):
+        """
+        Generate the units associated with the repository in the order of their associations,
+        as given by association_order. If after is specified, the associations start after
+        that position.
+
+        The associations are read in pages and the units of each page are retrieved with one
+        query per unit type, so only a single page of associations and units is held in memory
+        at any time. Skip and limit are performed by the database unless the units are
+        filtered or duplicates are removed, in which case they are performed as the units are
+        generated.
+
+        :type repo_id: str
+        :type criteria: UnitAssociationCriteria
+        :rtype: generator
+        """
+        sort = self.association_order(criteria)
+        cursor = self._unit_associations_cursor(repo_id, criteria, sort=sort, after=after)
+
+        python_skip_and_limit = criteria.unit_filters or criteria.remove_duplicates
+        if criteria.remove_duplicates:
+            unit_associations_generator = self._unit_associations_no_duplicates(criteria, cursor,
+                                                                                sort=sort)
+        else:
+            unit_associations_generator = cursor
+
+        if not python_skip_and_limit:
+            if criteria.skip:
+                cursor.skip(criteria.skip)
+            if criteria.limit:
+                cursor.limit(criteria.limit)
+
+        units_generator = self._merged_units_by_page(criteria, unit_associations_generator)
+
+        if python_skip_and_limit:
+            units_generator = self._with_skip_and_limit(units_generator, criteria.skip,
+                                                        criteria.limit)
+        return units_generator
+
+    def _units_in_unit_order(self, repo_id, criteria):
+        """
+        Generate the units associated with the repository in the order of the unit sort. Units
+        of different types are not sorted against each other, the types are generated one after
+        another.
+
+        :type repo_id: str
+        :type criteria: UnitAssociationCriteria
+        :rtype: generator
+        """
         unit_associations_generator = self._unit_associations_cursor(repo_id, criteria)
 
         if criteria.remove_duplicates:
             unit_associations_generator = self._unit_associations_no_duplicates(
                 criteria, unit_associations_generator)
 
-        if criteria.association_sort and not criteria.unit_filters:
-            # If we're ordering by association fields, but not filtering the
-            # content units, then perform the skip and limit on this generator
-            # to limit the number of units we load into memory.
-            # Manually perform skip and limit so we don't have to differentiate
-            # based on whether we're removing duplicates or not.
-            unit_associations_generator = self._with_skip_and_limit(unit_associations_generator,
-                                                                    criteria.skip, criteria.limit)
-
-        # The unit ids are used for ordering the units when association field
-        # ordering is specified (i.e. created timestamps, etc.)
-        # The ids are (unit_type_id, unit_id) tuples.
-        association_ordered_unit_ids = []
-
         # The unit association information is part of the return values, so we
         # construct a lookup in order to retrieve that information when we are
         # iterating over the content units.
@@ -98,10 +209,6 @@ class RepoUnitAssociationQueryManager(object):
             unit_type_id = association['unit_type_id']
             unit_id = association['unit_id']
 
-            # Build the ordering.
-            association_ordered_unit_ids.append((unit_type_id, unit_id))
-
-            # Build the lookup.
             association_type_dict = associations_lookup.setdefault(unit_type_id, {})
             association_list = association_type_dict.setdefault(unit_id, [])
             association_list.append(association)
@@ -118,45 +225,17 @@ class RepoUnitAssociationQueryManager(object):
                                                                associations_lookup[t].keys())
                          for t in association_unit_types if t in associations_lookup)
 
-        if not criteria.association_sort:
-            # If we're not sorting based on association fields, then set the
-            # skip and limit individually across the cursors to get consistent
-            # behavior across multiple calls across multiple unit types.
-            # The order that the generators are applied here is extremely
-            # important. DO NOT CHANGE!
-            units_cursors = self._associated_units_cursors_with_skip(units_cursors, criteria.skip)
-            units_cursors = self._associated_units_cursors_with_limit(units_cursors, criteria.limit)
+        # Set the skip and limit individually across the cursors to get consistent
+        # behavior across multiple calls across multiple unit types.
+        # The order that the generators are applied here is extremely
+        # important. DO NOT CHANGE!
+        units_cursors = self._associated_units_cursors_with_skip(units_cursors, criteria.skip)
+        units_cursors = self._associated_units_cursors_with_limit(units_cursors, criteria.limit)
 
         units_generator = itertools.chain(*units_cursors)
 
-        if criteria.association_sort:
-            # Use the ordered associations we created to properly order the results.
-            units_generator = self._association_ordered_units(association_ordered_unit_ids,
-                                                              units_generator)
-
-            if criteria.unit_filters:
-                # If we're ordering by association fields and filtering the
-                # content units, then skip and limit must be performed manually
-                # and last (skip and limit must always come after sorting).
-                units_generator = self._with_skip_and_limit(units_generator, criteria.skip,
-                                                            criteria.limit)
-
-            # The association ordering will generate the same unit for every
-            # association it has with the repository, hence "duplicate units".
-            units_generator = self._merged_units_duplicate_units(associations_lookup,
-                                                                 units_generator)
-
-        else:
-            # Unit ordering or no ordering only produce unique units, hence
-            # "unique units".
-            units_generator = self._merged_units_unique_units(associations_lookup, units_generator)
-
-        if as_generator:
-            return units_generator
-
-        # If as_generator isn't set, evaluate the whole pipeline by casting it
-        # to a list. Should probably log this. Is there a log-level "stupid"?
-        return list(units_generator)
+        # Unit ordering only produces unique units, hence "unique units".
+        return self._merged_units_unique_units(associations_lookup, units_generator)
 
     def get_units_across_types(self, repo_id, criteria=None, as_generator=False):
         """
@@ -191,7 +270,8 @@ class RepoUnitAssociationQueryManager(object):
 
         return self.get_units(repo_id, criteria, as_generator)
 
-    def get_units_by_type(self, repo_id, type_id, criteria=None, as_generator=False):
+    def get_units_by_type(self, repo_id, type_id, criteria=None, as_generator=False,
+                          after=None):
         """
         Retrieves data describing units of the given type associated with the
         given repository. Information on the associations themselves is also
@@ -215,6 +295,9 @@ class RepoUnitAssociationQueryManager(object):
 
         :param as_generator: if true, return a generator; if false, a list
         :type  as_generator: bool
+
+        :param after: if specified, passed through to get_units
+        :type  after: list
         """
 
         # Get_units now defaults to batch behavior, so use a list of length 1 to
@@ -225,7 +308,7 @@ class RepoUnitAssociationQueryManager(object):
         # them in this call.
         criteria.type_ids = [type_id]
 
-        return self.get_units(repo_id, criteria, as_generator)
+        return self.get_units(repo_id, criteria, as_generator, after)
 
     @staticmethod
     def unit_type_ids_for_repo(repo_id):
@@ -246,13 +329,19 @@ class RepoUnitAssociationQueryManager(object):
     # -- unit association methods ----------------------------------------------
 
     @staticmethod
-    def _unit_associations_cursor(repo_id, criteria):
+    def _unit_associations_cursor(repo_id, criteria, sort=None, after=None):
         """
         Retrieve a pymongo cursor for unit associations for the given repository
         that match the given criteria.
 
+        If a sort is specified it replaces the association sort of the criteria, and its
+        fields are always retrieved. If after is specified as well, only the associations
+        that come after that position in the sort are retrieved.
+
         :type repo_id: str
         :type criteria: UnitAssociationCriteria
+        :type sort: list of (field, direction) tuples
+        :type after: list
         :rtype: pymongo.cursor.Cursor
         """
 
@@ -262,22 +351,32 @@ class RepoUnitAssociationQueryManager(object):
         if criteria.type_ids:
             spec['unit_type_id'] = {'$in': criteria.type_ids}
 
+        fields = criteria.association_fields
+        if sort is None:
+            sort = criteria.association_sort
+        elif fields is not None:
+            fields = list(fields) + [f for f, d in sort if f not in fields]
+
+        if after is not None:
+            spec = {'$and': [spec, _after_spec(sort, after)]}
+
         collection = RepoContentUnit.get_collection()
 
-        cursor = collection.find(spec, fields=criteria.association_fields)
+        cursor = collection.find(spec, fields=fields)
 
-        if criteria.association_sort:
-            cursor.sort(criteria.association_sort)
+        if sort:
+            cursor.sort(sort)
 
         return cursor
 
     @staticmethod
-    def _unit_associations_no_duplicates(criteria, cursor):
+    def _unit_associations_no_duplicates(criteria, cursor, sort=None):
         """
         Remove duplicate unit associations from a iterator of unit associations.
 
         :type criteria: UnitAssociationCriteria
         :type cursor: pymongo.cursor.Cursor
+        :type sort: list of (field, direction) tuples
         :rtype: generator
         """
 
@@ -285,7 +384,7 @@ class RepoUnitAssociationQueryManager(object):
 
         # Sorting by the "created" flag is crucial to removing duplicate associations.
         created_sort_tuple = ('created', SORT_ASCENDING)
-        sort = criteria.association_sort or []
+        sort = list(sort or criteria.association_sort or DEFAULT_ASSOCIATION_SORT)
         if created_sort_tuple not in sort:
             sort.append(created_sort_tuple)
         cursor.sort(sort)
@@ -323,10 +422,10 @@ class RepoUnitAssociationQueryManager(object):
         skipped_elements = 0
         generated_elements = 0
 
-        for element in iterator:
+        if limit == 0:
+            limit = None
 
-            if limit and generated_elements == limit:
-                raise StopIteration()
+        for element in iterator:
 
             if skip and skipped_elements < skip:
                 skipped_elements += 1
@@ -336,8 +435,45 @@ class RepoUnitAssociationQueryManager(object):
 
             generated_elements += 1
 
+            # Stop before the iterator is asked for another element it may have to query for.
+            if limit and generated_elements == limit:
+                return
+
     # -- associated units methods ----------------------------------------------
 
+    def _merged_units_by_page(self, criteria, unit_associations):
+        """
+        Return associated units as the unit association information and the unit
+        information as metadata on the unit association information, in the order of
+        the unit associations.
+
+        The unit associations are consumed one page at a time and the units of each page
+        are retrieved with a single query per unit type. Associations whose unit does not
+        match the unit filters are dropped.
+
+        :type criteria: UnitAssociationCriteria
+        :type unit_associations: iterator
+        :rtype: generator
+        """
+        for page in plugin_misc.paginate(unit_associations):
+            unit_ids_by_type = {}
+            for association in page:
+                unit_ids = unit_ids_by_type.setdefault(association['unit_type_id'], [])
+                unit_ids.append(association['unit_id'])
+
+            units_by_id = {}
+            for unit_type_id, unit_ids in unit_ids_by_type.iteritems():
+                cursor = self._associated_units_by_type_cursor(unit_type_id, criteria, unit_ids)
+                for unit in cursor:
+                    units_by_id[(unit_type_id, unit['_id'])] = unit
+
+            for association in page:
+                unit = units_by_id.get((association['unit_type_id'], association['unit_id']))
+                if unit is None:
+                    continue
+                association['metadata'] = unit
+                yield association
+
     @staticmethod
     def _associated_units_by_type_cursor(unit_type_id, criteria, associated_unit_ids):
         """
@@ -438,58 +574,6 @@ class RepoUnitAssociationQueryManager(object):
                 generated_elements += cursor.count()
                 yield cursor
 
-    @staticmethod
-    def _association_ordered_units(associated_unit_ids, associated_units):
-        """
-        Return associated units in the order specified by the associated unit id
-        list.
-
-        :type associated_unit_ids: list
-        :type associated_units: iterator
-        :rtype: generator
-        """
-
-        # This algorithm assumes that associated_unit_ids has already been sorted.
-
-        # XXX This is unfortunate as it's the one place that loads all of the
-        # associated_units into memory.
-        # It is worth noting that the units have already been filtered by type,
-        # association filters, and unit filters. In addition, skip and limit
-        # may have also been performed, so it's potentially not as bad as it seems.
-        associated_units_by_id = dict(
-            ((u['_content_type_id'], u['_id']), u) for u in associated_units)
-
-        for id_tuple in associated_unit_ids:
-            # the associated_unit_ids are sorted, but not all of the units may
-            # be in the associated_units_by_id
-            if id_tuple not in associated_units_by_id:
-                continue
-
-            yield associated_units_by_id[id_tuple]
-
-    @staticmethod
-    def _merged_units_duplicate_units(associations_lookup, associated_units):
-        """
-        Return associated units as the unit association information and the unit
-        information as metadata on the unit association information.
-
-        Used when there are duplicate units returned by the associated_units iterator.
-
-        :type associations_lookup: dict
-        :type associated_units: iterator
-        :rtype: generator
-        """
-
-        # This algorithm assumes that the units will come in the same order that
-        # the associations are listed in the associations_lookup.
-
-        for unit in associated_units:
-            # Remove the associations from the list in the order they were
-            # placed in it.
-            association = associations_lookup[unit['_content_type_id']][unit['_id']].pop(0)
-            association['metadata'] = unit
-            yield association
-
     @staticmethod
     def _merged_units_unique_units(associations_lookup, associated_units):
         """
@@ -518,3 +602,32 @@ class RepoUnitAssociationQueryManager(object):
                 association = association.copy()
                 association['metadata'] = unit
                 yield association
+
+
+def _after_spec(sort, position):
+    """
+    Build a query matching the documents that come after the given position in a sort.
+
+    :param sort: list of (field, direction) tuples
+    :type  sort: list
+    :param position: the values of the sort fields at the position, in the order of the sort
+    :type  position: list
+    :return: query spec
+    :rtype: dict
+
+    :raises ValueError: if the position does not have a value for every field of the sort
+    """
+    if len(position) != len(sort):
+        raise ValueError('position does not match the sort')
+
+    operators = {SORT_ASCENDING: '$gt', SORT_DESCENDING: '$lt'}
+    clauses = []
+    for index, (field, direction) in enumerate(sort):
+        clause = dict((f, value) for (f, d), value in zip(sort[:index], position[:index]))
+        clause[field] = {operators[direction]: position[index]}
+        clauses.append(clause)
+
+    # Bounding the first field of the sort lets the database use an index range for it
+    first_field, first_direction = sort[0]
+    first_bound = {first_field: {operators[first_direction] + 'e': position[0]}}
+    return {'$and': [first_bound, {'$or': clauses}]}
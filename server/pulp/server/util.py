@@ -1,14 +1,23 @@
 """
 This module contains utility code to be used by pulp.server.
 """
+from collections import OrderedDict
+import errno
 import os
 from shutil import copy, Error
+import stat
+import threading
+import time
 
 from gettext import gettext as _
 
 from pulp.server.exceptions import PulpExecutionException
 
 
+# The size of the blocks in which copytree compares files
+COMPARE_BLOCK_SIZE = 65536
+
+
 class Singleton(type):
     """
     Singleton metaclass. To make a class instance a singleton, use this class
@@ -172,7 +181,84 @@ class Delta(dict):
                 self[k] = v
 
 
-def copytree(src, dst, symlinks=False, ignore=None):
+class TTLCache(object):
+    """
+    A thread-safe, in-process cache holding up to max_size entries. Each entry expires
+    a fixed number of seconds after it was stored, and the least recently used entry is
+    evicted when the cache is full. A max_size of 0 disables the cache.
+    """
+
+    def __init__(self, max_size, ttl):
+        """
+        :param max_size: The maximum number of entries.
+        :type  max_size: int
+        :param ttl:      The default number of seconds entries are kept for.
+        :type  ttl:      int or float
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (expiration time, value), in least-recently-used order
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Get the value cached for key.
+
+        :param key:     The key to look up.
+        :type  key:     hashable
+        :param default: The value returned when the key is not cached or has expired.
+        :return: The cached value, or default.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] <= time.time():
+                return default
+            self._entries[key] = entry
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """
+        Cache a value.
+
+        :param key:   The key to cache the value under.
+        :type  key:   hashable
+        :param value: The value to cache.
+        :param ttl:   The number of seconds to keep the value for, overriding the default.
+        :type  ttl:   int or float
+        """
+        if self.max_size <= 0:
+            return
+        if ttl is None:
+            ttl = self.ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + ttl, value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        Remove the value cached for key, if any.
+
+        :param key: The key to remove.
+        :type  key: hashable
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Remove all the cached values.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def copytree(src, dst, symlinks=False, ignore=None, link_dir=None):
     """
     Copies src tree to dst
 
@@ -196,15 +282,30 @@ def copytree(src, dst, symlinks=False, ignore=None):
                    directory (i.e. a subset of the items in its second argument); these names will
                    then be ignored in the copy process.
     :type  ignore: Callable
+    :param link_dir: If provided, a tree with the same layout as src, typically a previous copy
+                     of it. Files whose content is the same as the file at the same relative path
+                     in link_dir are hard linked from link_dir instead of being copied. It is
+                     ignored if it is not on the same filesystem as dst.
+    :type  link_dir: basestring
     """
+    os.makedirs(dst)
+    if link_dir is not None and not _same_device(link_dir, dst):
+        # Files can't be hard linked across filesystems
+        link_dir = None
+    _copytree(src, dst, symlinks, ignore, link_dir)
+
 
+def _copytree(src, dst, symlinks, ignore, link_dir):
+    """
+    Copies the entries of the src tree into the existing dst directory. See copytree() for the
+    parameters.
+    """
     names = os.listdir(src)
     if ignore is not None:
         ignored_names = ignore(src, names)
     else:
         ignored_names = set()
 
-    os.makedirs(dst)
     errors = []
     for name in names:
         if name in ignored_names:
@@ -216,7 +317,12 @@ def copytree(src, dst, symlinks=False, ignore=None):
                 linkto = os.readlink(srcname)
                 os.symlink(linkto, dstname)
             elif os.path.isdir(srcname):
-                copytree(srcname, dstname, symlinks, ignore)
+                sub_link_dir = os.path.join(link_dir, name) if link_dir is not None else None
+                os.makedirs(dstname)
+                _copytree(srcname, dstname, symlinks, ignore, sub_link_dir)
+            elif link_dir is not None and \
+                    _link_if_unchanged(srcname, os.path.join(link_dir, name), dstname):
+                continue
             else:
                 # Don't need to copy attributes
                 copy(srcname, dstname)
@@ -229,3 +335,64 @@ def copytree(src, dst, symlinks=False, ignore=None):
             errors.extend(err.args[0])
     if errors:
         raise Error(errors)
+
+
+def _same_device(path_1, path_2):
+    """
+    :return: True if both paths exist and are on the same filesystem
+    :rtype:  bool
+    """
+    try:
+        return os.stat(path_1).st_dev == os.stat(path_2).st_dev
+    except OSError:
+        return False
+
+
+def _link_if_unchanged(src, link_src, dst):
+    """
+    Hard link link_src to dst if it is a regular file with the same content as src. The content
+    is only compared if both files have the same size. Modification times are not compared,
+    because src is usually regenerated in a new working directory for every publish.
+
+    :param src: path to the file that is being copied
+    :type  src: basestring
+    :param link_src: path to a file that may be linked instead
+    :type  link_src: basestring
+    :param dst: path of the copy
+    :type  dst: basestring
+    :return: True if dst was linked, False if src still needs to be copied
+    :rtype:  bool
+    """
+    try:
+        link_stat = os.lstat(link_src)
+    except OSError:
+        return False
+    if not stat.S_ISREG(link_stat.st_mode):
+        return False
+    if os.path.getsize(src) != link_stat.st_size:
+        return False
+    if not _same_content(src, link_src):
+        return False
+    try:
+        os.link(link_src, dst)
+    except OSError, e:
+        # link_src may be on another filesystem, or the filesystem may not support hard links
+        if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            return False
+        raise
+    return True
+
+
+def _same_content(path_1, path_2):
+    """
+    :return: True if the two files have the same content
+    :rtype:  bool
+    """
+    with open(path_1, 'rb') as file_1:
+        with open(path_2, 'rb') as file_2:
+            while True:
+                block_1 = file_1.read(COMPARE_BLOCK_SIZE)
+                if block_1 != file_2.read(COMPARE_BLOCK_SIZE):
+                    return False
+                if not block_1:
+                    return True
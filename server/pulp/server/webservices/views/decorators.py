@@ -9,7 +9,6 @@ from pulp.server.auth.authorization import CREATE, READ, UPDATE, DELETE, EXECUTE
 from pulp.server.config import config
 from pulp.server.compat import wraps
 from pulp.server.controllers import user as user_controller
-from pulp.server.db import model
 from pulp.server.exceptions import PulpCodedAuthenticationException
 from pulp.server.managers import factory
 from pulp.server.webservices import http
@@ -168,7 +167,7 @@ def _verify_auth(self, operation, super_user_only, method, *args, **kwargs):
 
     # Consumers are not part of the User collection
     if not is_consumer:
-        user = model.User.objects.get(login=login)
+        user = user_controller.get_authorization(login)[0]
         if super_user_only and not user.is_superuser():
             raise PulpCodedAuthenticationException(error_code=error_codes.PLP0026, user=login,
                                                    operation=OPERATION_NAMES[operation])
@@ -184,7 +183,6 @@ def _verify_auth(self, operation, super_user_only, method, *args, **kwargs):
                                                        user=login,
                                                        operation=OPERATION_NAMES[operation])
         elif user_controller.is_authorized(http.resource_path(), login, operation):
-            user = model.User.objects.get(login=login)
             principal_manager.set_principal(user)
         else:
             raise PulpCodedAuthenticationException(error_code=error_codes.PLP0026,
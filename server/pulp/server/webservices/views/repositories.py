@@ -1,3 +1,5 @@
+import base64
+
 import isodate
 
 from django.core.urlresolvers import reverse
@@ -6,6 +8,7 @@ from django.views.generic import View
 from pulp.common import constants, dateutils, tags
 from pulp.server import exceptions
 from pulp.server.auth import authorization
+from pulp.server.compat import json_util
 from pulp.server.controllers import importer as importer_controller
 from pulp.server.controllers import repository as repo_controller
 from pulp.server.controllers import distributor as dist_controller
@@ -22,10 +25,15 @@ from pulp.server.webservices.views.schedule import ScheduleResource
 from pulp.server.webservices.views.util import (generate_json_response,
                                                 generate_json_response_with_pulp_encoder,
                                                 generate_redirect_response,
+                                                generate_streaming_json_response_with_pulp_encoder,
                                                 json_body_allow_empty,
                                                 json_body_required)
 
 
+# Response header carrying the token that continues a unit search where its page ended
+CONTINUATION_HEADER = 'Pulp-Continuation'
+
+
 def _merge_related_objects(name, model, repos):
     """
     Modifies in place a list of repo dicts and adds their corresponding related objects in a list
@@ -253,11 +261,56 @@ class RepoSearch(search.SearchView):
                               options.get('distributors', False))
 
 
+def _encode_continuation(position):
+    """
+    Create an opaque continuation token that resumes a unit search after the association
+    at the given position.
+
+    :param position: position of the last association returned to the client, as returned
+                     by RepoUnitAssociationQueryManager.association_position
+    :type  position: list
+    :return: continuation token
+    :rtype:  str
+    """
+    return base64.urlsafe_b64encode(json_util.dumps(position))
+
+
+def _decode_continuation(token):
+    """
+    Get the position of the last association returned to the client from a continuation
+    token created by _encode_continuation.
+
+    :param token: continuation token
+    :type  token: basestring
+    :return: position of the association to resume the search after
+    :rtype:  list
+
+    :raises exceptions.InvalidValue: if the token is not valid
+    """
+    try:
+        position = json_util.loads(base64.urlsafe_b64decode(str(token)))
+    except (TypeError, ValueError, UnicodeEncodeError):
+        raise exceptions.InvalidValue(['continuation'])
+    if not isinstance(position, list):
+        raise exceptions.InvalidValue(['continuation'])
+    return position
+
+
 class RepoUnitSearch(search.SearchView):
     """
     Adds GET and POST searching for units within a repository.
+
+    Searches without a limit are serialized while the units are read from the database, so
+    the units of the whole repository are never held in memory.
+
+    When the criteria has a limit, units are returned in association order and a full page
+    of units is returned, the response carries a continuation token in its Pulp-Continuation
+    header. Passing the token back as the continuation option together with the same criteria
+    returns the units that follow the last unit of the page.
     """
 
+    optional_string_fields = ('continuation',)
+
     @classmethod
     def _generate_response(cls, query, options, *args, **kwargs):
         """
@@ -274,17 +327,42 @@ class RepoUnitSearch(search.SearchView):
 
         :return:      The serialized search results in an HttpReponse
         :rtype:       django.http.HttpResponse
+
+        :raises exceptions.InvalidValue: if the continuation token is not valid for the criteria
         """
         repo_id = kwargs.get('repo_id')
         model.Repository.objects.get_repo_or_missing_resource(repo_id)
         criteria = UnitAssociationCriteria.from_client_input(query)
         manager = manager_factory.repo_unit_association_query_manager()
+        in_association_order = manager.in_association_order(criteria)
+
+        after = None
+        if options.get('continuation'):
+            after = _decode_continuation(options['continuation'])
+            if not in_association_order or \
+                    len(after) != len(manager.association_order(criteria)):
+                raise exceptions.InvalidValue(['continuation'])
+            # The token takes the place of the skip that led to the first page
+            criteria.skip = None
+
+        # Without a limit, the units are serialized as they are generated
+        as_generator = not criteria.limit
         if criteria.type_ids is not None and len(criteria.type_ids) == 1:
             type_id = criteria.type_ids[0]
-            units = manager.get_units_by_type(repo_id, type_id, criteria=criteria)
+            units = manager.get_units_by_type(repo_id, type_id, criteria=criteria,
+                                              as_generator=as_generator, after=after)
         else:
-            units = manager.get_units(repo_id, criteria=criteria)
-        return generate_json_response_with_pulp_encoder(units)
+            units = manager.get_units(repo_id, criteria=criteria, as_generator=as_generator,
+                                      after=after)
+
+        if as_generator:
+            return generate_streaming_json_response_with_pulp_encoder(units)
+
+        response = generate_json_response_with_pulp_encoder(units)
+        if in_association_order and len(units) == criteria.limit:
+            position = manager.association_position(criteria, units[-1])
+            response[CONTINUATION_HEADER] = _encode_continuation(position)
+        return response
 
 
 class RepoImportersView(View):
@@ -881,6 +959,7 @@ class ContentApplicabilityRegenerationView(View):
                                               specific keys. Here, we create a parent exception
                                               for repo_criteria and include the specific keys as
                                               child exceptions.
+        :raises exceptions.InvalidValue: if force is not a boolean
         :raises exceptions.OperationPostponed: dispatch a task
         """
         class GroupCallReport(dict):
@@ -897,8 +976,12 @@ class ContentApplicabilityRegenerationView(View):
             invalid_criteria.add_child_exception(e)
             raise invalid_criteria
 
+        force = request.body_as_json.get('force', False)
+        if not isinstance(force, bool):
+            raise exceptions.InvalidValue(['force'])
+
         async_result = ApplicabilityRegenerationManager.queue_regenerate_applicability_for_repos(
-            repo_criteria.as_dict())
+            repo_criteria.as_dict(), force=force)
         ret = GroupCallReport()
         ret['group_id'] = str(async_result)
         ret['_href'] = reverse('task_group', kwargs={'group_id': str(async_result)})
@@ -3,11 +3,18 @@ from functools import wraps
 
 import functools
 import httplib
+import itertools
 import json
+import logging
 import sys
 
 from django.http import HttpResponse
 from django.utils.encoding import iri_to_uri
+try:
+    from django.http import StreamingHttpResponse
+except ImportError:
+    # Django 1.4 cannot stream responses
+    StreamingHttpResponse = None
 
 from pulp.common import dateutils, error_codes
 from pulp.common.util import decode_unicode, encode_unicode
@@ -15,6 +22,12 @@ from pulp.server.compat import json_util
 from pulp.server.exceptions import PulpCodedValidationException, InputEncodingError
 
 
+_logger = logging.getLogger(__name__)
+
+# The number of items of a streamed JSON array that are serialized into one chunk
+JSON_STREAM_CHUNK_SIZE = 100
+
+
 def pulp_json_encoder(obj):
     """
     Specialized json encoding.
@@ -65,6 +78,96 @@ generate_json_response_with_pulp_encoder = functools.partial(
 )
 
 
+def generate_streaming_json_response(items, default=None,
+                                    content_type='application/json; charset=utf-8'):
+    """
+    Serialize an iterable as a JSON array while the response is being sent, so the items
+    never have to be held in memory all at once.
+
+    The first chunk of items is serialized before the response is returned, so that errors
+    raised when the items start being generated, such as an invalid query, are handled by
+    the exception middleware as usual. Errors raised after that can no longer change the
+    response status: they are logged and the response is aborted, so the client receives a
+    truncated body rather than a complete JSON document.
+
+    Django 1.4 cannot stream responses, so there the whole body is built up front.
+
+    :param items        : items to be serialized
+    :type  items        : iterable of anything that is serializable by json.dumps
+    :param default      : function used by json.dumps to serialize the items (also called default)
+    :type  default      : function or None
+    :param content_type : type of returned content
+    :type  content_type : str
+
+    :return             : response streaming the serialized items
+    :rtype              : StreamingHttpResponse or HttpResponse
+    """
+    chunks = _json_array_chunks(items, default)
+    if StreamingHttpResponse is None:
+        return HttpResponse(''.join(chunks), content_type=content_type)
+    # the opening bracket and the first chunk of items
+    head = list(itertools.islice(chunks, 2))
+    return StreamingHttpResponse(itertools.chain(head, _abort_on_error(chunks)),
+                                 content_type=content_type)
+
+
+def _abort_on_error(chunks):
+    """
+    Pass the chunks of a streamed response through, logging any error raised while they
+    are generated. The error is raised again so that the server aborts the response.
+
+    :param chunks : chunks of the response body
+    :type  chunks : iterator of str
+
+    :return       : generator of the same chunks
+    :rtype        : generator
+    """
+    try:
+        for chunk in chunks:
+            yield chunk
+    except Exception:
+        _logger.exception('Error while streaming a response; the response is truncated.')
+        raise
+
+
+def _json_array_chunks(items, default):
+    """
+    Generate the serialization of a JSON array a few items at a time.
+
+    :param items   : items to be serialized
+    :type  items   : iterable
+    :param default : function used by json.dumps to serialize the items
+    :type  default : function or None
+
+    :return        : generator of strings that make up the JSON array
+    :rtype         : generator
+    """
+    yield '['
+    separator = ''
+    chunk = []
+    for item in items:
+        chunk.append(json.dumps(item, default=default))
+        if len(chunk) == JSON_STREAM_CHUNK_SIZE:
+            yield separator + ', '.join(chunk)
+            separator = ', '
+            chunk = []
+    if chunk:
+        yield separator + ', '.join(chunk)
+    yield ']'
+
+
+"""
+Shortcut function to generate a streamed json response using the in house json_encoder.
+
+This function is equivalent to:
+generate_streaming_json_response(items, default=pulp_json_encoder)
+"""
+generate_streaming_json_response_with_pulp_encoder = functools.partial(
+    generate_streaming_json_response,
+    default=pulp_json_encoder,
+)
+
+
 def generate_redirect_response(response, href):
     response['Location'] = iri_to_uri(href)
     response.status_code = httplib.CREATED
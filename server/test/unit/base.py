@@ -4,6 +4,7 @@ import mock
 
 from pulp.common.compat import unittest
 from pulp.server.async import celery_instance
+from pulp.server.controllers import user as user_controller
 from pulp.server.db.model import TaskStatus, ReservedResource, Worker
 from pulp.server.managers import factory as manager_factory
 from pulp.server.managers.auth.cert.cert_generator import SerialNumber
@@ -27,6 +28,7 @@ class PulpServerTests(unittest.TestCase):
     def setUp(self):
         super(PulpServerTests, self).setUp()
         self._mocks = {}
+        user_controller.invalidate_authorization_cache()
         self.clean()
 
     def tearDown(self):
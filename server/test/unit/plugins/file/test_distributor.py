@@ -151,6 +151,85 @@ class FileDistributorTest(unittest.TestCase):
         # Ensure the old rpm is no longer included
         self.assertFalse(os.path.islink(target_file))
 
+    def test_republish_only_changes_differences(self):
+        """
+        Assert that republishing leaves unchanged links in place, replaces changed links and
+        removes stale entries, and that the manifest is updated.
+        """
+        distributor = self.create_distributor_with_mocked_api_calls()
+        distributor.publish_repo(self.repo, self.publish_conduit, {})
+        target_file = os.path.join(self.target_dir, SAMPLE_RPM)
+        original_inode = os.lstat(target_file).st_ino
+        stale_dir = os.path.join(self.target_dir, 'stale')
+        os.makedirs(stale_dir)
+
+        moved_unit = copy.deepcopy(self.unit)
+        moved_unit.unit_key['name'] = 'moved.rpm'
+        moved_unit.storage_path = os.path.join(DATA_DIR, SAMPLE_FILE)
+        new_conduit = get_publish_conduit(existing_units=[self.unit, moved_unit])
+        with open(os.path.join(self.target_dir, 'moved.rpm'), 'w') as f:
+            f.write('not a link')
+        distributor.publish_repo(self.repo, new_conduit, {})
+
+        self.assertEqual(os.lstat(target_file).st_ino, original_inode)
+        self.assertEqual(readlink(os.path.join(self.target_dir, 'moved.rpm')),
+                         moved_unit.storage_path)
+        self.assertFalse(os.path.exists(stale_dir))
+        self.assertEqual(sorted(os.listdir(self.target_dir)),
+                         sorted([MANIFEST_FILENAME, SAMPLE_RPM, 'moved.rpm']))
+        with open(os.path.join(self.target_dir, MANIFEST_FILENAME), 'rb') as f:
+            self.assertEqual([row[0] for row in csv.reader(f)], [SAMPLE_RPM, 'moved.rpm'])
+
+    def test_republish_calls_overridden_unpublish(self):
+        """
+        Assert that a subclass that overrides unpublish_repo is unpublished before each publish,
+        so it can delete what it no longer publishes.
+        """
+        unpublished = []
+
+        class CleaningDistributor(FileDistributor):
+            def unpublish_repo(self, repo, config):
+                unpublished.append((repo, config))
+
+        distributor = CleaningDistributor()
+        distributor.get_hosting_locations = Mock(return_value=[self.target_dir])
+        distributor.post_repo_publish = Mock()
+
+        result = distributor.publish_repo(self.repo, self.publish_conduit, {})
+
+        self.assertTrue(result.success_flag)
+        self.assertEqual(unpublished, [(self.repo, {})])
+        self.assertTrue(os.path.islink(os.path.join(self.target_dir, SAMPLE_RPM)))
+
+    def test_republish_base_unpublish_not_called(self):
+        """
+        Assert that the base class, which only publishes to its hosting locations, updates them
+        in place without unpublishing first.
+        """
+        distributor = self.create_distributor_with_mocked_api_calls()
+        distributor.unpublish_repo = Mock()
+
+        distributor.publish_repo(self.repo, self.publish_conduit, {})
+
+        self.assertFalse(distributor.unpublish_repo.called)
+
+    def test_publish_build_dir_replaces_file(self):
+        """
+        Assert that a hosting location that isn't a directory is replaced by the build dir.
+        """
+        build_dir = os.path.join(self.temp_dir, 'build')
+        os.makedirs(build_dir)
+        os.symlink('/some/unit', os.path.join(build_dir, 'unit'))
+        with open(os.path.join(build_dir, MANIFEST_FILENAME), 'w') as f:
+            f.write('manifest')
+        with open(self.target_dir, 'w') as f:
+            f.write('not a directory')
+
+        FileDistributor()._publish_build_dir(build_dir, self.target_dir)
+
+        self.assertEqual(readlink(os.path.join(self.target_dir, 'unit')), '/some/unit')
+        self.assertEqual(sorted(os.listdir(self.target_dir)), [MANIFEST_FILENAME, 'unit'])
+
     def test_distributor_removed_calls_unpublish(self):
         distributor = self.create_distributor_with_mocked_api_calls()
         distributor.unpublish_repo = Mock()
@@ -247,6 +247,44 @@ class MetadataWriterTests(unittest.TestCase):
                                                    expected_metadata_file_name)
         self.assertEquals(expected_metadata_file_path, context.metadata_file_path)
 
+    def test_finalize_checksum_calculated_while_writing(self):
+        path = os.path.join(self.metadata_file_dir, 'test.xml')
+        context = MetadataFileContext(path, 'sha256')
+
+        context.initialize()
+        context.metadata_file_handle.write('some metadata')
+        with patch('__builtin__.open') as mock_open:
+            context.finalize()
+
+        self.assertFalse(mock_open.called)
+        self.assertEqual(context.checksum, hashlib.sha256('some metadata').hexdigest())
+        with open(context.metadata_file_path, 'rb') as h:
+            self.assertEqual(h.read(), 'some metadata')
+
+    def test_finalize_checksum_gzip(self):
+        path = os.path.join(self.metadata_file_dir, 'test.xml.gz')
+        context = MetadataFileContext(path, 'sha256')
+
+        context.initialize()
+        context.metadata_file_handle.write('some metadata')
+        context.finalize()
+
+        with open(context.metadata_file_path, 'rb') as h:
+            self.assertEqual(context.checksum, hashlib.sha256(h.read()).hexdigest())
+        h = gzip.open(context.metadata_file_path)
+        self.assertEqual(h.read(), 'some metadata')
+        h.close()
+
+    def test_finalize_checksum_handle_not_opened_by_context(self):
+        path = os.path.join(self.metadata_file_dir, 'test.xml')
+        context = MetadataFileContext(path, 'sha256')
+
+        context.metadata_file_handle = open(path, 'w')
+        context.metadata_file_handle.write('some metadata')
+        context.finalize()
+
+        self.assertEqual(context.checksum, hashlib.sha256('some metadata').hexdigest())
+
     @patch('pulp.plugins.util.metadata_writer._LOG.exception')
     def test_finalize_error_on_footer(self, mock_logger):
 
@@ -199,6 +199,92 @@ class StepTests(PublisherBase):
         step.report_progress()
         self.assertFalse(step.status_conduit.report_progress.called)
 
+    @patch('pulp.plugins.util.publish_step.time.time')
+    def test_report_progress_throttled(self, mock_time):
+        """
+        Test that progress is written at most once every PROGRESS_REPORT_INTERVAL seconds
+        """
+        step = publish_step.Step('foo_step')
+        step.status_conduit = Mock()
+        step.get_progress_report = Mock()
+
+        mock_time.return_value = 1000
+        step.report_progress()
+        mock_time.return_value = 1000 + publish_step.PROGRESS_REPORT_INTERVAL / 2.0
+        step.report_progress()
+        self.assertEquals(1, step.status_conduit.set_progress.call_count)
+
+        mock_time.return_value = 1000 + publish_step.PROGRESS_REPORT_INTERVAL
+        step.report_progress()
+        self.assertEquals(2, step.status_conduit.set_progress.call_count)
+
+    @patch('pulp.plugins.util.publish_step.time.time')
+    def test_report_progress_forced(self, mock_time):
+        """
+        Test that forced writes and state changes are not throttled
+        """
+        mock_time.return_value = 1000
+        step = publish_step.Step('foo_step')
+        step.status_conduit = Mock()
+        step.get_progress_report = Mock()
+
+        step.report_progress()
+        step.report_progress(force=True)
+        step.state = reporting_constants.STATE_RUNNING
+        step.report_progress()
+        step.report_progress()
+
+        self.assertEquals(3, step.status_conduit.set_progress.call_count)
+
+    @patch('pulp.plugins.util.publish_step.time.time')
+    def test_process_reports_completion(self, mock_time):
+        """
+        Test that the progress of a step is written once it completes, even if throttled
+        """
+        mock_time.return_value = 1000
+        step = publish_step.Step('foo_step')
+        step.status_conduit = Mock()
+
+        step.process()
+
+        progress = step.status_conduit.set_progress.call_args[0][0]
+        self.assertEquals(reporting_constants.STATE_COMPLETE,
+                          progress[0][reporting_constants.PROGRESS_STATE_KEY])
+
+    def test_process_reports_failure(self):
+        """
+        Test that the progress of a step is written when it fails
+        """
+        step = publish_step.Step('foo_step')
+        step.status_conduit = Mock()
+        step.process_main = Mock(side_effect=ValueError())
+
+        self.assertRaises(ValueError, step.process)
+
+        progress = step.status_conduit.set_progress.call_args[0][0]
+        self.assertEquals(reporting_constants.STATE_FAILED,
+                          progress[0][reporting_constants.PROGRESS_STATE_KEY])
+
+    @patch('pulp.plugins.util.publish_step._logger')
+    def test_process_failed_final_report(self, mock_logger):
+        """
+        Test that a failure to write the final progress does not replace the step's exception
+        """
+        step = publish_step.Step('foo_step')
+        step.status_conduit = Mock()
+        step.process_main = Mock(side_effect=ValueError())
+
+        def report_progress(force=False):
+            if force:
+                raise TypeError()
+
+        step.report_progress = Mock(side_effect=report_progress)
+
+        self.assertRaises(ValueError, step.process)
+
+        step.report_progress.assert_called_with(force=True)
+        self.assertEquals(1, mock_logger.exception.call_count)
+
 
 class TestStepProcessBlock(unittest.TestCase):
     def test_increments_progress(self):
@@ -761,6 +847,75 @@ class TestAtomicDirectoryPublishStep(unittest.TestCase):
         self.assertTrue(os.path.exists(existing_file))
         self.assertEquals(1, len(os.listdir(master_dir)))
 
+    def _publish_twice(self, incremental):
+        """
+        Publish a tree, change one of its files and publish it again.
+
+        :return: the inodes of the published unchanged and changed files after each publish
+        :rtype:  list of tuples
+        """
+        source_dir = os.path.join(self.working_directory, 'source')
+        master_dir = os.path.join(self.working_directory, 'master')
+        publish_dir = os.path.join(self.working_directory, 'publish', 'bar')
+        unchanged_file = os.path.join(source_dir, 'unchanged.html')
+        changed_file = os.path.join(source_dir, 'foo', 'changed.html')
+        touch(unchanged_file)
+        touch(changed_file)
+
+        inodes = []
+        for timestamp, content in (('1.0', 'old'), ('2.0', 'new')):
+            with open(changed_file, 'w') as f:
+                f.write(content)
+            step = publish_step.AtomicDirectoryPublishStep(
+                source_dir, [('/', publish_dir)], master_dir, incremental=incremental)
+            step.parent = Mock(timestamp=timestamp)
+            step.process_main()
+
+            self.assertEquals(os.path.realpath(publish_dir), os.path.join(master_dir, timestamp))
+            self.assertEquals([timestamp], os.listdir(master_dir))
+            with open(os.path.join(publish_dir, 'foo', 'changed.html')) as f:
+                self.assertEquals(content, f.read())
+            inodes.append((os.stat(os.path.join(publish_dir, 'unchanged.html')).st_ino,
+                           os.stat(os.path.join(publish_dir, 'foo', 'changed.html')).st_ino))
+        return inodes
+
+    def test_process_main_incremental(self):
+        (unchanged_1, changed_1), (unchanged_2, changed_2) = self._publish_twice(True)
+
+        # The unchanged file was linked from the previous master, the changed one was copied
+        self.assertEquals(unchanged_1, unchanged_2)
+        self.assertNotEquals(changed_1, changed_2)
+
+    @patch('pulp.plugins.util.publish_step.copytree')
+    def test_process_main_not_incremental(self, mock_copytree):
+        source_dir = os.path.join(self.working_directory, 'source')
+        master_dir = os.path.join(self.working_directory, 'master')
+        os.makedirs(os.path.join(master_dir, '1.0'))
+        step = publish_step.AtomicDirectoryPublishStep(source_dir, [], master_dir,
+                                                       incremental=False)
+        step.parent = Mock(timestamp='2.0')
+
+        step.process_main()
+
+        mock_copytree.assert_called_once_with(source_dir, os.path.join(master_dir, '2.0'),
+                                              symlinks=True, link_dir=None)
+
+    def test_previous_master_dir(self):
+        master_dir = os.path.join(self.working_directory, 'master')
+        for name in ('1.5', '10.25', '3.0', 'other', '20.0'):
+            os.makedirs(os.path.join(master_dir, name))
+        step = publish_step.AtomicDirectoryPublishStep('source', [], master_dir)
+        step.parent = Mock(timestamp='20.0')
+
+        self.assertEquals(step._previous_master_dir(), os.path.join(master_dir, '10.25'))
+
+    def test_previous_master_dir_missing(self):
+        master_dir = os.path.join(self.working_directory, 'master')
+        step = publish_step.AtomicDirectoryPublishStep('source', [], master_dir)
+        step.parent = Mock(timestamp='20.0')
+
+        self.assertEquals(step._previous_master_dir(), None)
+
 
 class TestSaveTarFilePublishStep(unittest.TestCase):
     def setUp(self):
@@ -1037,7 +1192,7 @@ class DownloadStepTests(unittest.TestCase):
         self.assertTrue(dlstep.downloader.is_canceled)
 
 
-@patch('pulp.plugins.util.publish_step.repo_controller.associate_single_unit')
+@patch('pulp.plugins.util.publish_step.repo_controller.associate_units')
 @patch('pulp.plugins.util.publish_step.units_controller.find_units')
 class TestGetLocalUnitsStep(unittest.TestCase):
 
@@ -1084,6 +1239,7 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         self.step.process_main()
 
         self.assertEqual(self.step.conduit.save_unit.call_count, 0)
+        self.assertEqual(mock_associate.call_count, 0)
         self.assertEqual(self.step.units_to_download, [])
 
     @patch('pulp.plugins.util.publish_step.misc.paginate')
@@ -1107,7 +1263,7 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         mock_find_units.return_value = [existing_demo]
 
         self.step.process_main()
-        mock_associate.assert_called_once_with('fake_repo', existing_demo)
+        mock_associate.assert_called_once_with('fake_repo', [existing_demo])
         mock_find_units.assert_called_once_with((demo, ))
 
         # Ensure that the unit was not marked for download
@@ -1129,7 +1285,7 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         mock_find_units.assert_called_once_with((demo_1, demo_2))
 
         # the one that exists is associated
-        mock_associate.assert_called_once_with('fake_repo', existing_demo)
+        mock_associate.assert_called_once_with('fake_repo', [existing_demo])
         # the one that does not exist yet is added to the download list
         self.assertEqual(self.step.units_to_download, [demo_1])
 
@@ -1157,7 +1313,7 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         # being ignored and the correct available_units is being used instead.
         mock_find_units.assert_called_once_with((demo_1, demo_2, demo_3))
         # the one that exists is associated
-        mock_associate.assert_called_once_with('fake_repo', existing_demo)
+        mock_associate.assert_called_once_with('fake_repo', [existing_demo])
         # the two that do not exist yet are added to the download list
         self.assertEqual(step.units_to_download, [demo_1, demo_3])
 
@@ -3,12 +3,19 @@ This module contains tests for the pulp.server.async.emit module.
 """
 import unittest
 
+from kombu.exceptions import LimitExceeded
 import mock
+
+from pulp.server.async import emit
 from pulp.server.async.emit import send
 
 
 class TestEmit(unittest.TestCase):
 
+    def setUp(self):
+        emit._recently_sent.clear()
+        emit._dropped.clear()
+
     @mock.patch('pulp.server.async.emit.config')
     def test_send_disabled(self, mock_config):
         """
@@ -39,41 +46,163 @@ class TestEmit(unittest.TestCase):
                                                  'event message not sent')
 
     @mock.patch('pulp.server.async.emit.config')
-    @mock.patch('pulp.server.async.emit.Connection')
-    @mock.patch('pulp.server.async.emit.Producer')
-    def test_send_other_exception(self, mock_producer, mock_conn, mock_config):
+    @mock.patch('pulp.server.async.emit._get_connection')
+    @mock.patch('pulp.server.async.emit.producers')
+    def test_send_other_exception(self, mock_producers, mock_conn, mock_config):
         """
         Raise an exception if we get an Exception when sending a message
         """
         doc = mock.Mock()
         doc.to_json.return_value = '{"a": "B"}'
         mock_config.getboolean.return_value = True
-        mock_config.get.return_value = "amqp://some.amqp.url/"
-        mock_producer.side_effect = Exception("boom!")
+        mock_producers.__getitem__.return_value.acquire.side_effect = Exception("boom!")
 
         self.assertRaises(Exception, send, doc)
 
+    @mock.patch('pulp.server.async.emit._logger')
     @mock.patch('pulp.server.async.emit.config')
-    @mock.patch('pulp.server.async.emit.Producer')
-    @mock.patch('pulp.server.async.emit.Connection')
+    @mock.patch('pulp.server.async.emit._get_connection')
+    @mock.patch('pulp.server.async.emit.producers')
+    def test_send_no_producer(self, mock_producers, mock_conn, mock_config, mock_logger):
+        """
+        Ensure the message is dropped when every producer in the pool is busy
+        """
+        doc = mock.Mock()
+        doc.to_json.return_value = '{"a": "B"}'
+        mock_config.getboolean.return_value = True
+        mock_producers.__getitem__.return_value.acquire.side_effect = LimitExceeded()
+
+        send(doc)
+
+        mock_producers.__getitem__.return_value.acquire.assert_called_once_with(block=False)
+        self.assertEqual(mock_logger.warn.call_count, 1)
+
+    @mock.patch('pulp.server.async.emit.config')
+    @mock.patch('pulp.server.async.emit._get_connection')
+    @mock.patch('pulp.server.async.emit.producers')
     @mock.patch('pulp.server.async.emit.Exchange')
-    def test_send(self, mock_exchange, mock_conn, mock_producer, mock_config):
+    def test_send(self, mock_exchange, mock_producers, mock_conn, mock_config):
         """
         Test a successful send
         """
         doc = mock.Mock()
         doc.to_json.return_value = '{"a": "B"}'
         mock_config.getboolean.return_value = True
-        mock_config.get.return_value = "amqp://some.amqp.url/"
 
         mock_exchange_instance = mock.Mock()
         mock_exchange.return_value = mock_exchange_instance
 
-        mock_producer_instance = mock.Mock()
-        mock_producer.return_value = mock_producer_instance
+        mock_pool = mock_producers.__getitem__.return_value
+        mock_producer_instance = mock_pool.acquire.return_value.__enter__.return_value
 
         send(doc)
 
-        mock_producer_instance.maybe_declare.assert_called_once_with(mock_exchange_instance)
-        mock_producer_instance.publish.assert_called_once_with('{"a": "B"}', routing_key=None,
-                                                               exchange=mock_exchange_instance)
+        mock_producers.__getitem__.assert_called_once_with(mock_conn.return_value)
+        mock_producer_instance.publish.assert_called_once_with(
+            '{"a": "B"}', routing_key=None, exchange=mock_exchange_instance,
+            declare=[mock_exchange_instance], retry=True,
+            retry_policy=emit.PUBLISH_RETRY_POLICY)
+
+    @mock.patch('pulp.server.async.emit.config')
+    @mock.patch('pulp.server.async.emit._get_connection')
+    @mock.patch('pulp.server.async.emit.producers')
+    def test_send_throttled(self, mock_producers, mock_conn, mock_config):
+        """
+        Ensure successive documents in the same state are collapsed, but a change of state
+        is always sent, after the last document dropped in the previous state
+        """
+        mock_config.getboolean.return_value = True
+        mock_config.getfloat.return_value = 60
+        mock_pool = mock_producers.__getitem__.return_value
+        mock_producer_instance = mock_pool.acquire.return_value.__enter__.return_value
+
+        send(mock.Mock(state='running', **{'to_json.return_value': '1'}), routing_key='tasks.1')
+        send(mock.Mock(state='running', **{'to_json.return_value': '2'}), routing_key='tasks.1')
+        send(mock.Mock(state='running', **{'to_json.return_value': '3'}), routing_key='tasks.1')
+        send(mock.Mock(state='running', **{'to_json.return_value': '4'}), routing_key='tasks.2')
+        send(mock.Mock(state='finished', **{'to_json.return_value': '5'}), routing_key='tasks.1')
+
+        payloads = [c[0][0] for c in mock_producer_instance.publish.call_args_list]
+        self.assertEqual(payloads, ['1', '4', '3', '5'])
+        mock_config.getfloat.assert_called_with('messaging', 'event_notification_interval')
+
+    @mock.patch('pulp.server.async.emit.config')
+    @mock.patch('pulp.server.async.emit._get_connection')
+    @mock.patch('pulp.server.async.emit.producers')
+    def test_send_not_throttled(self, mock_producers, mock_conn, mock_config):
+        """
+        Ensure nothing is collapsed when the interval is 0
+        """
+        mock_config.getboolean.return_value = True
+        mock_config.getfloat.return_value = 0
+        mock_pool = mock_producers.__getitem__.return_value
+        mock_producer_instance = mock_pool.acquire.return_value.__enter__.return_value
+
+        send(mock.Mock(state='running'), routing_key='tasks.1')
+        send(mock.Mock(state='running'), routing_key='tasks.1')
+
+        self.assertEqual(mock_producer_instance.publish.call_count, 2)
+
+    @mock.patch('pulp.server.async.emit.config')
+    @mock.patch('pulp.server.async.emit._get_connection')
+    @mock.patch('pulp.server.async.emit.producers')
+    def test_send_dropped_superseded(self, mock_producers, mock_conn, mock_config):
+        """
+        Ensure a dropped document is not sent once a later document in the same state was
+        """
+        mock_config.getboolean.return_value = True
+        mock_config.getfloat.return_value = 60
+        mock_pool = mock_producers.__getitem__.return_value
+        mock_producer_instance = mock_pool.acquire.return_value.__enter__.return_value
+
+        send(mock.Mock(state='running', **{'to_json.return_value': '1'}), routing_key='tasks.1')
+        send(mock.Mock(state='running', **{'to_json.return_value': '2'}), routing_key='tasks.1')
+        # the interval has passed
+        emit._recently_sent.clear()
+        send(mock.Mock(state='running', **{'to_json.return_value': '3'}), routing_key='tasks.1')
+        send(mock.Mock(state='finished', **{'to_json.return_value': '4'}), routing_key='tasks.1')
+
+        payloads = [c[0][0] for c in mock_producer_instance.publish.call_args_list]
+        self.assertEqual(payloads, ['1', '3', '4'])
+
+
+    @mock.patch('pulp.server.async.emit.config')
+    @mock.patch('pulp.server.async.emit._get_connection')
+    @mock.patch('pulp.server.async.emit.producers')
+    def test_send_complete_not_throttled(self, mock_producers, mock_conn, mock_config):
+        """
+        Ensure documents in a complete state are always sent
+        """
+        mock_config.getboolean.return_value = True
+        mock_config.getfloat.return_value = 60
+        mock_pool = mock_producers.__getitem__.return_value
+        mock_producer_instance = mock_pool.acquire.return_value.__enter__.return_value
+
+        send(mock.Mock(state='finished', **{'to_json.return_value': '1'}), routing_key='tasks.1')
+        send(mock.Mock(state='finished', **{'to_json.return_value': '2'}), routing_key='tasks.1')
+
+        payloads = [c[0][0] for c in mock_producer_instance.publish.call_args_list]
+        self.assertEqual(payloads, ['1', '2'])
+
+
+class TestGetConnection(unittest.TestCase):
+
+    def tearDown(self):
+        emit._connection = None
+
+    @mock.patch('pulp.server.async.emit.config')
+    @mock.patch('pulp.server.async.emit.Connection')
+    def test_connection_reused(self, mock_connection, mock_config):
+        """
+        Ensure a single connection is created per process
+        """
+        emit._connection = None
+        mock_config.get.return_value = 'amqp://some.amqp.url/'
+
+        first = emit._get_connection()
+        second = emit._get_connection()
+
+        self.assertTrue(first is second)
+        mock_connection.assert_called_once_with('amqp://some.amqp.url/')
+        mock_config.get.assert_called_once_with('messaging', 'event_notification_url')
+
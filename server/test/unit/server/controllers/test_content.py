@@ -232,13 +232,15 @@ class TestCreateDownloadRequests(TestCase):
     @patch(MODULE_PATH + 'get_working_directory', Mock(return_value='/working/'))
     @patch(MODULE_PATH + 'mkdir')
     @patch(MODULE_PATH + '_get_streamer_url')
-    @patch(MODULE_PATH + 'LazyCatalogEntry')
-    def test_create_download_requests(self, mock_catalog, mock_get_url, mock_mkdir):
+    @patch(MODULE_PATH + '_get_catalog_entries')
+    @patch(MODULE_PATH + '_get_unit_pages')
+    def test_create_download_requests(self, mock_get_pages, mock_get_entries, mock_get_url,
+                                      mock_mkdir):
         # Setup
         content_units = [Mock(id='123', type_id='abc', list_files=lambda: ['/file/path'])]
-        filtered_qs = mock_catalog.objects.filter.return_value
-        catalog_entry = filtered_qs.order_by.return_value.first.return_value
-        catalog_entry.path = '/storage/123/path'
+        mock_get_pages.return_value = iter([content_units])
+        catalog_entry = Mock(path='/storage/123/path')
+        mock_get_entries.return_value = {('abc', '123', '/file/path'): catalog_entry}
         expected_data_dict = {
             content_controller.TYPE_ID: 'abc',
             content_controller.UNIT_ID: '123',
@@ -251,20 +253,133 @@ class TestCreateDownloadRequests(TestCase):
         }
 
         # Test
-        requests = content_controller._create_download_requests(content_units)
-        mock_catalog.objects.filter.assert_called_once_with(
-            unit_id='123',
-            unit_type_id='abc',
-            path='/file/path'
-        )
-        filtered_qs.order_by.assert_called_once_with('revision')
-        filtered_qs.order_by.return_value.first.assert_called_once_with()
+        requests = list(content_controller._create_download_requests(content_units))
+        mock_get_pages.assert_called_once_with(content_units)
+        mock_get_entries.assert_called_once_with(content_units)
         mock_mkdir.assert_called_once_with('/working/123')
         self.assertEqual(1, len(requests))
         self.assertEqual(mock_get_url.return_value, requests[0].url)
         self.assertEqual('/working/123/path', requests[0].destination)
         self.assertEqual(expected_data_dict, requests[0].data)
 
+    @patch(MODULE_PATH + 'Key.load', Mock())
+    @patch(MODULE_PATH + 'get_working_directory', Mock(return_value='/working/'))
+    @patch(MODULE_PATH + 'mkdir')
+    @patch(MODULE_PATH + '_get_streamer_url', Mock())
+    @patch(MODULE_PATH + '_get_catalog_entries')
+    @patch(MODULE_PATH + '_get_unit_pages')
+    def test_create_download_requests_no_entry(self, mock_get_pages, mock_get_entries,
+                                               mock_mkdir):
+        """Assert files without a catalog entry are skipped."""
+        content_units = [Mock(id='123', type_id='abc', list_files=lambda: ['/file/path'])]
+        mock_get_pages.return_value = iter([content_units])
+        mock_get_entries.return_value = {}
+
+        requests = list(content_controller._create_download_requests(content_units))
+        self.assertEqual([], requests)
+        self.assertEqual(0, mock_mkdir.call_count)
+
+    @patch(MODULE_PATH + 'Key.load', Mock())
+    @patch(MODULE_PATH + 'get_working_directory', Mock(return_value='/working/'))
+    @patch(MODULE_PATH + 'mkdir', Mock())
+    @patch(MODULE_PATH + '_get_streamer_url', Mock())
+    @patch(MODULE_PATH + '_get_unit_pages')
+    @patch(MODULE_PATH + '_get_catalog_entries')
+    def test_create_download_requests_lazy(self, mock_get_entries, mock_get_pages):
+        """Assert catalog entries are fetched one page at a time, as requests are consumed."""
+        first_page = (Mock(id='1', type_id='abc', list_files=lambda: ['/1']),)
+        second_page = (Mock(id='2', type_id='abc', list_files=lambda: ['/2']),)
+        mock_get_pages.return_value = iter([first_page, second_page])
+        mock_get_entries.side_effect = [{('abc', '1', '/1'): Mock(path='/1')},
+                                        {('abc', '2', '/2'): Mock(path='/2')}]
+
+        requests = content_controller._create_download_requests(['units'])
+        next(requests)
+        mock_get_entries.assert_called_once_with(first_page)
+        next(requests)
+        self.assertEqual(2, mock_get_entries.call_count)
+        mock_get_pages.assert_called_once_with(['units'])
+
+    @patch(MODULE_PATH + 'os.path.relpath', Mock(return_value='a/filename'))
+    @patch(MODULE_PATH + 'plugin_api.get_unit_model_by_id')
+    @patch(MODULE_PATH + 'Key.load', Mock())
+    @patch(MODULE_PATH + 'get_working_directory', Mock(return_value='/working/'))
+    @patch(MODULE_PATH + 'mkdir', Mock())
+    @patch(MODULE_PATH + '_get_streamer_url', Mock())
+    @patch(MODULE_PATH + '_get_catalog_entries')
+    @patch(MODULE_PATH + '_get_unit_pages')
+    def test_create_download_requests_multifile_downloaded_eagerly(
+            self, mock_get_pages, mock_get_entries, mock_get_model):
+        """
+        Assert a multi-file unit is handled as such when each request is downloaded before the
+        next one is generated.
+        """
+        content_units = [Mock(id='123', type_id='abc', list_files=lambda: ['/1', '/2'])]
+        mock_get_pages.return_value = iter([content_units])
+        mock_get_entries.return_value = {('abc', '123', '/1'): Mock(path='/storage/123/1'),
+                                          ('abc', '123', '/2'): Mock(path='/storage/123/2')}
+        step = content_controller.LazyUnitDownloadStep(
+            'test_step', 'Test Step', content_controller.LazyStatusConduit('fake-id'), [])
+        step.validate_file = Mock()
+        step.report_progress = Mock()
+        unit_qs = mock_get_model.return_value.objects.filter.return_value
+        unit = unit_qs.only.return_value.get.return_value
+
+        for request in content_controller._create_download_requests(content_units):
+            # Each request finishes before the next one is pulled from the generator
+            step.download_succeeded(Mock(data=request.data, destination=request.destination))
+            if request.destination == '/working/123/1':
+                self.assertEqual(0, unit_qs.update_one.call_count)
+
+        self.assertEqual(0, unit.set_storage_path.call_count)
+        unit_qs.update_one.assert_called_once_with(set__downloaded=True)
+        self.assertEqual(2, step.progress_successes)
+
+
+class TestGetUnitPages(TestCase):
+
+    @patch(MODULE_PATH + 'paginate')
+    @patch(MODULE_PATH + 'plugin_api.get_unit_model_by_id')
+    def test_get_unit_pages(self, mock_get_model, mock_paginate):
+        """Assert every unit ID is read before the first page is fetched by ID."""
+        mock_paginate.side_effect = lambda ids: [ids]
+        units = iter([Mock(id='1', type_id='abc'), Mock(id='2', type_id='abc')])
+
+        pages = content_controller._get_unit_pages(units)
+        page = next(pages)
+
+        self.assertEqual([], list(units))
+        mock_get_model.assert_called_once_with('abc')
+        unit_objects = mock_get_model.return_value.objects
+        unit_objects.assert_called_once_with(id__in=['1', '2'])
+        self.assertEqual(list(unit_objects.return_value), page)
+        self.assertRaises(StopIteration, next, pages)
+
+
+class TestGetCatalogEntries(TestCase):
+
+    @patch(MODULE_PATH + 'LazyCatalogEntry')
+    def test_get_catalog_entries(self, mock_catalog):
+        """Assert one query is made per type and the lowest revision of each entry is kept."""
+        content_units = [Mock(id='1', type_id='abc'), Mock(id='2', type_id='abc'),
+                         Mock(id='3', type_id='def')]
+        old = Mock(unit_type_id='abc', unit_id='1', path='/1', revision=0)
+        new = Mock(unit_type_id='abc', unit_id='1', path='/1', revision=1)
+        other = Mock(unit_type_id='def', unit_id='3', path='/3', revision=0)
+
+        def objects(unit_type_id, unit_id__in):
+            query_set = Mock()
+            query_set.order_by.return_value = {'abc': [new, old], 'def': [other]}[unit_type_id]
+            return query_set
+
+        mock_catalog.objects.side_effect = objects
+
+        entries = content_controller._get_catalog_entries(content_units)
+        self.assertEqual({('abc', '1', '/1'): old, ('def', '3', '/3'): other}, entries)
+        mock_catalog.objects.assert_any_call(unit_type_id='abc', unit_id__in=['1', '2'])
+        mock_catalog.objects.assert_any_call(unit_type_id='def', unit_id__in=['3'])
+        self.assertEqual(2, mock_catalog.objects.call_count)
+
 
 class TestGetStreamerUrl(TestCase):
 
@@ -376,6 +491,17 @@ class TestLazyUnitDownloadStep(TestCase):
         """Assert total is equal to the length of the download request list."""
         self.assertEqual(1, self.step.get_total())
 
+    def test_get_total_generator(self):
+        """Assert the total of generated requests is counted as they are downloaded."""
+        self.step.download_requests = (request for request in [Mock(), Mock()])
+        self.assertEqual(0, self.step.get_total())
+        self.step.total_units = self.step.get_total()
+        self.step.downloader = Mock()
+        self.step.downloader.download.side_effect = list
+
+        self.step._process_block()
+        self.assertEqual(2, self.step.total_units)
+
     @patch(MODULE_PATH + 'DeferredDownload')
     def test_download_started(self, mock_deferred_download):
         """Assert if validate_file raises an exception, the download is not skipped."""
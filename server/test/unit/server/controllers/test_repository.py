@@ -112,6 +112,15 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         list(repo_controller.find_repo_content_units(repo, repo_content_unit_q=rcu_filter))
         self.assertEquals(mock_rcu_objects.call_args[1]['repo_id'], 'foo')
         self.assertEquals(mock_rcu_objects.call_args[1]['q_obj'], rcu_filter)
+        mock_rcu_objects.return_value.order_by.assert_called_once_with('unit_type_id', 'unit_id')
+
+    def test_sort(self, mock_rcu_objects):
+        """
+        Test that the associations are sorted by the database
+        """
+        repo = MagicMock(repo_id='foo')
+        list(repo_controller.find_repo_content_units(repo, sort=['-created']))
+        mock_rcu_objects.return_value.order_by.assert_called_once_with('-created')
 
     @patch.object(DemoModel, 'objects')
     @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
@@ -124,7 +133,7 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         test_rcu = model.RepositoryContentUnit(repo_id='foo',
                                                unit_type_id='demo_model',
                                                unit_id='bar')
-        mock_rcu_objects.return_value = [test_rcu]
+        mock_rcu_objects.return_value.order_by.return_value = [test_rcu]
 
         u_filter = mongoengine.Q(key_field='baz')
         u_fields = ['key_field']
@@ -151,7 +160,7 @@ class FindRepoContentUnitsTest(unittest.TestCase):
         test_rcu = model.RepositoryContentUnit(repo_id='foo',
                                                unit_type_id='demo_model',
                                                unit_id='bar')
-        mock_rcu_objects.return_value = [test_rcu]
+        mock_rcu_objects.return_value.order_by.return_value = [test_rcu]
 
         u_filter = mongoengine.Q(key_field='baz')
         u_fields = ['key_field']
@@ -184,12 +193,15 @@ class FindRepoContentUnitsTest(unittest.TestCase):
             rcu_list.append(rcu)
             unit_list.append(DemoModel(id=unit_id, key_field=unit_key))
 
-        mock_rcu_objects.return_value = rcu_list
+        qs = mock_rcu_objects.return_value.order_by.return_value
+        qs.limit.return_value = rcu_list[:5]
 
         mock_get_model.return_value = DemoModel
         mock_demo_objects.return_value = unit_list
         result = list(repo_controller.find_repo_content_units(repo, limit=5))
 
+        qs.limit.assert_called_once_with(5)
+        self.assertFalse(qs.skip.called)
         self.assertEquals(5, len(result))
         self.assertEquals(result[0].unit_id, 'bar_0')
         self.assertEquals(result[4].unit_id, 'bar_4')
@@ -212,16 +224,50 @@ class FindRepoContentUnitsTest(unittest.TestCase):
             rcu_list.append(rcu)
             unit_list.append(DemoModel(id=unit_id, key_field=unit_key))
 
-        mock_rcu_objects.return_value = rcu_list
+        qs = mock_rcu_objects.return_value.order_by.return_value
+        qs.skip.return_value.limit.return_value = rcu_list[5:]
 
         mock_get_model.return_value = DemoModel
         mock_demo_objects.return_value = unit_list
         result = list(repo_controller.find_repo_content_units(repo, limit=5, skip=5))
 
+        qs.skip.assert_called_once_with(5)
+        qs.skip.return_value.limit.assert_called_once_with(5)
         self.assertEquals(5, len(result))
         self.assertEquals(result[0].unit_id, 'bar_5')
         self.assertEquals(result[4].unit_id, 'bar_9')
 
+    @patch.object(DemoModel, 'objects')
+    @patch('pulp.server.controllers.repository.plugin_api.get_unit_model_by_id')
+    def test_skip_and_limit_with_units_q(self, mock_get_model, mock_demo_objects,
+                                         mock_rcu_objects):
+        """
+        Test that skip and limit apply to the units matching units_q, in association order,
+        and that associations are no longer read once the limit is reached
+        """
+        repo = MagicMock(repo_id='foo')
+        rcu_list = [model.RepositoryContentUnit(repo_id='foo', unit_type_id='demo_model',
+                                                unit_id='bar_%i' % i) for i in range(10)]
+        # only the units with an even number match the query
+        unit_list = [DemoModel(id='bar_%i' % i, key_field='key') for i in range(0, 10, 2)]
+
+        def paginate(iterable):
+            yield tuple(rcu_list[:6])
+            yield tuple(rcu_list[6:])
+            self.fail('read past the last page that is needed')
+
+        mock_get_model.return_value = DemoModel
+        mock_demo_objects.return_value = unit_list
+        with patch('pulp.server.controllers.repository.paginate', paginate):
+            result = list(repo_controller.find_repo_content_units(
+                repo, units_q=mongoengine.Q(key_field='key'), limit=3, skip=1))
+
+        qs = mock_rcu_objects.return_value.order_by.return_value
+        self.assertFalse(qs.skip.called)
+        self.assertFalse(qs.limit.called)
+        self.assertEquals(['bar_2', 'bar_4', 'bar_6'], [rcu.unit_id for rcu in result])
+        self.assertEquals(2, mock_demo_objects.call_count)
+
 
 class FindUnitsNotDownloadedTests(unittest.TestCase):
 
@@ -340,6 +386,83 @@ class AssociateSingleUnitTests(unittest.TestCase):
             upsert=True)
 
 
+@patch('pulp.server.controllers.repository.model.RepositoryContentUnit._get_collection')
+@patch('pulp.server.controllers.repository.dateutils.format_iso8601_utc_timestamp')
+class AssociateUnitsTests(unittest.TestCase):
+
+    def test_bulk_upsert(self, mock_get_timestamp, mock_get_collection):
+        """
+        Test that the units are associated with a single unordered bulk upsert.
+        """
+        mock_get_timestamp.return_value = 'foo_tstamp'
+        bulk = mock_get_collection.return_value.initialize_unordered_bulk_op.return_value
+        bulk.execute.return_value = {'nUpserted': 1, 'nMatched': 1}
+        units = [DemoModel(id='bar', key_field='baz'), DemoModel(id='baz', key_field='baz')]
+        repo = MagicMock(repo_id='foo')
+
+        result = repo_controller.associate_units(repo, units)
+
+        self.assertEqual(result, (1, 1))
+        self.assertEqual(bulk.find.call_args_list, [
+            call({'repo_id': 'foo', 'unit_type_id': 'demo_model', 'unit_id': 'bar'}),
+            call({'repo_id': 'foo', 'unit_type_id': 'demo_model', 'unit_id': 'baz'})])
+        bulk.find.return_value.upsert.return_value.update_one.assert_called_with(
+            {'$setOnInsert': {'created': 'foo_tstamp'}, '$set': {'updated': 'foo_tstamp'}})
+        bulk.execute.assert_called_once_with()
+
+    @patch('pulp.server.controllers.repository.paginate')
+    def test_paginated(self, mock_paginate, mock_get_timestamp, mock_get_collection):
+        """
+        Test that one bulk operation is executed per page of units.
+        """
+        collection = mock_get_collection.return_value
+        bulk = collection.initialize_unordered_bulk_op.return_value
+        bulk.execute.return_value = {'nUpserted': 2, 'nMatched': 0}
+        units = [DemoModel(id=str(i), key_field='baz') for i in range(4)]
+        mock_paginate.return_value = [units[:2], units[2:]]
+
+        result = repo_controller.associate_units(MagicMock(repo_id='foo'), units)
+
+        self.assertEqual(result, (4, 0))
+        self.assertEqual(collection.initialize_unordered_bulk_op.call_count, 2)
+        self.assertEqual(bulk.execute.call_count, 2)
+
+    def test_no_units(self, mock_get_timestamp, mock_get_collection):
+        """
+        Test that nothing is written when there are no units.
+        """
+        result = repo_controller.associate_units(MagicMock(repo_id='foo'), [])
+
+        self.assertEqual(result, (0, 0))
+        self.assertFalse(mock_get_collection.return_value.initialize_unordered_bulk_op.called)
+
+    def test_concurrent_insert(self, mock_get_timestamp, mock_get_collection):
+        """
+        Test that an association inserted concurrently is counted as existing.
+        """
+        bulk = mock_get_collection.return_value.initialize_unordered_bulk_op.return_value
+        bulk.execute.side_effect = repo_controller.BulkWriteError({
+            'nUpserted': 1, 'nMatched': 0,
+            'writeErrors': [{'code': repo_controller.DUPLICATE_KEY_ERROR}]})
+        units = [DemoModel(id='bar', key_field='baz'), DemoModel(id='baz', key_field='baz')]
+
+        result = repo_controller.associate_units(MagicMock(repo_id='foo'), units)
+
+        self.assertEqual(result, (1, 1))
+
+    def test_write_error(self, mock_get_timestamp, mock_get_collection):
+        """
+        Test that other write errors are raised.
+        """
+        bulk = mock_get_collection.return_value.initialize_unordered_bulk_op.return_value
+        bulk.execute.side_effect = repo_controller.BulkWriteError({
+            'nUpserted': 0, 'nMatched': 0, 'writeErrors': [{'code': 2}]})
+        units = [DemoModel(id='bar', key_field='baz')]
+
+        self.assertRaises(repo_controller.BulkWriteError, repo_controller.associate_units,
+                          MagicMock(repo_id='foo'), units)
+
+
 class TestDisassociateUnits(unittest.TestCase):
 
     @patch('pulp.server.controllers.repository.model.RepositoryContentUnit.objects')
@@ -784,6 +907,49 @@ class TestUpdateLastUnitRemoved(unittest.TestCase):
         m_repo.save.assert_called_once_with()
 
 
+class TestUpdateLastUnitAddedOfSharingRepos(unittest.TestCase):
+    """
+    Tests for update last unit added of the repositories sharing updated units.
+    """
+
+    @mock.patch('pulp.server.controllers.repository.plugin_api')
+    @mock.patch('pulp.server.controllers.repository.model')
+    @mock.patch('pulp.server.controllers.repository.dateutils')
+    def test_update_last_unit_added_of_sharing_repos(self, mock_date, m_model, m_plugin_api):
+        """
+        Ensure that the repositories that contain the updated units are marked as changed.
+        """
+        m_repo = mock.MagicMock(repo_id='m_repo', content_unit_counts={'m_type': 2})
+        m_unit_model = m_plugin_api.get_unit_model_by_id.return_value
+        m_unit_model.objects.return_value.distinct.return_value = ['unit_1']
+        m_rcu_objects = m_model.RepositoryContentUnit.objects
+        m_rcu_objects.return_value.distinct.side_effect = [['unit_1', 'unit_2'], ['repo_2']]
+
+        repo_controller.update_last_unit_added_of_sharing_repos(m_repo, 1234)
+
+        m_unit_model.objects.assert_called_once_with(id__in=('unit_1', 'unit_2'),
+                                                     _last_updated__gte=1234)
+        m_rcu_objects.assert_called_with(unit_id__in=['unit_1'], repo_id__ne='m_repo')
+        m_model.Repository.objects.assert_called_once_with(repo_id__in=['repo_2'])
+        m_model.Repository.objects.return_value.update.assert_called_once_with(
+            set__last_unit_added=mock_date.now_utc_datetime_with_tzinfo.return_value)
+
+    @mock.patch('pulp.server.controllers.repository.plugin_api')
+    @mock.patch('pulp.server.controllers.repository.model')
+    def test_update_last_unit_added_of_sharing_repos_unchanged(self, m_model, m_plugin_api):
+        """
+        Ensure that no repository is marked as changed when none of the units were updated.
+        """
+        m_repo = mock.MagicMock(repo_id='m_repo', content_unit_counts={'m_type': 2})
+        m_unit_model = m_plugin_api.get_unit_model_by_id.return_value
+        m_unit_model.objects.return_value.distinct.return_value = []
+        m_model.RepositoryContentUnit.objects.return_value.distinct.return_value = ['unit_1']
+
+        repo_controller.update_last_unit_added_of_sharing_repos(m_repo, 1234)
+
+        self.assertFalse(m_model.Repository.objects.called)
+
+
 @mock.patch('pulp.server.controllers.repository.rebuild_content_unit_counts')
 @mock.patch('pulp.server.controllers.repository.sys')
 @mock.patch('pulp.server.controllers.repository.register_sigterm_handler')
@@ -872,6 +1038,59 @@ class TestSync(unittest.TestCase):
         # It is now platform's responsiblity to update plugin content unit counts
         self.assertTrue(mock_rebuild.called, "rebuild_content_unit_counts must be called")
 
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added_of_sharing_repos')
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_removed')
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added')
+    @mock.patch('pulp.server.controllers.repository._queue_auto_publish_tasks')
+    def test_sync_records_content_change(self, mock_spawn_auto_pub, m_added, m_removed,
+                                         m_sharing, m_model, mock_plugin_api, mock_plug_conf,
+                                         mock_wd, mock_conduit, mock_result, m_factory, mock_now,
+                                         mock_reg_sig, mock_sys, mock_rebuild):
+        """
+        Test that the last unit timestamps are updated according to the sync report.
+        """
+        mock_spawn_auto_pub.return_value = []
+        mock_result.expected_result.return_value.result = 'success'
+        mock_plugin_api.get_importer_by_id.return_value = (mock.MagicMock(), 'mock_conf')
+        m_repo = m_model.Repository.objects.get_repo_or_missing_resource.return_value
+        sync_func = mock_reg_sig.return_value
+        sync_func.return_value = repo_controller.SyncReport(
+            success_flag=True, added_count=0, updated_count=0, removed_count=3, summary='sum',
+            details='deets')
+
+        repo_controller.sync('mock_id')
+
+        self.assertFalse(m_added.called)
+        m_removed.assert_called_once_with(m_repo.repo_id)
+        self.assertFalse(m_sharing.called)
+
+    @mock.patch('pulp.server.controllers.repository.dateutils')
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added_of_sharing_repos')
+    @mock.patch('pulp.server.controllers.repository.update_last_unit_added')
+    @mock.patch('pulp.server.controllers.repository._queue_auto_publish_tasks')
+    def test_sync_records_shared_content_change(self, mock_spawn_auto_pub, m_added, m_sharing,
+                                                mock_date, m_model, mock_plugin_api,
+                                                mock_plug_conf, mock_wd, mock_conduit,
+                                                mock_result, m_factory, mock_now, mock_reg_sig,
+                                                mock_sys, mock_rebuild):
+        """
+        Test that the repositories sharing the units are marked as changed when units were
+        updated.
+        """
+        mock_spawn_auto_pub.return_value = []
+        mock_result.expected_result.return_value.result = 'success'
+        mock_plugin_api.get_importer_by_id.return_value = (mock.MagicMock(), 'mock_conf')
+        m_repo = m_model.Repository.objects.get_repo_or_missing_resource.return_value
+        sync_func = mock_reg_sig.return_value
+        sync_func.return_value = repo_controller.SyncReport(
+            success_flag=True, added_count=0, updated_count=2, removed_count=0, summary='sum',
+            details='deets')
+
+        repo_controller.sync('mock_id')
+
+        m_added.assert_called_once_with(m_repo.repo_id)
+        m_sharing.assert_called_once_with(m_repo, mock_date.now_utc_timestamp.return_value)
+
     @mock.patch('pulp.server.controllers.repository._queue_auto_publish_tasks')
     @mock.patch('pulp.server.controllers.repository.TaskResult')
     def test_sync_success(self, m_task_result, mock_spawn_auto_pub, m_model,
@@ -1357,3 +1576,47 @@ class TestGetImporterById(unittest.TestCase):
         object_id.assert_called_once_with(_id)
         importer.objects.get.assert_called_once_with(id=object_id.return_value)
         self.assertFalse(call_conf.called)
+
+
+class TestGetImporterRevision(unittest.TestCase):
+
+    @patch('pulp.server.controllers.repository.ObjectId')
+    @patch('pulp.server.db.model.Importer')
+    def test_call(self, importer, object_id):
+        query_set = importer.objects.return_value.only.return_value
+        query_set.first.return_value = MagicMock(importer_type_id='yum_importer',
+                                                 config={'feed': 'http://a', 'ssl': True})
+
+        revision = repo_controller.get_importer_revision('1234')
+
+        object_id.assert_called_once_with('1234')
+        importer.objects.assert_called_once_with(id=object_id.return_value)
+        importer.objects.return_value.only.assert_called_once_with('importer_type_id', 'config')
+        self.assertEqual(revision, repo_controller.get_importer_revision('1234'))
+
+    @patch('pulp.server.controllers.repository.ObjectId', MagicMock())
+    @patch('pulp.server.db.model.Importer')
+    def test_config_changed(self, importer):
+        query_set = importer.objects.return_value.only.return_value
+        query_set.first.return_value = MagicMock(importer_type_id='yum_importer',
+                                                 config={'feed': 'http://a'})
+        revision = repo_controller.get_importer_revision('1234')
+        query_set.first.return_value = MagicMock(importer_type_id='yum_importer',
+                                                 config={'feed': 'http://b'})
+
+        self.assertNotEqual(revision, repo_controller.get_importer_revision('1234'))
+
+    @patch('pulp.server.controllers.repository.ObjectId', MagicMock())
+    @patch('pulp.server.db.model.Importer')
+    def test_call_document_not_found(self, importer):
+        importer.objects.return_value.only.return_value.first.return_value = None
+        self.assertRaises(
+            plugin_exceptions.PluginNotFound,
+            repo_controller.get_importer_revision, '1234')
+
+    @patch('pulp.server.controllers.repository.ObjectId')
+    def test_call_invalid_id(self, object_id):
+        object_id.side_effect = InvalidId
+        self.assertRaises(
+            plugin_exceptions.PluginNotFound,
+            repo_controller.get_importer_revision, '1234')
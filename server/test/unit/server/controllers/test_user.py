@@ -169,85 +169,134 @@ class TestIsLastSuperUser(unittest.TestCase):
         self.assertTrue(user_controller.is_last_super_user('test'))
 
 
-@mock.patch('pulp.server.controllers.user.manager_factory')
-@mock.patch('pulp.server.controllers.user.model.User')
+@mock.patch('pulp.server.controllers.user.get_authorization')
 class TestIsAuthorized(unittest.TestCase):
     """
     Tests for determining whether a user is authorized to view a resource.
     """
 
-    def test_super_user(self, mock_model, mock_f):
+    def test_super_user(self, mock_get_auth):
         """
         Ensure that super users have access to everything.
         """
-        m_user = mock_model.objects.get_or_404.return_value
+        m_user = mock.MagicMock()
         m_user.is_superuser.return_value = True
-        self.assertTrue(m_user.is_superuser('some_resource', 'superuser', 'op'))
+        mock_get_auth.return_value = (m_user, {})
+        self.assertTrue(user_controller.is_authorized('/some/resource/', 'superuser', 'op'))
+        mock_get_auth.assert_called_once_with('superuser')
 
-    def test_explicit_access(self, mock_model, mock_f):
+    def test_explicit_access(self, mock_get_auth):
         """
         Ensure that a user with access to a resource url is authorized for it.
         """
-        m_user = mock_model.objects.get_or_404.return_value
+        m_user = mock.MagicMock()
         m_user.is_superuser.return_value = False
-        mock_pqm = mock_f.permission_query_manager.return_value
-        mock_pqm.find_by_resource.return_value = '/mock/resource/'
-        mock_pqm.find_user_permission.return_value = ['op']
+        mock_get_auth.return_value = (m_user, {'/mock/resource/': ['op']})
 
         self.assertTrue(user_controller.is_authorized('/mock/resource/', 'testuser', 'op'))
-        mock_pqm.find_by_resource.assert_called_once_with('/mock/resource/')
-        mock_pqm.find_user_permission.assert_called_once_with('/mock/resource/', 'testuser')
+        self.assertFalse(user_controller.is_authorized('/mock/resource/', 'testuser', 'other'))
+        mock_get_auth.assert_called_with('testuser')
 
-    def test_subdomain_access(self, mock_model, mock_f):
+    def test_subdomain_access(self, mock_get_auth):
         """
         Ensure that a user with access to the subdomain of a url has access to the url.
         """
-
-        def base_only(permission, login):
-            """
-            Simulate permission over a subdomain, but nothing else.
-            """
-            if permission == '/mock/':
-                return ['op']
-            else:
-                return []
-
-        m_user = mock_model.objects.get_or_404.return_value
+        m_user = mock.MagicMock()
         m_user.is_superuser.return_value = False
-        mock_pqm = mock_f.permission_query_manager.return_value
-        mock_pqm.find_by_resource.side_effect = lambda x: x
-        mock_pqm.find_user_permission.side_effect = base_only
+        mock_get_auth.return_value = (m_user, {'/mock/': ['op']})
 
         self.assertTrue(user_controller.is_authorized('/mock/resource/', 'test-user', 'op'))
         self.assertTrue(user_controller.is_authorized('/mock/other_resource/', 'test-user', 'op'))
         self.assertFalse(user_controller.is_authorized('/other/', 'test-user', 'op'))
         self.assertFalse(user_controller.is_authorized('/', 'test-user', 'op'))
 
-    @mock.patch('pulp.server.controllers.user.Permission.get_collection')
-    def test_root_access(self, mock_perm_collection, mock_model, mock_f):
+    def test_root_access(self, mock_get_auth):
         """
         Ensure that a user that has access to the root domain '/' has access to everything.
         """
+        m_user = mock.MagicMock()
+        m_user.is_superuser.return_value = False
+        mock_get_auth.return_value = (m_user, {'/': ['op']})
+
+        self.assertTrue(user_controller.is_authorized('/mock/resource/', 'test-user', 'op'))
+        self.assertTrue(user_controller.is_authorized('/mock/other_resource/', 'test-user', 'op'))
+        self.assertTrue(user_controller.is_authorized('/', 'test-user', 'op'))
 
-        def root_only(permission, login):
-            """
-            Simulate permission over root domain, but nothing else.
-            """
-            if permission == '/':
-                return ['op']
-            else:
-                return []
 
+@mock.patch('pulp.server.controllers.user.config')
+@mock.patch('pulp.server.controllers.user.Permission.get_collection')
+@mock.patch('pulp.server.controllers.user.manager_factory')
+@mock.patch('pulp.server.controllers.user.model.User')
+class TestGetAuthorization(unittest.TestCase):
+    """
+    Tests for looking up and caching the authorization data of a user.
+    """
+
+    def setUp(self):
+        user_controller.invalidate_authorization_cache()
+
+    def tearDown(self):
+        user_controller.invalidate_authorization_cache()
+
+    def test_permissions(self, mock_model, mock_f, mock_perm_collection, mock_config):
+        """
+        Ensure the operations granted to the user are collected for each resource.
+        """
         m_user = mock_model.objects.get_or_404.return_value
         m_user.is_superuser.return_value = False
+        permissions = [{'resource': '/a/', 'users': [{'username': 'test-user',
+                                                      'permissions': [0, 1]}]},
+                       {'resource': '/b/', 'users': [{'username': 'test-user',
+                                                      'permissions': [2]}]}]
+        mock_perm_collection.return_value.find.return_value = permissions
         mock_pqm = mock_f.permission_query_manager.return_value
-        mock_pqm.find_by_resource.side_effect = lambda x: x
-        mock_pqm.find_user_permission.side_effect = root_only
-        mock_perm_collection.return_value.find_one.return_value = '/'
+        mock_pqm.find_user_permission.side_effect = lambda p, login: p['users'][0]['permissions']
 
-        self.assertTrue(user_controller.is_authorized('/mock/resource/', 'test-user', 'op'))
-        self.assertTrue(user_controller.is_authorized('/mock/other_resource/', 'test-user', 'op'))
-        self.assertTrue(user_controller.is_authorized('/', 'test-user', 'op'))
+        user, granted = user_controller.get_authorization('test-user')
+
+        self.assertTrue(user is m_user)
+        self.assertEqual(granted, {'/a/': [0, 1], '/b/': [2]})
+        mock_model.objects.get_or_404.assert_called_once_with(login='test-user')
+        mock_perm_collection.return_value.find.assert_called_once_with(
+            {'users.username': 'test-user'})
+
+    def test_super_user(self, mock_model, mock_f, mock_perm_collection, mock_config):
+        """
+        Ensure the permissions of super users are not looked up.
+        """
+        m_user = mock_model.objects.get_or_404.return_value
+        m_user.is_superuser.return_value = True
+
+        self.assertEqual(user_controller.get_authorization('admin'), (m_user, {}))
+        self.assertEqual(mock_perm_collection.call_count, 0)
+
+    def test_cached(self, mock_model, mock_f, mock_perm_collection, mock_config):
+        """
+        Ensure the database is only queried again once the cache is invalidated.
+        """
+        mock_config.getfloat.return_value = 60
+        mock_model.objects.get_or_404.return_value.is_superuser.return_value = True
+
+        first = user_controller.get_authorization('admin')
+        second = user_controller.get_authorization('admin')
+        user_controller.invalidate_authorization_cache()
+        user_controller.get_authorization('admin')
+
+        self.assertTrue(first is second)
+        self.assertEqual(mock_model.objects.get_or_404.call_count, 2)
+        mock_config.getfloat.assert_called_with('authentication', 'authorization_cache_ttl')
+
+    def test_cache_disabled(self, mock_model, mock_f, mock_perm_collection, mock_config):
+        """
+        Ensure nothing is cached when the ttl is 0.
+        """
+        mock_config.getfloat.return_value = 0
+        mock_model.objects.get_or_404.return_value.is_superuser.return_value = True
+
+        user_controller.get_authorization('admin')
+        user_controller.get_authorization('admin')
+
+        self.assertEqual(mock_model.objects.get_or_404.call_count, 2)
 
 
 @mock.patch('pulp.server.controllers.user.Role.get_collection')
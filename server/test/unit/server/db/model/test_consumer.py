@@ -148,6 +148,21 @@ class TestRepoProfileApplicability(PulpServerTests):
         self.assertEqual(applicability._id, document['_id'])
 
 
+    def test_save_repo_revision(self):
+        """
+        Test that the repo revision is saved with the applicability data.
+        """
+        applicability = consumer.RepoProfileApplicability(
+            profile_hash='hash', repo_id='repo_id', profile=['a', 'profile'],
+            applicability={'type_id': ['package a']}, repo_revision='revision')
+
+        applicability.save()
+
+        document = self.collection.find_one()
+        self.assertEqual(document['repo_revision'], 'revision')
+        self.assertEqual(consumer.RepoProfileApplicability(**document).repo_revision, 'revision')
+
+
 class TestUnitProfile(unittest.TestCase):
     """
     Test the UnitProfile class.
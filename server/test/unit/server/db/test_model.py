@@ -983,6 +983,7 @@ class TestLazyCatalogEntry(unittest.TestCase):
         expected = [
             [('importer_id', 1)],
             [('path', -1), ('importer_id', -1), ('revision', -1)],
+            [('unit_id', -1), ('unit_type_id', -1)],
             [(u'_id', 1)]
         ]
         result = model.LazyCatalogEntry.list_indexes()
@@ -1118,6 +1119,7 @@ class TestUserAuth(unittest.TestCase):
         """
         Create a base User.
         """
+        model._verified_passwords.clear()
         self.user = model.User(login='test', password='some password')
 
     def test_password_integrated(self):
@@ -1129,6 +1131,40 @@ class TestUserAuth(unittest.TestCase):
         self.user.set_password('new_password')
         self.assertFalse(self.user.check_password('mock_password'))
 
+    @patch('pulp.server.db.model.config')
+    def test_check_password_cached(self, mock_config):
+        """
+        Test that a successful password check is remembered, but a failed one is not.
+        """
+        mock_config.getfloat.return_value = 60
+        self.user.set_password('mock_password')
+        self.assertTrue(self.user.check_password('mock_password'))
+
+        with patch.object(model.User, '_pbkdf_sha256') as mock_sha:
+            self.assertTrue(self.user.check_password('mock_password'))
+            self.assertEqual(mock_sha.call_count, 0)
+            self.assertFalse(self.user.check_password('wrong_password'))
+            self.assertFalse(self.user.check_password('wrong_password'))
+            self.assertEqual(mock_sha.call_count, 2)
+        mock_config.getfloat.assert_called_once_with('authentication', 'password_cache_ttl')
+
+    @patch('pulp.server.db.model.config')
+    def test_check_password_cache_keys(self, mock_config):
+        """
+        Test that remembered checks don't apply to another user or to a changed password,
+        and that the cache doesn't hold the password.
+        """
+        mock_config.getfloat.return_value = 60
+        self.user.set_password('mock_password')
+        other_user = model.User(login='other', password=self.user.password)
+        self.assertTrue(self.user.check_password('mock_password'))
+
+        self.assertNotEqual(self.user._password_cache_key('mock_password'),
+                            other_user._password_cache_key('mock_password'))
+        self.assertFalse('mock_password' in model._verified_passwords._entries.keys()[0])
+        self.user.set_password('new_password')
+        self.assertFalse(self.user.check_password('mock_password'))
+
     def test_set_password_integrated(self):
         """
         Test setting password end to end.
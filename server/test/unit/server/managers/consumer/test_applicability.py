@@ -1,3 +1,6 @@
+import datetime
+import unittest
+
 import mock
 
 from .... import base
@@ -10,10 +13,10 @@ from pulp.server.db.model.consumer import (Bind, Consumer, RepoProfileApplicabil
 from pulp.server.db.model.criteria import Criteria
 from pulp.server.managers import factory as factory
 from pulp.server.managers.consumer.applicability import (
-    _add_consumers_to_applicability_map, _add_profiles_to_consumer_map_and_get_hashes,
-    _add_repo_ids_to_consumer_map, _format_report, _get_applicability_map,
-    _get_consumer_applicability_map, DoesNotExist, MultipleObjectsReturned,
-    retrieve_consumer_applicability, ApplicabilityRegenerationManager)
+    _add_profiles_to_consumer_map_and_get_hashes, _add_repo_ids_to_consumer_map, _format_report,
+    _get_consumer_applicability_map, _get_repo_profile_consumers, DoesNotExist,
+    MultipleObjectsReturned,
+    repo_revision, retrieve_consumer_applicability, ApplicabilityRegenerationManager)
 from pulp.server.managers.consumer.bind import BindManager
 from pulp.server.managers.consumer.cud import ConsumerManager
 from pulp.server.managers.consumer.profile import ProfileManager
@@ -291,6 +294,173 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         expected_params = {'_id': {'$in': ['mock-object-id', 'mock-object-id-2']}}
         mock_repo_profile_app_get_collection.return_value.find.assert_called_with(expected_params)
 
+    @mock.patch('pulp.server.managers.consumer.applicability.'
+                'regenerate_applicability_for_profiles_task')
+    @mock.patch('pulp.server.managers.consumer.applicability.get_worker_count')
+    @mock.patch('pulp.server.managers.consumer.bind.model.Repository.objects')
+    def test_regenerate_applicability_for_consumers_sharded(self, mock_repo_qs,
+                                                            mock_worker_count, mock_shard_task):
+        self.populate_consumers_different_profiles()
+        self.populate_bindings()
+        mock_worker_count.return_value = 2
+        mock_shard_task.apply_async.side_effect = ['task-1', 'task-2']
+
+        with mock.patch('pulp.server.managers.consumer.applicability.'
+                        'MIN_REGENERATION_BATCH_SIZE', 1):
+            manager = factory.applicability_regeneration_manager()
+            result = manager.regenerate_applicability_for_consumers(self.CONSUMER_CRITERIA)
+
+        # Verify each profile hash was sent to a task of its own
+        self.assertEqual(result.spawned_tasks, [{'task_id': 'task-1'}, {'task_id': 'task-2'}])
+        shards = [c[0][0][0] for c in mock_shard_task.apply_async.call_args_list]
+        self.assertEqual(sorted(len(shard) for shard in shards), [2, 2])
+        for shard in shards:
+            self.assertEqual(len(set(repo_profile[1] for repo_profile in shard)), 1)
+        applicability_list = list(RepoProfileApplicability.get_collection().find())
+        self.assertEqual(len(applicability_list), 0)
+
+    def test_regenerate_applicability_for_profiles_caches_lookups(self):
+        self.populate_consumers_different_profiles()
+        unit_profiles = list(UnitProfile.get_collection().find())
+        repo_profiles = [(repo_id, p['profile_hash'], 'rpm', p['id'])
+                         for repo_id in self.REPO_IDS for p in unit_profiles]
+        get_existing = ApplicabilityRegenerationManager._get_existing_repo_content_types
+
+        with mock.patch.object(ApplicabilityRegenerationManager, '_profiler',
+                               wraps=ApplicabilityRegenerationManager._profiler) as mock_profiler:
+            manager = factory.applicability_regeneration_manager()
+            manager.regenerate_applicability_for_profiles(repo_profiles)
+
+        # Verify the lookups were made once per content type and once per repo
+        mock_profiler.assert_called_once_with('rpm')
+        self.assertEqual(get_existing.call_count, 2)
+        applicability_list = list(RepoProfileApplicability.get_collection().find())
+        self.assertEqual(len(applicability_list), 4)
+
+    @mock.patch('pulp.server.managers.consumer.applicability.repo_revision')
+    @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
+    def test_regenerate_applicability_records_repo_revision(self, mock_repo_qs, mock_revision):
+        self.populate_consumers_different_profiles()
+        mock_revision.return_value = 'revision-1'
+        unit_profiles = list(UnitProfile.get_collection().find())
+        repo_profiles = [('repo-1', p['profile_hash'], 'rpm', p['id']) for p in unit_profiles]
+
+        manager = factory.applicability_regeneration_manager()
+        manager.regenerate_applicability_for_profiles(repo_profiles)
+
+        # Verify the revision is read once for the run and saved with each applicability
+        mock_revision.assert_called_once_with(mock_repo_qs.return_value.only.return_value.first())
+        applicability_list = list(RepoProfileApplicability.get_collection().find())
+        self.assertEqual([a['repo_revision'] for a in applicability_list],
+                         ['revision-1', 'revision-1'])
+
+    @mock.patch('pulp.server.managers.consumer.applicability.batch_regenerate_applicability_task')
+    @mock.patch('pulp.server.managers.consumer.applicability.repo_revision')
+    @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    def test_queue_regenerate_applicability_for_repos_skips_current(
+            self, mock_get_collection, mock_repo_qs, mock_revision, mock_batch_task):
+        mock_repo = mock.MagicMock()
+        mock_repo.repo_id = 'fake-repo'
+        mock_repo_qs.find_by_criteria.return_value = [mock_repo]
+        mock_revision.return_value = 'revision-2'
+        mock_get_collection.return_value.find.return_value.count.return_value = 0
+
+        ApplicabilityRegenerationManager.queue_regenerate_applicability_for_repos(
+            self.REPO_CRITERIA.as_dict())
+
+        mock_revision.assert_called_once_with(mock_repo)
+        mock_get_collection.return_value.find.assert_called_once_with(
+            {'repo_id': 'fake-repo', 'repo_revision': {'$ne': 'revision-2'}}, {'_id': 1})
+        self.assertFalse(mock_batch_task.apply_async.called)
+
+    @mock.patch('pulp.server.managers.consumer.applicability.batch_regenerate_applicability_task')
+    @mock.patch('pulp.server.managers.consumer.applicability.repo_revision')
+    @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    def test_queue_regenerate_applicability_for_repos_force(
+            self, mock_get_collection, mock_repo_qs, mock_revision, mock_batch_task):
+        mock_repo = mock.MagicMock()
+        mock_repo.repo_id = 'fake-repo'
+        mock_repo_qs.find_by_criteria.return_value = [mock_repo]
+        mock_get_collection.return_value.find.return_value.count.return_value = 0
+
+        ApplicabilityRegenerationManager.queue_regenerate_applicability_for_repos(
+            self.REPO_CRITERIA.as_dict(), force=True)
+
+        self.assertFalse(mock_revision.called)
+        mock_get_collection.return_value.find.assert_called_once_with(
+            {'repo_id': 'fake-repo'}, {'_id': 1})
+
+    def test_repo_revision(self):
+        repo = model.Repository(repo_id='repo-1', content_unit_counts={'rpm': 2})
+        revision = repo_revision(repo)
+
+        self.assertEqual(repo_revision(repo), revision)
+        repo.content_unit_counts = {'rpm': 3}
+        self.assertNotEqual(repo_revision(repo), revision)
+        repo.content_unit_counts = {'rpm': 2}
+        repo.last_unit_removed = datetime.datetime(2016, 1, 1)
+        self.assertNotEqual(repo_revision(repo), revision)
+
+    @mock.patch('pulp.server.managers.consumer.applicability.pkg_resources.iter_entry_points')
+    def test_repo_revision_profiler_upgrade(self, mock_iter_entry_points):
+        repo = model.Repository(repo_id='repo-1', content_unit_counts={'rpm': 2})
+        mock_entry_point = mock.MagicMock()
+        mock_entry_point.name = 'rpm_profiler'
+        mock_entry_point.dist.version = '2.8.0'
+        mock_iter_entry_points.return_value = [mock_entry_point]
+        revision = repo_revision(repo)
+
+        mock_entry_point.dist.version = '2.8.1'
+
+        self.assertNotEqual(repo_revision(repo), revision)
+        mock_iter_entry_points.assert_called_with('pulp.profilers')
+
+    @mock.patch('pulp.server.managers.consumer.applicability.get_worker_count')
+    def test_profile_hash_shards(self, mock_worker_count):
+        mock_worker_count.return_value = 3
+        repo_profiles = [('repo-%d' % (i % 2), 'hash-%d' % (i / 2), 'rpm', 'id-%d' % (i / 2))
+                         for i in range(40)]
+
+        shards = ApplicabilityRegenerationManager._profile_hash_shards(repo_profiles)
+
+        self.assertEqual([len(shard) for shard in shards], [14, 14, 12])
+        self.assertEqual(sorted(sum(shards, [])), sorted(repo_profiles))
+        shard_hashes = [set(repo_profile[1] for repo_profile in shard) for shard in shards]
+        self.assertEqual(sum(len(hashes) for hashes in shard_hashes), 20)
+
+    @mock.patch('pulp.server.managers.consumer.applicability.get_worker_count')
+    def test_profile_hash_shards_small(self, mock_worker_count):
+        mock_worker_count.return_value = 0
+        repo_profiles = [('repo-1', 'hash-%d' % i, 'rpm', 'id-%d' % i) for i in range(40)]
+
+        self.assertEqual(ApplicabilityRegenerationManager._profile_hash_shards(repo_profiles),
+                         [repo_profiles])
+        self.assertEqual(ApplicabilityRegenerationManager._profile_hash_shards([]), [])
+
+    @mock.patch('pulp.server.managers.consumer.applicability.batch_regenerate_applicability_task')
+    @mock.patch('pulp.server.managers.consumer.applicability.get_worker_count')
+    @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
+    @mock.patch('pulp.server.db.model.consumer.RepoProfileApplicability.get_collection')
+    def test_queue_regenerate_applicability_for_repos_batch_size(
+            self, mock_get_collection, mock_repo_qs, mock_worker_count, mock_batch_task):
+        mock_repo = mock.MagicMock()
+        mock_repo.repo_id = 'fake-repo'
+        mock_repo_qs.find_by_criteria.return_value = [mock_repo]
+        existing_ids = [{'_id': i} for i in range(50)]
+        mock_cursor = mock.MagicMock()
+        mock_cursor.count.return_value = len(existing_ids)
+        mock_cursor.__iter__.return_value = iter(existing_ids)
+        mock_get_collection.return_value.find.return_value = mock_cursor
+        mock_worker_count.return_value = 2
+
+        ApplicabilityRegenerationManager.queue_regenerate_applicability_for_repos(
+            self.REPO_CRITERIA.as_dict())
+
+        batches = [c[0][0][1] for c in mock_batch_task.apply_async.call_args_list]
+        self.assertEqual([len(batch) for batch in batches], [25, 25])
+
     @mock.patch('pulp.server.managers.consumer.applicability.model.Repository.objects')
     def test_get_existing_repo_content_types_no_repo(self, mock_repo_qs):
         """
@@ -373,6 +543,26 @@ class TestRepoProfileApplicabilityManager(base.PulpServerTests):
         # Our applicability object should now have the correct _id attribute
         self.assertEqual(applicability._id, document['_id'])
 
+    def test_create_existing(self):
+        """
+        Test that create() replaces the applicability another task stored for the same profile
+        and repository instead of raising a duplicate key error.
+        """
+        first = RepoProfileApplicability.objects.create(
+            profile_hash='hash', repo_id='repo_id', profile=['a', 'profile'],
+            applicability={'type_id': ['package a']}, repo_revision='1')
+
+        second = RepoProfileApplicability.objects.create(
+            profile_hash='hash', repo_id='repo_id', profile=['a', 'profile'],
+            applicability={'type_id': ['package b']}, repo_revision='2')
+
+        self.assertEqual(self.collection.find().count(), 1)
+        document = self.collection.find_one()
+        self.assertEqual(document['applicability'], {'type_id': ['package b']})
+        self.assertEqual(document['repo_revision'], '2')
+        self.assertEqual(second._id, first._id)
+        self.assertEqual(second.applicability, {'type_id': ['package b']})
+
     def test_filter(self):
         """
         Test the filter() method.
@@ -573,6 +763,8 @@ class TestRepoProfileApplicabilityManager(base.PulpServerTests):
         self.assertEqual(rpa._id, existing_rpa._id)
 
 
+@mock.patch('pulp.server.managers.consumer.applicability.plugin_api.list_content_types',
+            return_value=['content_type', 'content_type_1', 'content_type_2'])
 @mock.patch('pulp.server.managers.consumer.bind.factory.consumer_history_manager')
 @mock.patch('pulp.server.managers.consumer.bind.BindManager._validate_consumer_repo')
 class TestRetrieveConsumerApplicability(base.PulpServerTests,
@@ -1063,54 +1255,6 @@ class TestRetrieveConsumerApplicability(base.PulpServerTests,
         self.assert_equal_ignoring_list_order(applicability, expected_applicability)
 
 
-class TestAddConsumersToApplicabilityMap(base.PulpServerTests,
-                                         base.RecursiveUnorderedListComparisonMixin):
-    """
-    Test the _add_consumer_to_applicability_map() function.
-    """
-    def test__add_consumers_to_applicability_map(self):
-        """
-        Test the _add_consumers_to_applicability_map() function.
-        """
-        consumer_map = {
-            'consumer_1': {'profiles': [{'profile_hash': 'hash_1'},
-                                        {'profile_hash': 'hash_2'}],
-                           'repo_ids': ['repo_1']},
-            'consumer_2': {'profiles': [{'profile_hash': 'hash_2'},
-                                        {'profile_hash': 'hash_3'}],
-                           'repo_ids': ['repo_1', 'repo_2']},
-            'consumer_3': {'profiles': [{'profile_hash': 'hash_1'},
-                                        {'profile_hash': 'hash_4'}],
-                           'repo_ids': ['repo_3']},
-        }
-        # The applicability_map should be altered by _add_consumers_to_applicability_map()
-        # by having the consumers in the consumer_map added to the correct applicability
-        # spots. The applicability_map doesn't have data for every combo of profile and
-        # repo, so that we can make sure the function is able to handle that case
-        # gracefully.
-        applicability_map = {
-            ('hash_1', 'repo_1'): {'consumers': [], 'applicability': ['a_1']},
-            ('hash_2', 'repo_1'): {'consumers': [], 'applicability': ['a_2']},
-            ('hash_2', 'repo_2'): {'consumers': [], 'applicability': ['a_3']},
-            # This one should not match any consumers
-            ('hash_5', 'repo_3'): {'consumers': [], 'applicability': ['a_4']},
-        }
-
-        _add_consumers_to_applicability_map(consumer_map, applicability_map)
-
-        expected_applicability_map = {
-            ('hash_1', 'repo_1'): {'consumers': ['consumer_1'],
-                                   'applicability': ['a_1']},
-            ('hash_2', 'repo_1'): {'consumers': ['consumer_1', 'consumer_2'],
-                                   'applicability': ['a_2']},
-            ('hash_2', 'repo_2'): {'consumers': ['consumer_2'],
-                                   'applicability': ['a_3']},
-            ('hash_5', 'repo_3'): {'consumers': [], 'applicability': ['a_4']},
-        }
-        self.assert_equal_ignoring_list_order(applicability_map,
-                                              expected_applicability_map)
-
-
 class TestAddProfilesToConsumerMapAndGetHashes(
         base.PulpServerTests, base.RecursiveUnorderedListComparisonMixin):
     """
@@ -1266,114 +1410,133 @@ class TestFormatReport(base.PulpServerTests, base.RecursiveUnorderedListComparis
         self.assert_equal_ignoring_list_order(report, expected_report)
 
 
-class TestGetApplicabilityMap(base.PulpServerTests):
+class TestGetConsumerApplicabilityMap(base.PulpServerTests):
     """
-    Test the _get_applicability_map() function.
+    Test the _get_consumer_applicability_map() function.
     """
-    def tearDown(self):
+    def setUp(self):
         """
-        Empty the collections that were written to during this test suite.
+        Create applicability data for three profiles in four repositories.
         """
-        super(TestGetApplicabilityMap, self).tearDown()
-        RepoProfileApplicability.get_collection().remove()
+        super(TestGetConsumerApplicabilityMap, self).setUp()
+        applicabilities = [
+            ('hash_1', 'repo_1', {'type_1': ['a_1'], 'type_2': ['a_5']}),
+            ('hash_1', 'repo_2', {'type_1': ['a_2']}),
+            ('hash_1', 'repo_3', {'type_1': ['a_1', 'a_3']}),
+            ('hash_1', 'repo_4', {'type_2': ['a_4'], 'type_3': []}),
+            ('hash_2', 'repo_2', {'type_2': ['a_6']}),
+            ('hash_3', 'repo_1', {'type_1': ['a_7']})]
+        for profile_hash, repo_id, applicability in applicabilities:
+            RepoProfileApplicability.objects.create(profile_hash, repo_id, 'a_profile',
+                                                    applicability)
+        patcher = mock.patch(
+            'pulp.server.managers.consumer.applicability.plugin_api.list_content_types',
+            return_value=['type_1', 'type_2', 'type_3', 'type_4'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
-    def test__get_applicability_map_content_types_none(self):
+    def tearDown(self):
         """
-        Test the _get_applicability_map() function with content_types set to None.
+        Empty the collections that were written to during this test suite.
         """
-        applicabilities = [
-            {'profile_hash': 'hash_1',
-             'profile': 'a_profile',
-             'repo_id': 'repo_1',
-             'applicability': {'type_1': 'a_1'}},
-            {'profile_hash': 'hash_1',
-             'profile': 'a_profile',
-             'repo_id': 'repo_2',
-             'applicability': {'type_1': 'a_2'}},
-            {'profile_hash': 'hash_2',
-             'profile': 'another_profile',
-             'repo_id': 'repo_2',
-             'applicability': {'type_2': 'a_3'}},
-            {'profile_hash': 'hash_3',
-             'profile': 'we leave this off the query',
-             'repo_id': 'repo_1',
-             'applicability': {'type_1': 'a_4'}}]
-        for a in applicabilities:
-            RepoProfileApplicability.objects.create(a['profile_hash'], a['repo_id'],
-                                                    a['profile'], a['applicability'])
-
-        # Leave hash_3 out of the query, so we can make sure it doesn't get returned
-        a_map = _get_applicability_map(['hash_1', 'hash_2'], None)
-
-        expected_a_map = {
-            ('hash_1', 'repo_1'): {'applicability': {'type_1': 'a_1'}, 'consumers': []},
-            ('hash_1', 'repo_2'): {'applicability': {'type_1': 'a_2'}, 'consumers': []},
-            ('hash_2', 'repo_2'): {'applicability': {'type_2': 'a_3'}, 'consumers': []}}
-        self.assertEqual(a_map, expected_a_map)
+        super(TestGetConsumerApplicabilityMap, self).tearDown()
+        RepoProfileApplicability.get_collection().remove()
 
-    def test__get_applicability_map_content_types_not_none(self):
+    def test__get_consumer_applicability_map(self):
         """
-        Assert that _get_applicability_map() correctly filters out unwanted types when
-        content_types is passed.
+        Test that the data is collated by the sets of consumers it applies to, whether or not
+        all the repositories of a profile are bound to the same consumers.
         """
-        applicabilities = [
-            {'profile_hash': 'hash_1',
-             'profile': 'a_profile',
-             'repo_id': 'repo_1',
-             'applicability': {'type_1': 'a_1'}},
-            {'profile_hash': 'hash_1',
-             'profile': 'a_profile',
-             'repo_id': 'repo_2',
-             'applicability': {'type_1': 'a_2', 'type_2': 'a_5'}},
-            {'profile_hash': 'hash_2',
-             'profile': 'another_profile',
-             'repo_id': 'repo_2',
-             'applicability': {'type_2': 'a_3'}},
-            {'profile_hash': 'hash_3',
-             'profile': 'we leave this off the query',
-             'repo_id': 'repo_1',
-             'applicability': {'type_1': 'a_4'}}]
-        for a in applicabilities:
-            RepoProfileApplicability.objects.create(a['profile_hash'], a['repo_id'],
-                                                    a['profile'], a['applicability'])
+        repo_profile_consumers = {
+            # hash_1's repositories are bound to different sets of consumers
+            ('hash_1', 'repo_1'): frozenset(['c_1', 'c_2']),
+            ('hash_1', 'repo_2'): frozenset(['c_2', 'c_3']),
+            ('hash_1', 'repo_3'): frozenset(['c_1', 'c_2']),
+            ('hash_1', 'repo_4'): frozenset(['c_1', 'c_2']),
+            # hash_2 is grouped as a whole, there is no data for repo_5 or hash_3 in repo_2
+            ('hash_2', 'repo_2'): frozenset(['c_1', 'c_2']),
+            ('hash_2', 'repo_5'): frozenset(['c_1', 'c_2']),
+            ('hash_3', 'repo_2'): frozenset(['c_4'])}
 
-        # Leave hash_3 out of the query, so we can make sure it doesn't get returned
-        a_map = _get_applicability_map(['hash_1', 'hash_2'], ['type_1'])
+        c_a_map = _get_consumer_applicability_map(repo_profile_consumers, None)
 
-        expected_a_map = {
-            ('hash_1', 'repo_1'): {'applicability': {'type_1': 'a_1'}, 'consumers': []},
-            ('hash_1', 'repo_2'): {'applicability': {'type_1': 'a_2'}, 'consumers': []}}
-        self.assertEqual(a_map, expected_a_map)
-
-
-class TestGetConsumerApplicabilityMap(base.PulpServerTests,
-                                      base.RecursiveUnorderedListComparisonMixin):
+        expected_c_a_map = {
+            frozenset(['c_1', 'c_2']): {'type_1': set(['a_1', 'a_3']),
+                                        'type_2': set(['a_4', 'a_5', 'a_6']),
+                                        'type_3': set()},
+            frozenset(['c_2', 'c_3']): {'type_1': set(['a_2'])}}
+        self.assertEqual(c_a_map, expected_c_a_map)
+
+    def test__get_consumer_applicability_map_content_types(self):
+        """
+        Test that unwanted content types are filtered out, along with the consumers that have
+        no data for the wanted types.
+        """
+        repo_profile_consumers = {
+            ('hash_1', 'repo_1'): frozenset(['c_1']),
+            ('hash_1', 'repo_4'): frozenset(['c_1']),
+            ('hash_1', 'repo_2'): frozenset(['c_2']),
+            ('hash_3', 'repo_1'): frozenset(['c_3'])}
+
+        c_a_map = _get_consumer_applicability_map(repo_profile_consumers, ['type_2'])
+
+        expected_c_a_map = {frozenset(['c_1']): {'type_2': set(['a_4', 'a_5'])}}
+        self.assertEqual(c_a_map, expected_c_a_map)
+
+    @mock.patch('pulp.server.managers.consumer.applicability.RepoProfileApplicability.'
+                'get_collection')
+    def test__get_consumer_applicability_map_cursor(self, mock_get_collection):
+        """
+        Test that the units of each content type are unwound and collected into a set for each
+        group by the database, that the groups are read through an aggregation cursor that may
+        use the disk, and that the profiles are matched with $in rather than one clause per
+        profile.
+        """
+        mock_aggregate = mock_get_collection.return_value.aggregate
+        mock_aggregate.side_effect = [iter([{'_id': 'hash_1', 'units': ['a_1', 'a_2']}]),
+                                      iter([{'_id': 'hash_1', 'units': [None]}])]
+        repo_profile_consumers = {('hash_1', 'repo_1'): frozenset(['c_1'])}
+
+        c_a_map = _get_consumer_applicability_map(repo_profile_consumers, ['type_1', 'type_2'])
+
+        self.assertEqual(c_a_map, {frozenset(['c_1']): {'type_1': set(['a_1', 'a_2']),
+                                                        'type_2': set()}})
+        self.assertEqual(mock_aggregate.call_count, 2)
+        pipeline = mock_aggregate.call_args_list[0][0][0]
+        self.assertEqual(pipeline[0], {'$match': {'profile_hash': {'$in': ['hash_1']},
+                                                  'repo_id': {'$in': ['repo_1']},
+                                                  'applicability.type_1': {'$exists': True}}})
+        self.assertEqual(pipeline[2], {'$unwind': '$units'})
+        self.assertEqual(pipeline[3], {'$group': {'_id': '$profile_hash',
+                                                  'units': {'$addToSet': '$units'}}})
+        self.assertEqual(mock_aggregate.call_args[1], {'cursor': {}, 'allowDiskUse': True})
+
+
+class TestGetRepoProfileConsumers(unittest.TestCase):
     """
-    Test the _get_consumer_applicability_map() function.
+    Test the _get_repo_profile_consumers() function.
     """
-    def test__get_consumer_applicability_map(self):
+    def test__get_repo_profile_consumers(self):
         """
-        Test the _get_consumer_applicability_map() function.
-        """
-        a_map = {
-            ('hash_1', 'repo_1'): {'applicability': {'type_1': ['a_1']},
-                                   'consumers': ['c_1', 'c_2']},
-            ('hash_1', 'repo_2'): {'applicability': {'type_1': ['a_2']},
-                                   'consumers': ['c_2', 'c_3']},
-            # This is the same set of consumers as the first group. The function should
-            # combine these two into the same entry in the output. This one has the same
-            # content_type as the first one too, so it should combine the units together.
-            ('hash_1', 'repo_3'): {'applicability': {'type_1': ['a_3']},
-                                   'consumers': ['c_1', 'c_2']},
-            # Another one with the same consumers, but this one's applicability is for
-            # a different content type, which will still combine them together, but as
-            # separate types in the same applicability entry
-            ('hash_1', 'repo_4'): {'applicability': {'type_2': ['a_4']},
-                                   'consumers': ['c_1', 'c_2']}}
-
-        c_a_map = _get_consumer_applicability_map(a_map)
+        Test that each combination of profile and bound repository maps to its consumers.
+        """
+        consumer_map = {
+            'consumer_1': {'profiles': [{'profile_hash': 'hash_1'},
+                                        {'profile_hash': 'hash_2'}],
+                           'repo_ids': ['repo_1']},
+            'consumer_2': {'profiles': [{'profile_hash': 'hash_2'},
+                                        {'profile_hash': 'hash_3'}],
+                           'repo_ids': ['repo_1', 'repo_2']},
+            'consumer_3': {'profiles': [{'profile_hash': 'hash_1'}],
+                           'repo_ids': []},
+        }
 
-        expected_c_a_map = {
-            frozenset(['c_1', 'c_2']): {'type_1': ['a_1', 'a_3'], 'type_2': ['a_4']},
-            frozenset(['c_2', 'c_3']): {'type_1': ['a_2']}}
-        self.assert_equal_ignoring_list_order(c_a_map, expected_c_a_map)
+        repo_profile_consumers = _get_repo_profile_consumers(consumer_map)
+
+        expected = {
+            ('hash_1', 'repo_1'): frozenset(['consumer_1']),
+            ('hash_2', 'repo_1'): frozenset(['consumer_1', 'consumer_2']),
+            ('hash_2', 'repo_2'): frozenset(['consumer_2']),
+            ('hash_3', 'repo_1'): frozenset(['consumer_2']),
+            ('hash_3', 'repo_2'): frozenset(['consumer_2'])}
+        self.assertEqual(repo_profile_consumers, expected)
@@ -11,6 +11,7 @@ from mock import patch, Mock
 
 from .... import base
 from pulp.plugins.types import database as content_type_db
+from pulp.plugins.util.misc import paginate
 from pulp.plugins.types.model import TypeDefinition
 from pulp.server import exceptions as pulp_exceptions
 from pulp.server.db.model.repository import RepoContentUnit
@@ -193,6 +194,26 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
                           self.orphan_manager.get_orphan,
                           PHONY_TYPE_1.id, 'non-existent')
 
+    def test_get_associated_orphan_using_generators(self):
+        unit = gen_content_unit(PHONY_TYPE_1.id, self.content_root)
+        associate_content_unit_with_repo(unit)
+
+        self.assertRaises(pulp_exceptions.MissingResource,
+                          self.orphan_manager.get_orphan,
+                          PHONY_TYPE_1.id, unit['_id'])
+
+    @patch(MODULE_PATH + 'plugin_misc.paginate')
+    def test_list_orphans_in_batches(self, mock_paginate):
+        units = [gen_content_unit(PHONY_TYPE_1.id, self.content_root) for i in range(3)]
+        associate_content_unit_with_repo(units[1])
+        mock_paginate.side_effect = lambda iterable: paginate(iterable, 2)
+
+        orphans = list(self.orphan_manager.generate_orphans_by_type(PHONY_TYPE_1.id))
+
+        self.assertEqual(sorted(o['_id'] for o in orphans),
+                         sorted([units[0]['_id'], units[2]['_id']]))
+        self.assertEqual(self.orphan_manager.orphans_count_by_type(PHONY_TYPE_1.id), 2)
+
     def test_associated_units_using_generators(self):
         unit = gen_content_unit(PHONY_TYPE_1.id, self.content_root)
         associate_content_unit_with_repo(unit)
@@ -271,17 +292,19 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
         self.assertEqual(len(orphans), 0)
         self.assertEqual(self.number_of_files_in_content_root(), 0)
         mock_lazy_catalog_objects.assert_called_once_with(
-            unit_id=unit['_id'],
+            unit_id__in=[unit['_id']],
             unit_type_id=unit['_content_type_id']
         )
         mock_lazy_catalog_objects.return_value.delete.assert_called_once_with()
 
+    @patch(MODULE_PATH + 'os.path.lexists', return_value=True)
     @patch(MODULE_PATH + 'model.LazyCatalogEntry.objects')
     @patch(MODULE_PATH + 'OrphanManager.delete_orphaned_file')
     @patch(MODULE_PATH + 'model.RepositoryContentUnit.objects')
     @patch(MODULE_PATH + 'plugin_api.get_unit_model_by_id')
     def test_delete_content_unit_by_type(
-            self, m_get_model, m_rcu_objects, m_del_orphan, mock_lazy_catalog_objects):
+            self, m_get_model, m_rcu_objects, m_del_orphan, mock_lazy_catalog_objects,
+            m_lexists):
         orphan = Mock(_storage_path='test_foo_path', id='orphan')
         non_orphan = Mock(_storage_path='test_foo_path', id='non_orphan')
         m_get_model.return_value.objects.only.return_value = [
@@ -292,11 +315,50 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
 
         self.orphan_manager.delete_orphan_content_units_by_type('foo_type')
         mock_lazy_catalog_objects.assert_called_once_with(
-            unit_id='orphan',
+            unit_id__in=['orphan'],
             unit_type_id='foo_type'
         )
         mock_lazy_catalog_objects.return_value.delete.assert_called_once_with()
         m_del_orphan.assert_called_once_with('test_foo_path')
+        m_get_model.return_value.objects.assert_called_once_with(id__in=['orphan'])
+        m_get_model.return_value.objects.return_value.delete.assert_called_once_with()
+
+    @patch(MODULE_PATH + 'os.path.lexists', return_value=False)
+    @patch(MODULE_PATH + 'model.LazyCatalogEntry.objects')
+    @patch(MODULE_PATH + 'OrphanManager.delete_orphaned_file')
+    @patch(MODULE_PATH + 'model.RepositoryContentUnit.objects')
+    @patch(MODULE_PATH + 'plugin_api.get_unit_model_by_id')
+    def test_delete_content_unit_by_type_file_already_deleted(
+            self, m_get_model, m_rcu_objects, m_del_orphan, mock_lazy_catalog_objects,
+            m_lexists):
+        """
+        Assert that a unit whose file was removed by an interrupted deletion is still deleted.
+        """
+        orphan = Mock(_storage_path='test_foo_path', id='orphan')
+        m_get_model.return_value.objects.only.return_value = [orphan]
+        m_rcu_objects.return_value.distinct.return_value = []
+
+        self.orphan_manager.delete_orphan_content_units_by_type('foo_type')
+
+        self.assertFalse(m_del_orphan.called)
+        m_get_model.return_value.objects.assert_called_once_with(id__in=['orphan'])
+        m_get_model.return_value.objects.return_value.delete.assert_called_once_with()
+
+    @patch(MODULE_PATH + 'model.LazyCatalogEntry.objects')
+    @patch(MODULE_PATH + 'model.RepositoryContentUnit.objects')
+    @patch(MODULE_PATH + 'plugin_api.get_unit_model_by_id')
+    def test_delete_content_unit_by_type_no_orphans(
+            self, m_get_model, m_rcu_objects, mock_lazy_catalog_objects):
+        """
+        Assert that nothing is deleted when every unit is associated to a repository.
+        """
+        m_get_model.return_value.objects.only.return_value = [Mock(id='non_orphan')]
+        m_rcu_objects.return_value.distinct.return_value = ['non_orphan']
+
+        self.orphan_manager.delete_orphan_content_units_by_type('foo_type')
+
+        self.assertFalse(mock_lazy_catalog_objects.called)
+        self.assertFalse(m_get_model.return_value.objects.called)
 
     @patch(MODULE_PATH + 'plugin_api.get_unit_model_by_id')
     def test_delete_content_unit_by_type_filtered(self, mock_get_model):
@@ -11,6 +11,7 @@ import mock
 from .... import base
 from pulp.common import dateutils
 from pulp.plugins.types import database, model
+from pulp.plugins.util.misc import paginate
 from pulp.server.db.model.criteria import Criteria, UnitAssociationCriteria
 from pulp.server.db.model.repository import RepoContentUnit
 import pulp.server.managers.content.cud as content_cud_manager
@@ -349,6 +350,85 @@ class UnitAssociationQueryTests(base.PulpServerTests):
             self.assertTrue('created' in u)
             self.assertFalse('updated' in u)
 
+    def test_get_units_default_order(self):
+        # Test
+        units = self.manager.get_units_across_types('repo-1')
+
+        # Verify
+        expected = [(t, unit_id) for t in ('alpha', 'beta', 'gamma') for unit_id in self.units[t]]
+        self.assertEqual(expected, [(u['unit_type_id'], u['metadata']['key_1']) for u in units])
+
+    @mock.patch('pulp.server.managers.repo.unit_association_query.plugin_misc.paginate')
+    def test_get_units_in_pages(self, mock_paginate):
+        # Serve the associations two at a time to exercise more than one page
+        mock_paginate.side_effect = lambda iterable: paginate(iterable, 2)
+        all_units = self.manager.get_units_across_types('repo-1')
+
+        # Test
+        criteria = UnitAssociationCriteria(unit_filters={'md_2': 0}, skip=1, limit=3)
+        units = self.manager.get_units_across_types('repo-1', criteria)
+
+        # Verify
+        self.assertEqual(self.repo_1_count, len(all_units))
+        expected = [u for u in all_units if u['metadata']['md_2'] == 0][1:4]
+        self.assertEqual(expected, units)
+
+    def test_get_units_as_generator_stops_at_limit(self):
+        # Test
+        criteria = UnitAssociationCriteria(unit_filters={'md_2': 0}, limit=1)
+        units = self.manager.get_units_across_types('repo-1', criteria, as_generator=True)
+
+        # Verify
+        self.assertEqual('aardvark', next(units)['metadata']['key_1'])
+        self.assertRaises(StopIteration, next, units)
+
+    def _get_units_in_pages(self, criteria_kwargs):
+        # Page through the units of repo-1 by continuing after the last unit of each page
+        units = []
+        after = None
+        while True:
+            criteria = UnitAssociationCriteria(limit=3, **criteria_kwargs)
+            page = self.manager.get_units('repo-1', criteria, after=after)
+            units.extend(page)
+            if len(page) < 3:
+                return units
+            after = self.manager.association_position(criteria, page[-1])
+
+    def test_get_units_after(self):
+        # Test
+        units = self._get_units_in_pages({})
+
+        # Verify
+        self.assertEqual(self.manager.get_units('repo-1'), units)
+
+    def test_get_units_after_association_sort(self):
+        # Test
+        sort = [('created', association_query_manager.SORT_DESCENDING)]
+        units = self._get_units_in_pages({'association_sort': sort})
+
+        # Verify
+        criteria = UnitAssociationCriteria(association_sort=sort)
+        self.assertEqual(self.manager.get_units('repo-1', criteria), units)
+
+    def test_get_units_after_removed_association(self):
+        # Setup
+        criteria = UnitAssociationCriteria(limit=3)
+        page = self.manager.get_units('repo-1', criteria)
+        after = self.manager.association_position(criteria, page[-1])
+        expected = self.manager.get_units('repo-1')[3:]
+
+        # Test
+        RepoContentUnit.get_collection().remove({'_id': page[0]['_id']})
+        units = self.manager.get_units('repo-1', after=after)
+
+        # Verify
+        self.assertEqual(expected, units)
+
+    def test_get_units_after_unit_sort(self):
+        criteria = UnitAssociationCriteria(unit_sort=[('key_1', 1)])
+        self.assertRaises(ValueError, self.manager.get_units, 'repo-1', criteria,
+                          after=['alpha', 'aardvark'])
+
     # -- get_units_by_type tests ----------------------------------------------
 
     def test_get_units_by_type_no_criteria(self):
@@ -1,3 +1,7 @@
+import errno
+import os
+import shutil
+import tempfile
 import unittest
 
 from mock import Mock, patch, call
@@ -133,3 +137,148 @@ class TestCopyTree(unittest.TestCase):
         # Assert everything except for symlink is checked if it is a directory
         mock_isdir.assert_has_calls([call('src/dir1'), call('src/dir2'), call('src/dir2/file2'),
                                      call('src/file3')])
+
+
+class TestCopyTreeLinkDir(unittest.TestCase):
+    """
+    Test copying a tree while linking unchanged files from a previous copy.
+    """
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.working_dir, 'src')
+        self.link_dir = os.path.join(self.working_dir, 'previous')
+        self.dst = os.path.join(self.working_dir, 'dst')
+        for path, content in (('src/same', 'a'), ('previous/same', 'a'),
+                              ('src/sub/changed', 'new'), ('previous/sub/changed', 'old'),
+                              ('src/sub/added', 'added')):
+            path = os.path.join(self.working_dir, path)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(content)
+        os.symlink('/some/target', os.path.join(self.src, 'link'))
+        os.symlink('/some/target', os.path.join(self.link_dir, 'link'))
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _inode(self, *path):
+        return os.stat(os.path.join(*path)).st_ino
+
+    def test_link_dir(self):
+        """
+        Test that unchanged files are hard linked and all other entries are copied.
+        """
+        util.copytree(self.src, self.dst, symlinks=True, link_dir=self.link_dir)
+
+        self.assertEqual(self._inode(self.dst, 'same'), self._inode(self.link_dir, 'same'))
+        self.assertNotEqual(self._inode(self.dst, 'sub', 'changed'),
+                            self._inode(self.link_dir, 'sub', 'changed'))
+        self.assertEqual(open(os.path.join(self.dst, 'sub', 'changed')).read(), 'new')
+        self.assertEqual(open(os.path.join(self.dst, 'sub', 'added')).read(), 'added')
+        self.assertEqual(os.readlink(os.path.join(self.dst, 'link')), '/some/target')
+
+    @patch('pulp.server.util.os.link')
+    def test_link_dir_cross_device(self, mock_link):
+        """
+        Test that files are copied when they can't be linked.
+        """
+        mock_link.side_effect = OSError(errno.EXDEV, 'Invalid cross-device link')
+
+        util.copytree(self.src, self.dst, symlinks=True, link_dir=self.link_dir)
+
+        self.assertEqual(mock_link.call_count, 1)
+        self.assertNotEqual(self._inode(self.dst, 'same'), self._inode(self.link_dir, 'same'))
+        self.assertEqual(open(os.path.join(self.dst, 'same')).read(), 'a')
+
+    @patch('pulp.server.util._same_device', return_value=False)
+    @patch('pulp.server.util.os.link')
+    def test_link_dir_other_device(self, mock_link, mock_same_device):
+        """
+        Test that no file is linked when link_dir is on another filesystem.
+        """
+        util.copytree(self.src, self.dst, symlinks=True, link_dir=self.link_dir)
+
+        mock_same_device.assert_called_once_with(self.link_dir, self.dst)
+        self.assertFalse(mock_link.called)
+        self.assertEqual(open(os.path.join(self.dst, 'same')).read(), 'a')
+
+    def test_link_dir_rebuilt_source(self):
+        """
+        Test that unchanged files are linked when the source tree is built again from scratch
+        between two copies, as it is for every publish.
+        """
+        util.copytree(self.src, self.dst, symlinks=True, link_dir=self.link_dir)
+        shutil.rmtree(self.src)
+        for path, content in (('same', 'a'), ('sub/changed', 'newer'), ('sub/added', 'added')):
+            path = os.path.join(self.src, path)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(content)
+        second_dst = os.path.join(self.working_dir, 'second')
+
+        util.copytree(self.src, second_dst, symlinks=True, link_dir=self.dst)
+
+        self.assertEqual(self._inode(second_dst, 'same'), self._inode(self.link_dir, 'same'))
+        self.assertEqual(self._inode(second_dst, 'sub', 'added'),
+                         self._inode(self.dst, 'sub', 'added'))
+        self.assertNotEqual(self._inode(second_dst, 'sub', 'changed'),
+                            self._inode(self.dst, 'sub', 'changed'))
+        self.assertEqual(open(os.path.join(second_dst, 'sub', 'changed')).read(), 'newer')
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_get_missing(self):
+        cache = util.TTLCache(2, 10)
+        self.assertEqual(None, cache.get('a'))
+        self.assertEqual('default', cache.get('a', 'default'))
+
+    def test_set_get(self):
+        cache = util.TTLCache(2, 10)
+        cache.set('a', None)
+        self.assertEqual(None, cache.get('a', 'default'))
+        cache.set('a', 1)
+        self.assertEqual(1, cache.get('a'))
+
+    @patch('pulp.server.util.time.time')
+    def test_expired(self, mock_time):
+        cache = util.TTLCache(2, 10)
+        mock_time.return_value = 100
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=1)
+
+        mock_time.return_value = 105
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(None, cache.get('b'))
+        mock_time.return_value = 110
+        self.assertEqual(None, cache.get('a'))
+        self.assertEqual(0, len(cache))
+
+    def test_evict_least_recently_used(self):
+        cache = util.TTLCache(2, 10)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual(3, cache.get('c'))
+
+    def test_disabled(self):
+        cache = util.TTLCache(0, 10)
+        cache.set('a', 1)
+        self.assertEqual(None, cache.get('a'))
+
+    def test_invalidate_and_clear(self):
+        cache = util.TTLCache(3, 10)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.invalidate('a')
+        cache.invalidate('missing')
+        self.assertEqual(None, cache.get('a'))
+        self.assertEqual(2, cache.get('b'))
+        cache.clear()
+        self.assertEqual(0, len(cache))
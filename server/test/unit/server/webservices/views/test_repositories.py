@@ -1,6 +1,8 @@
 from operator import itemgetter
+import base64
 import json
 
+from bson.objectid import ObjectId
 from django import http
 import mock
 
@@ -681,11 +683,14 @@ class TestRepoUnitSearch(unittest.TestCase):
         mock_repo_qs.get_repo_or_missing_resource.return_value = 'exists'
         criteria = mock_crit.from_client_input.return_value
         criteria.type_ids = ['one_type']
+        criteria.limit = 10
+        mock_uqm().get_units_by_type.return_value = []
         repo_unit_search = RepoUnitSearch()
         repo_unit_search._generate_response('mock_q', {}, repo_id='mock_repo')
         mock_crit.from_client_input.assert_called_once_with('mock_q')
         mock_uqm().get_units_by_type.assert_called_once_with('mock_repo', 'one_type',
-                                                             criteria=criteria)
+                                                             criteria=criteria,
+                                                             as_generator=False, after=None)
         mock_resp.assert_called_once_with(mock_uqm().get_units_by_type.return_value)
 
     @mock.patch(
@@ -701,12 +706,112 @@ class TestRepoUnitSearch(unittest.TestCase):
         mock_repo_qs.get_repo_or_missing_resource.return_value = 'exists'
         criteria = mock_crit.from_client_input.return_value
         criteria.type_ids = ['one_type', 'two_types']
+        criteria.limit = 10
+        mock_uqm().get_units.return_value = []
         repo_unit_search = RepoUnitSearch()
         repo_unit_search._generate_response('mock_q', {}, repo_id='mock_repo')
         mock_crit.from_client_input.assert_called_once_with('mock_q')
-        mock_uqm().get_units.assert_called_once_with('mock_repo', criteria=criteria)
+        mock_uqm().get_units.assert_called_once_with('mock_repo', criteria=criteria,
+                                                     as_generator=False, after=None)
         mock_resp.assert_called_once_with(mock_uqm().get_units.return_value)
 
+    @mock.patch('pulp.server.webservices.views.repositories.'
+                'generate_streaming_json_response_with_pulp_encoder')
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_unlimited(self, mock_repo_qs, mock_uqm, mock_stream):
+        """
+        Test that units of a search without a limit are streamed from a generator.
+        """
+        response = RepoUnitSearch._generate_response({}, {}, repo_id='mock_repo')
+
+        self.assertTrue(mock_uqm().get_units.call_args[1]['as_generator'])
+        mock_stream.assert_called_once_with(mock_uqm().get_units.return_value)
+        self.assertTrue(response is mock_stream.return_value)
+
+    @mock.patch(
+        'pulp.server.webservices.views.repositories.generate_json_response_with_pulp_encoder')
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_continuation(self, mock_repo_qs, mock_uqm, mock_resp):
+        """
+        Test that a full page carries a continuation token that resumes the search after the
+        last unit of the page.
+        """
+        manager = mock_uqm.return_value
+        manager.in_association_order.return_value = True
+        manager.association_order.return_value = [('created', 1), ('_id', 1)]
+        position = ['2015-06-01T00:00:00Z', ObjectId()]
+        manager.association_position.return_value = position
+        manager.get_units.return_value = ['unit_1', 'unit_2']
+        mock_resp.return_value = {}
+        query = {'limit': 2, 'skip': 4}
+
+        response = RepoUnitSearch._generate_response(query, {}, repo_id='mock_repo')
+        manager.association_position.assert_called_once_with(mock.ANY, 'unit_2')
+        token = response[repositories.CONTINUATION_HEADER]
+        RepoUnitSearch._generate_response(query, {'continuation': token}, repo_id='mock_repo')
+
+        kwargs = manager.get_units.call_args[1]
+        self.assertEqual(kwargs['after'], position)
+        self.assertEqual(kwargs['criteria'].skip, None)
+        self.assertEqual(kwargs['criteria'].limit, 2)
+
+    @mock.patch(
+        'pulp.server.webservices.views.repositories.generate_json_response_with_pulp_encoder')
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_last_page(self, mock_repo_qs, mock_uqm, mock_resp):
+        """
+        Test that no continuation token is returned when the page is not full.
+        """
+        mock_uqm().get_units.return_value = ['unit_1']
+        mock_resp.return_value = {}
+
+        response = RepoUnitSearch._generate_response({'limit': 2}, {}, repo_id='mock_repo')
+
+        self.assertFalse(repositories.CONTINUATION_HEADER in response)
+
+    @mock.patch(
+        'pulp.server.webservices.views.repositories.generate_json_response_with_pulp_encoder')
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_unit_order(self, mock_repo_qs, mock_uqm, mock_resp):
+        """
+        Test that no continuation token is returned when units are sorted by unit fields.
+        """
+        mock_uqm().in_association_order.return_value = False
+        mock_uqm().get_units.return_value = ['unit_1', 'unit_2']
+        mock_resp.return_value = {}
+
+        response = RepoUnitSearch._generate_response({'limit': 2}, {}, repo_id='mock_repo')
+
+        self.assertFalse(repositories.CONTINUATION_HEADER in response)
+
+    @mock.patch('pulp.server.webservices.views.repositories.manager_factory.'
+                'repo_unit_association_query_manager')
+    @mock.patch('pulp.server.webservices.views.repositories.model.Repository.objects')
+    def test__generate_response_invalid_continuation(self, mock_repo_qs, mock_uqm):
+        """
+        Test that an invalid continuation token is reported as an invalid value.
+        """
+        mock_uqm().in_association_order.return_value = True
+        mock_uqm().association_order.return_value = [('unit_type_id', 1), ('unit_id', 1)]
+        for token in ('not a token', base64.urlsafe_b64encode('{"skip": 2}'),
+                      base64.urlsafe_b64encode('["rpm"]')):
+            self.assertRaises(exceptions.InvalidValue, RepoUnitSearch._generate_response,
+                              {}, {'continuation': token}, repo_id='mock_repo')
+
+        mock_uqm().in_association_order.return_value = False
+        self.assertRaises(exceptions.InvalidValue, RepoUnitSearch._generate_response,
+                          {}, {'continuation': base64.urlsafe_b64encode('["rpm", "a"]')},
+                          repo_id='mock_repo')
+        self.assertFalse(mock_uqm().get_units.called)
+
 
 class TestRepoImportersView(unittest.TestCase):
     """
@@ -1435,7 +1540,36 @@ class TestContentApplicabilityRegenerationView(unittest.TestCase):
             raise AssertionError('OperationPostponed should be raised for a regenerate task')
 
         self.assertEqual(response.http_status_code, 202)
-        mock_regen.assert_called_once_with(mock_crit.return_value.as_dict())
+        mock_regen.assert_called_once_with(mock_crit.return_value.as_dict(), force=False)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth', new=assert_auth_CREATE())
+    @mock.patch(('pulp.server.managers.consumer.applicability.ApplicabilityRegenerationManager.'
+                'queue_regenerate_applicability_for_repos'))
+    @mock.patch('pulp.server.webservices.views.repositories.tags')
+    @mock.patch('pulp.server.webservices.views.repositories.Criteria.from_client_input')
+    def test_post_with_force(self, mock_crit, mock_tags, mock_regen):
+        """
+        Test regenerate content applicability of all the existing applicability data.
+        """
+
+        mock_request = mock.MagicMock()
+        mock_request.body = json.dumps({'repo_criteria': {}, 'force': True})
+        content_app_regen = ContentApplicabilityRegenerationView()
+        self.assertRaises(exceptions.OperationPostponed, content_app_regen.post, mock_request)
+
+        mock_regen.assert_called_once_with(mock_crit.return_value.as_dict(), force=True)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth', new=assert_auth_CREATE())
+    @mock.patch('pulp.server.webservices.views.repositories.Criteria.from_client_input')
+    def test_post_with_invalid_force(self, mock_crit):
+        """
+        Test regenerate content applicability with a force that is not a boolean.
+        """
+
+        mock_request = mock.MagicMock()
+        mock_request.body = json.dumps({'repo_criteria': {}, 'force': 'yes'})
+        content_app_regen = ContentApplicabilityRegenerationView()
+        self.assertRaises(exceptions.InvalidValue, content_app_regen.post, mock_request)
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth', new=assert_auth_CREATE())
     @mock.patch('pulp.server.webservices.views.repositories.Criteria.from_client_input')
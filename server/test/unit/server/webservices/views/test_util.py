@@ -58,6 +58,71 @@ class TestResponseGenerators(unittest.TestCase):
         util.generate_json_response_with_pulp_encoder(test_content)
         mock_json.dumps.assert_called_once_with(test_content, default=pulp_json_encoder)
 
+    def test_generate_streaming_json_response(self):
+        """
+        Test that the streamed response is the same JSON array as a regular one.
+        """
+        for count in (0, 1, util.JSON_STREAM_CHUNK_SIZE, util.JSON_STREAM_CHUNK_SIZE * 2 + 1):
+            items = [{'foo': i} for i in range(count)]
+            response = util.generate_streaming_json_response(iter(items))
+            self.assertEqual(response._headers.get('content-type'),
+                             ('Content-Type', 'application/json; charset=utf-8'))
+            content = ''.join(response)
+            self.assertEqual(content, json.dumps(items))
+
+    def test_generate_streaming_json_response_lazy(self):
+        """
+        Test that only the first chunk of items is serialized before the response is sent.
+        """
+        generated = []
+
+        def items():
+            for i in range(util.JSON_STREAM_CHUNK_SIZE * 3):
+                generated.append(i)
+                yield i
+
+        response = util.generate_streaming_json_response(items())
+
+        self.assertEqual(len(generated), util.JSON_STREAM_CHUNK_SIZE)
+        self.assertEqual(json.loads(''.join(response)), range(util.JSON_STREAM_CHUNK_SIZE * 3))
+
+    def test_generate_streaming_json_response_early_error(self):
+        """
+        Test that errors raised by the first chunk of items are raised to the view.
+        """
+        def items():
+            raise ValueError()
+            yield
+
+        self.assertRaises(ValueError, util.generate_streaming_json_response, items())
+
+    @mock.patch('pulp.server.webservices.views.util._logger')
+    def test_generate_streaming_json_response_late_error(self, mock_logger):
+        """
+        Test that errors raised after the response is returned are logged and abort it.
+        """
+        def items():
+            for i in range(util.JSON_STREAM_CHUNK_SIZE):
+                yield i
+            raise ValueError()
+
+        response = util.generate_streaming_json_response(items())
+
+        self.assertRaises(ValueError, list, response)
+        self.assertEqual(mock_logger.exception.call_count, 1)
+
+    @mock.patch('pulp.server.webservices.views.util.StreamingHttpResponse', None)
+    def test_generate_streaming_json_response_no_streaming(self):
+        """
+        Test that the whole body is built up front when Django cannot stream responses.
+        """
+        items = [{'foo': i} for i in range(util.JSON_STREAM_CHUNK_SIZE + 1)]
+
+        response = util.generate_streaming_json_response(iter(items))
+
+        self.assertTrue(isinstance(response, HttpResponse))
+        self.assertEqual(json.loads(response.content), items)
+
     @mock.patch('pulp.server.webservices.views.util.iri_to_uri')
     def test_generate_redirect_response(self, mock_iri_to_uri):
         """
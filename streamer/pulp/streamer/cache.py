@@ -0,0 +1,378 @@
+from collections import OrderedDict
+from gettext import gettext as _
+import errno
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+# The size of the chunks read from disk when streaming cached content.
+CHUNK_SIZE = 64 * 1024
+DATA_SUFFIX = '.data'
+HEADERS_SUFFIX = '.headers'
+PARTIAL_PREFIX = '.partial-'
+
+
+class ContentCache(object):
+    """
+    A bounded, on-disk cache of the content served by the streamer.
+
+    Content is added to the cache as it is proxied to a client, and evicted in
+    least-recently-used order once the total size of the cached files exceeds the
+    configured limit. The cache also tracks the downloads that are in progress so
+    that concurrent requests for the same path share a single upstream download.
+    """
+
+    def __init__(self, cache_dir, max_size):
+        """
+        Initialize the cache, adopting any content already present in the cache directory.
+
+        :param cache_dir: The directory to store cached content in.
+        :type  cache_dir: str
+        :param max_size:  The maximum total size of the cached content, in bytes.
+        :type  max_size:  int
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.size = 0
+        self._lock = threading.Lock()
+        # key -> size of the cached file, in least-recently-used order
+        self._entries = OrderedDict()
+        # key -> Fetch for downloads that are in progress
+        self._fetches = {}
+        self._load()
+
+    @staticmethod
+    def _key(path):
+        """
+        Get the cache key for a path.
+
+        :param path: The path of the requested content.
+        :type  path: basestring
+        :return: The cache key.
+        :rtype:  str
+        """
+        if isinstance(path, unicode):
+            path = path.encode('utf-8')
+        return hashlib.sha256(path).hexdigest()
+
+    def _data_path(self, key):
+        return os.path.join(self.cache_dir, key + DATA_SUFFIX)
+
+    def _headers_path(self, key):
+        return os.path.join(self.cache_dir, key + HEADERS_SUFFIX)
+
+    def _load(self):
+        """
+        Create the cache directory if necessary and index the content it already holds.
+        Partial files left behind by downloads that were interrupted are removed.
+        """
+        try:
+            os.makedirs(self.cache_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        found = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(PARTIAL_PREFIX):
+                _unlink(path)
+            elif name.endswith(DATA_SUFFIX):
+                key = name[:-len(DATA_SUFFIX)]
+                if not os.path.exists(self._headers_path(key)):
+                    _unlink(path)
+                    continue
+                stat = os.stat(path)
+                found.append((stat.st_mtime, key, stat.st_size))
+
+        for _mtime, key, size in sorted(found):
+            self._entries[key] = size
+            self.size += size
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        """
+        Remove least-recently-used entries until the cache fits within its size limit.
+        The caller must hold the lock.
+        """
+        while self.size > self.max_size and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.size -= size
+            _unlink(self._data_path(key))
+            _unlink(self._headers_path(key))
+
+    def get(self, path):
+        """
+        Open the cached copy of the content at the given path.
+
+        :param path: The path of the requested content.
+        :type  path: str
+        :return: The cached content, or None if the path is not cached.
+        :rtype:  CachedContent or None
+        """
+        key = self._key(path)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            try:
+                with open(self._headers_path(key)) as fp:
+                    headers = json.load(fp)
+                # The open file remains readable even if the entry is evicted while
+                # it is being streamed.
+                data = open(self._data_path(key), 'rb')
+            except (IOError, ValueError):
+                logger.warning(_('Discarding unreadable cache entry for {path}.').format(
+                    path=path))
+                self.size -= self._entries.pop(key)
+                _unlink(self._data_path(key))
+                _unlink(self._headers_path(key))
+                return None
+            # Mark the entry as the most recently used one.
+            self._entries[key] = self._entries.pop(key)
+        try:
+            os.utime(self._data_path(key), None)
+        except OSError:
+            pass
+        return CachedContent(headers, data)
+
+    def join(self, path):
+        """
+        Join the download of the content at the given path, starting it if it is not
+        already in progress.
+
+        :param path: The path of the requested content.
+        :type  path: str
+        :return: A tuple of the fetch and a flag that is True when the caller started the
+                 fetch and is therefore responsible for downloading the content into it.
+        :rtype:  tuple
+        """
+        key = self._key(path)
+        with self._lock:
+            fetch = self._fetches.get(key)
+            if fetch is not None:
+                return fetch, False
+            fd, partial_path = tempfile.mkstemp(prefix=PARTIAL_PREFIX, dir=self.cache_dir)
+            fetch = Fetch(self, key, os.fdopen(fd, 'wb'), partial_path)
+            self._fetches[key] = fetch
+            return fetch, True
+
+    def _commit(self, fetch):
+        """
+        Add the content of a successful fetch to the cache.
+
+        :param fetch: The completed fetch.
+        :type  fetch: Fetch
+        :return: The path of the cached data file, or None if the content was not cached.
+        :rtype:  str or None
+        """
+        key = fetch.key
+        with self._lock:
+            del self._fetches[key]
+            if fetch.size > self.max_size:
+                _unlink(fetch.partial_path)
+                return None
+            try:
+                with open(self._headers_path(key), 'w') as fp:
+                    json.dump(fetch.headers or {}, fp)
+                os.rename(fetch.partial_path, self._data_path(key))
+            except (IOError, OSError):
+                logger.exception(_('Failed to add {key} to the streamer cache.').format(key=key))
+                _unlink(fetch.partial_path)
+                return None
+            if key in self._entries:
+                self.size -= self._entries.pop(key)
+            self._entries[key] = fetch.size
+            self.size += fetch.size
+            self._evict()
+            return self._data_path(key)
+
+    def _discard(self, fetch):
+        """
+        Throw away the content of a failed fetch.
+
+        :param fetch: The failed fetch.
+        :type  fetch: Fetch
+        """
+        with self._lock:
+            del self._fetches[fetch.key]
+            _unlink(fetch.partial_path)
+
+
+class CachedContent(object):
+    """
+    Content that is served from the cache.
+    """
+
+    def __init__(self, headers, data):
+        """
+        :param headers: The response headers stored with the content.
+        :type  headers: dict
+        :param data:    The open data file.
+        :type  data:    file
+        """
+        self.headers = headers
+        self.data = data
+
+    def stream(self, write):
+        """
+        Stream the cached content and close the data file.
+
+        :param write: The function to call with each chunk of content.
+        :type  write: callable
+        """
+        try:
+            for chunk in iter(lambda: self.data.read(CHUNK_SIZE), ''):
+                write(chunk)
+        finally:
+            self.data.close()
+
+
+class Fetch(object):
+    """
+    A download that is in progress. The download writes the content to the fetch as it
+    arrives, and every requester for the same path, including the one that started the
+    fetch, streams the content from it, following the partial file as it grows.
+    """
+
+    def __init__(self, cache, key, partial_file, partial_path):
+        """
+        :param cache:        The cache the fetch belongs to.
+        :type  cache:        ContentCache
+        :param key:          The cache key of the content being fetched.
+        :type  key:          str
+        :param partial_file: The open file the content is written to.
+        :type  partial_file: file
+        :param partial_path: The path of the partial file.
+        :type  partial_path: str
+        """
+        self.cache = cache
+        self.key = key
+        self.partial_file = partial_file
+        self.partial_path = partial_path
+        self.headers = None
+        self.size = 0
+        self.succeeded = False
+        self.done = False
+        self.data_path = None
+        # the number of requests streaming the content from this fetch
+        self.readers = 0
+        # called when the last reader stops before the download is done
+        self.abandoned = None
+        self._condition = threading.Condition()
+
+    def set_headers(self, headers):
+        """
+        Record the response headers of the download.
+
+        :param headers: The response headers.
+        :type  headers: dict
+        """
+        self.headers = dict(headers)
+
+    def write(self, data):
+        """
+        Write a chunk of downloaded content.
+
+        :param data: The content.
+        :type  data: str
+        """
+        self.partial_file.write(data)
+        self.partial_file.flush()
+        with self._condition:
+            self.size += len(data)
+            self._condition.notify_all()
+
+    def close(self):
+        """
+        Finish the fetch, adding the content to the cache if the download succeeded and
+        waking up every requester waiting on it.
+        """
+        self.partial_file.close()
+        with self._condition:
+            if self.succeeded:
+                self.data_path = self.cache._commit(self)
+            else:
+                self.cache._discard(self)
+            self.done = True
+            self._condition.notify_all()
+
+    def wait(self):
+        """
+        Block until the download has produced content or has finished, then open the
+        content for streaming.
+
+        :return: The open content file, or None if the download failed before any content
+                 was received or the content is no longer available.
+        :rtype:  file or None
+        """
+        with self._condition:
+            while not self.size and not self.done:
+                self._condition.wait()
+            if not self.done:
+                path = self.partial_path
+            elif self.succeeded and self.data_path:
+                path = self.data_path
+            else:
+                return None
+            try:
+                fp = open(path, 'rb')
+            except IOError:
+                return None
+            self.readers += 1
+            return fp
+
+    def stream(self, fp, write):
+        """
+        Stream the content as it is downloaded, then close the content file. Exceptions
+        raised by the write function are propagated. When this is the last reader and
+        the download is not done, the fetch is abandoned.
+
+        :param fp:    The content file returned by wait().
+        :type  fp:    file
+        :param write: The function to call with each chunk of content.
+        :type  write: callable
+        :return: True if all the content was streamed, False if the download failed.
+        :rtype:  bool
+        """
+        try:
+            position = 0
+            while True:
+                with self._condition:
+                    while position == self.size and not self.done:
+                        self._condition.wait()
+                    available = self.size - position
+                    if not available:
+                        return self.succeeded
+                chunk = fp.read(min(available, CHUNK_SIZE))
+                if not chunk:
+                    return False
+                position += len(chunk)
+                write(chunk)
+        finally:
+            fp.close()
+            with self._condition:
+                self.readers -= 1
+                abandoned = not self.readers and not self.done
+            if abandoned and self.abandoned is not None:
+                self.abandoned()
+
+
+def _unlink(path):
+    """
+    Remove a file, ignoring files that do not exist.
+
+    :param path: The path of the file to remove.
+    :type  path: str
+    """
+    try:
+        os.unlink(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
@@ -9,6 +9,11 @@ DEFAULT_VALUES = {
         'port': '8751',
         'interfaces': 'localhost',
         'cache_timeout': '86400',
+        'cache_dir': '/var/cache/pulp/streamer',
+        'cache_size': '1024',
+        'catalog_cache_size': '10000',
+        'catalog_cache_ttl': '60',
+        'catalog_cache_negative_ttl': '5',
     },
 }
 
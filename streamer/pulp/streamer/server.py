@@ -1,32 +1,56 @@
+from contextlib import contextmanager
 from gettext import gettext as _
 from httplib import NOT_FOUND, INTERNAL_SERVER_ERROR
 from urlparse import urlparse
+import copy
+import functools
 import logging
+import threading
 
 from mongoengine import DoesNotExist, NotUniqueError
 from nectar import listener as nectar_listener
 from nectar import request as nectar_request
+from nectar.downloaders import threaded as nectar_threaded
+from nectar.report import DOWNLOAD_CANCELED
 from twisted.internet import reactor
+from twisted.internet.interfaces import IPushProducer
 from twisted.web import resource
 from twisted.web.server import NOT_DONE_YET
+from zope.interface import implementer
 
 from pulp.server.constants import PULP_STREAM_REQUEST_HEADER
 from pulp.server.db import model
 from pulp.server.controllers import repository as repo_controller
+from pulp.server.util import TTLCache
 from pulp.plugins.loader.exceptions import PluginNotFound
+from pulp.streamer.cache import ContentCache
 
 logger = logging.getLogger(__name__)
 
+# Marks paths missing from the catalog entry cache, since None is cached for paths
+# that have no catalog entry.
+_NOT_CACHED = object()
+
+
+class ClientDisconnected(Exception):
+    """
+    Raised when content is written for a client that has disconnected.
+    """
+    pass
+
 
 class StreamerListener(nectar_listener.DownloadEventListener):
     """
     This DownloadEventListener subclass's purpose is to set the
     response headers on the given HTTP request. This includes setting
     the cache-control header with the max-age which is loaded from the
-    streamer configuration file.
+    streamer configuration file. When the download is shared through the
+    streamer's content cache, the response headers and the outcome of the
+    download are recorded on the fetch instead, and every client sets up its
+    own response from the fetch.
     """
 
-    def __init__(self, request, streamer_config):
+    def __init__(self, request, streamer_config, fetch=None):
         """
         Initialize a StreamerNectarListener.
 
@@ -34,10 +58,13 @@ class StreamerListener(nectar_listener.DownloadEventListener):
         :type  request:         twisted.web.server.Request
         :param streamer_config: The configuration for this streamer instance.
         :type  streamer_config: ConfigParser.SafeConfigParser
+        :param fetch:           The cache fetch the download is written to, if any.
+        :type  fetch:           pulp.streamer.cache.Fetch
         """
         super(StreamerListener, self).__init__()
         self.request = request
         self.streamer_config = streamer_config
+        self.fetch = fetch
         logger.debug(_('Using {timeout} as the cache timeout value.'.format(
             timeout=streamer_config.get('streamer', 'cache_timeout'))))
 
@@ -50,7 +77,19 @@ class StreamerListener(nectar_listener.DownloadEventListener):
         :param report: The download report for this request.
         :type  report: nectar.report.DownloadReport
         """
-        for header_key, header_value in report.headers.items():
+        if self.fetch is not None:
+            self.fetch.set_headers(report.headers)
+            return
+        self.set_response_headers(report.headers)
+
+    def set_response_headers(self, headers):
+        """
+        Set the given headers on the response, along with the cache-control header.
+
+        :param headers: The headers received from the upstream server.
+        :type  headers: dict
+        """
+        for header_key, header_value in headers.items():
             self.request.setHeader(header_key, header_value)
 
         max_age = {'max_age': self.streamer_config.get('streamer', 'cache_timeout')}
@@ -65,13 +104,25 @@ class StreamerListener(nectar_listener.DownloadEventListener):
         likely not 0, since most servers provide pages detailing the problem that
         occurred.
 
+        Downloads canceled because nobody wants the content any longer are not failures,
+        and there is no response left to clean up for them.
+
         :param report: The download report for this request.
         :type  report: nectar.report.DownloadReport
         """
+        if report.state == DOWNLOAD_CANCELED:
+            logger.debug(_('Download of {url} was canceled.').format(url=report.url))
+            return
         error_report = report.error_report.copy()
         error_report['url'] = report.url
+        # Downloads that fail without an HTTP response carry no response code.
+        error_report.setdefault('response_code', None)
+        error_report.setdefault('response_msg', report.error_msg)
         logger.info(_('Download of %(url)s failed: HTTP %(response_code)s '
                       '%(response_msg)s' % error_report))
+        if self.fetch is not None:
+            # The clients of a shared download make their own attempt when it fails.
+            return
 
         # Currently Nectar returns headers with a content-length even
         # when it doesn't download anything.
@@ -87,6 +138,8 @@ class StreamerListener(nectar_listener.DownloadEventListener):
         :param report: The download report for this request.
         :type  report: nectar.report.DownloadReport
         """
+        if self.fetch is not None:
+            self.fetch.succeeded = True
         catalog_entry = report.data['catalog_entry']
         pulp_request = report.data['client_request'].getHeader(PULP_STREAM_REQUEST_HEADER)
         if not pulp_request:
@@ -101,6 +154,155 @@ class StreamerListener(nectar_listener.DownloadEventListener):
                 pass
 
 
+class DownloaderCache(object):
+    """
+    Keeps a downloader per importer so that the plugin and the downloader configuration,
+    TLS material included, are not rebuilt for every request. For HTTP downloaders, a
+    requests session is kept with it so that connections to the upstream server are
+    reused. The kept downloader is only a template: every request is given a copy of it,
+    so per-download state such as the event listener, cancellation and the set of
+    upstream locations that failed is not shared between requests. A downloader is
+    replaced as soon as the importer document it was built from changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> _CachedDownloader
+        self._downloaders = {}
+
+    @staticmethod
+    def _key(catalog_entry):
+        """
+        Get the key of the downloader for a catalog entry. Downloaders depend on the URL
+        scheme and on the options stored with the entry, as well as on the importer.
+
+        :param catalog_entry: The catalog entry to download.
+        :type  catalog_entry: pulp.server.db.model.LazyCatalogEntry
+        :return: The downloader key.
+        :rtype:  tuple
+        """
+        scheme = urlparse(catalog_entry.url).scheme.lower()
+        options = tuple(sorted((k, repr(v)) for k, v in catalog_entry.data.items()))
+        return catalog_entry.importer_id, scheme, options
+
+    @contextmanager
+    def get(self, catalog_entry):
+        """
+        Get a downloader for the catalog entry, building one if there is no downloader
+        for the current revision of the importer. The downloader belongs to the caller,
+        but shares its configuration and session with other requests, so it must only be
+        used within the context.
+
+        :param catalog_entry: The catalog entry to download.
+        :type  catalog_entry: pulp.server.db.model.LazyCatalogEntry
+        :return: A context manager that provides the downloader.
+        :raise pulp.plugins.loader.exceptions.PluginNotFound: the importer was not found.
+        """
+        revision = repo_controller.get_importer_revision(catalog_entry.importer_id)
+        key = self._key(catalog_entry)
+        with self._lock:
+            cached = self._downloaders.get(key)
+            if cached is not None and cached.revision == revision:
+                cached.users += 1
+            else:
+                cached = None
+        if cached is None:
+            cached = self._build(catalog_entry, key, revision)
+        try:
+            yield cached.copy()
+        finally:
+            self._release(cached)
+
+    def _build(self, catalog_entry, key, revision):
+        """
+        Build a downloader for the catalog entry and replace the stale one, if any.
+
+        :param catalog_entry: The catalog entry to download.
+        :type  catalog_entry: pulp.server.db.model.LazyCatalogEntry
+        :param key:           The downloader key.
+        :type  key:           tuple
+        :param revision:      The current revision of the importer.
+        :type  revision:      str
+        :return: The new downloader, in use by the caller.
+        :rtype:  _CachedDownloader
+        """
+        importer, config = repo_controller.get_importer_by_id(catalog_entry.importer_id)
+        downloader = importer.get_downloader(config, catalog_entry.url, **catalog_entry.data)
+        cached = _CachedDownloader(downloader, revision)
+        with self._lock:
+            stale = self._downloaders.get(key)
+            self._downloaders[key] = cached
+            if stale is not None:
+                stale.retired = True
+        if stale is not None:
+            self._release(stale, 0)
+        return cached
+
+    def _release(self, cached, count=1):
+        """
+        Release a downloader, finalizing it once it is retired and no longer in use.
+
+        :param cached: The downloader to release.
+        :type  cached: _CachedDownloader
+        :param count:  The number of uses to release.
+        :type  count:  int
+        """
+        with self._lock:
+            cached.users -= count
+            finalize = cached.retired and cached.users == 0 and not cached.finalized
+            if finalize:
+                cached.finalized = True
+        if finalize:
+            cached.finalize()
+
+
+class _CachedDownloader(object):
+    """
+    A downloader kept by the DownloaderCache, along with the requests session shared by
+    the copies of HTTP downloaders.
+    """
+
+    def __init__(self, downloader, revision):
+        """
+        :param downloader: The downloader.
+        :type  downloader: nectar.downloaders.base.Downloader
+        :param revision:   The revision of the importer the downloader was built from.
+        :type  revision:   str
+        """
+        self.downloader = downloader
+        self.revision = revision
+        self.users = 1
+        self.retired = False
+        self.finalized = False
+        self.session = None
+        if isinstance(downloader, nectar_threaded.HTTPThreadedDownloader):
+            self.session = nectar_threaded.build_session(downloader.config)
+
+    def copy(self):
+        """
+        Get a copy of the downloader for a single request.
+
+        :return: A downloader with its own download state.
+        :rtype:  nectar.downloaders.base.Downloader
+        """
+        downloader = copy.copy(self.downloader)
+        downloader.event_listener = nectar_listener.DownloadEventListener()
+        downloader.is_canceled = False
+        if self.session is not None:
+            downloader.failed_netlocs = set()
+            # nectar builds a new session, and so a new connection pool, for every download.
+            downloader._download_one = functools.partial(downloader._fetch, session=self.session)
+        return downloader
+
+    def finalize(self):
+        """
+        Release the resources held by the downloader configuration and the session.
+        """
+        if self.session is not None:
+            self.session.close()
+        self.downloader.config.finalize()
+
+
 class Streamer(resource.Resource):
     """
     Define the web resource that streams content from the upstream repository
@@ -119,6 +321,15 @@ class Streamer(resource.Resource):
         """
         resource.Resource.__init__(self)
         self.config = config
+        self.downloaders = DownloaderCache()
+        self.catalog_cache = TTLCache(config.getint('streamer', 'catalog_cache_size'),
+                                      config.getint('streamer', 'catalog_cache_ttl'))
+        self.catalog_cache_negative_ttl = config.getint('streamer', 'catalog_cache_negative_ttl')
+        self.cache = None
+        cache_size = config.getint('streamer', 'cache_size')
+        if cache_size > 0:
+            self.cache = ContentCache(config.get('streamer', 'cache_dir'),
+                                      cache_size * 1024 * 1024)
 
     def render_GET(self, request):
         """
@@ -151,8 +362,7 @@ class Streamer(resource.Resource):
         catalog_path = urlparse(request.uri).path
         with Responder(request) as responder:
             try:
-                catalog_entry = model.LazyCatalogEntry.objects(
-                    path=catalog_path).order_by('importer_id').first()
+                catalog_entry = self._get_catalog_entry(catalog_path)
                 if not catalog_entry:
                     raise DoesNotExist()
                 self._download(catalog_entry, request, responder)
@@ -165,15 +375,43 @@ class Streamer(resource.Resource):
                         ' which is not valid.')
                 logger.error(msg.format(rel=catalog_path))
                 request.setResponseCode(INTERNAL_SERVER_ERROR)
+            except ClientDisconnected:
+                logger.debug(_('The client requesting "{rel}" disconnected.').format(
+                    rel=catalog_path))
             except Exception:
                 logger.exception(_('An unexpected error occurred while handling the request.'))
                 request.setResponseCode(INTERNAL_SERVER_ERROR)
 
+    def _get_catalog_entry(self, catalog_path):
+        """
+        Get the catalog entry for a path, using the catalog entry cache. Paths without a
+        catalog entry are cached too, for a shorter time.
+
+        :param catalog_path: The path of the requested content.
+        :type  catalog_path: str
+        :return: The catalog entry, or None if there is no entry for the path.
+        :rtype:  pulp.server.db.model.LazyCatalogEntry
+        """
+        catalog_entry = self.catalog_cache.get(catalog_path, _NOT_CACHED)
+        if catalog_entry is not _NOT_CACHED:
+            return catalog_entry
+        catalog_entry = model.LazyCatalogEntry.objects(
+            path=catalog_path).order_by('importer_id').first()
+        if catalog_entry is None:
+            self.catalog_cache.set(catalog_path, None, ttl=self.catalog_cache_negative_ttl)
+        else:
+            self.catalog_cache.set(catalog_path, catalog_entry)
+        return catalog_entry
+
     def _download(self, catalog_entry, request, responder):
         """
-        Build a nectar downloader and download the content from the catalog entry.
-        The download is performed by the alternate content container, so it is possible
-        to use the streamer in conjunction with alternate content sources.
+        Serve the content of the catalog entry from the local cache when possible.
+
+        When the content is not cached, the request joins the download of the content
+        that is already in progress for another client, if any. Otherwise the content is
+        downloaded into the cache by a separate thread. Either way, the content is
+        streamed to the client from the cache as it arrives, so that every client reads
+        at its own pace and a slow client does not hold up the download for the others.
 
         :param catalog_entry:   The catalog entry to download.
         :type  catalog_entry:   pulp.server.db.model.LazyCatalogEntry
@@ -182,20 +420,124 @@ class Streamer(resource.Resource):
         :param responder:       The file-like object that nectar should write to.
         :type  responder:       Responder
         """
-        importer, config = repo_controller.get_importer_by_id(catalog_entry.importer_id)
+        if self.cache is None:
+            self._download_upstream(catalog_entry, request, responder)
+            return
+
+        cached = self.cache.get(catalog_entry.path)
+        if cached is not None:
+            logger.debug(_('Serving {path} from the cache.').format(path=catalog_entry.path))
+            StreamerListener(request, self.config).set_response_headers(cached.headers)
+            cached.stream(responder.write)
+            return
+
+        fetch, owner = self.cache.join(catalog_entry.path)
+        if owner:
+            download = threading.Thread(target=self._fetch_upstream,
+                                        args=(catalog_entry, request, fetch))
+            download.daemon = True
+            download.start()
+
+        content = fetch.wait()
+        if content is None:
+            # The shared download failed before producing any content, so this request
+            # makes its own attempt in order to report the upstream failure to its client.
+            self._download_upstream(catalog_entry, request, responder)
+            return
+        StreamerListener(request, self.config).set_response_headers(fetch.headers or {})
+        if not fetch.stream(content, responder.write):
+            msg = _('The shared download of {path} failed while it was being streamed.')
+            logger.warning(msg.format(path=catalog_entry.path))
+            # The response is incomplete, so the client must not reuse the connection.
+            reactor.callFromThread(request.loseConnection)
+
+    def _fetch_upstream(self, catalog_entry, request, fetch):
+        """
+        Download the content from the catalog entry into a cache fetch and close it.
+
+        :param catalog_entry:   The catalog entry to download.
+        :type  catalog_entry:   pulp.server.db.model.LazyCatalogEntry
+        :param request:         The client content request that started the fetch.
+        :type  request:         twisted.web.server.Request
+        :param fetch:           The cache fetch to download the content into.
+        :type  fetch:           pulp.streamer.cache.Fetch
+        """
+        try:
+            self._download_upstream(catalog_entry, request, fetch, fetch)
+        except Exception:
+            logger.exception(_('The shared download of {path} failed.').format(
+                path=catalog_entry.path))
+        finally:
+            fetch.close()
+
+    def _download_upstream(self, catalog_entry, request, responder, fetch=None):
+        """
+        Download the content from the catalog entry using the nectar downloader kept for
+        the entry's importer. The download is performed by the alternate content container,
+        so it is possible to use the streamer in conjunction with alternate content sources.
+
+        :param catalog_entry:   The catalog entry to download.
+        :type  catalog_entry:   pulp.server.db.model.LazyCatalogEntry
+        :param request:         The client content request.
+        :type  request:         twisted.web.server.Request
+        :param responder:       The file-like object that nectar should write to.
+        :type  responder:       Responder
+        :param fetch:           The cache fetch the content is written to, if any.
+        :type  fetch:           pulp.streamer.cache.Fetch
+        """
         data = {'catalog_entry': catalog_entry, 'client_request': request}
-        download_request = nectar_request.DownloadRequest(catalog_entry.url, responder, data=data)
-        downloader = importer.get_downloader(config, catalog_entry.url,
-                                             **catalog_entry.data)
-        downloader.event_listener = StreamerListener(request, self.config)
-        downloader.download_one(download_request, events=True)
-        downloader.config.finalize()
+        with self.downloaders.get(catalog_entry) as downloader:
+            downloader.event_listener = StreamerListener(request, self.config, fetch)
+            if fetch is None:
+                responder = _ClientWriter(responder, downloader)
+            else:
+                # Nobody needs the content once every client has stopped reading it.
+                fetch.abandoned = downloader.cancel
+            download_request = nectar_request.DownloadRequest(
+                catalog_entry.url, responder, data=data)
+            downloader.download_one(download_request, events=True)
+
+
+class _ClientWriter(object):
+    """
+    The file-like object nectar writes the content of a download for a single client to.
+    Nectar reports any exception raised while writing as a failed download, so the
+    download is canceled instead once the client has disconnected.
+    """
+
+    def __init__(self, responder, downloader):
+        """
+        :param responder:  The responder for the client.
+        :type  responder:  Responder
+        :param downloader: The downloader performing the download.
+        :type  downloader: nectar.downloaders.base.Downloader
+        """
+        self.responder = responder
+        self.downloader = downloader
+
+    def write(self, data):
+        """
+        Write the data to the client, canceling the download if the client is gone.
+
+        :param data: A string to write.
+        :type  data: str
+        """
+        try:
+            self.responder.write(data)
+        except ClientDisconnected:
+            self.downloader.cancel()
 
 
+@implementer(IPushProducer)
 class Responder(object):
     """
     This class provides an object that can be provided to Nectar instead of a
     file which forwards all write calls to the Twisted Request.
+
+    The responder is registered as a streaming producer for the request, so writes
+    block while the transport has asked for a pause, which keeps the data buffered
+    for slow clients bounded. Once the client disconnects, writes raise
+    ClientDisconnected so the download can be canceled.
     """
 
     def __init__(self, request):
@@ -206,6 +548,9 @@ class Responder(object):
         :type  request: twisted.web.server.Request
         """
         self.request = request
+        self.disconnected = False
+        self._writable = threading.Event()
+        self._writable.set()
 
     def __enter__(self):
         """
@@ -214,6 +559,7 @@ class Responder(object):
         :return: The instance of the class.
         :rtype:  Responder
         """
+        reactor.callFromThread(self.register)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -231,6 +577,42 @@ class Responder(object):
         """
         self.close()
 
+    def register(self):
+        """
+        Register as the producer for the request and watch for the client disconnecting.
+        This must be called in the reactor thread.
+        """
+        self.request.registerProducer(self, True)
+        self.request.notifyFinish().addErrback(self.connection_lost)
+
+    def connection_lost(self, failure):
+        """
+        Stop producing when the connection to the client is lost.
+
+        :param failure: The reason the connection was lost.
+        :type  failure: twisted.python.failure.Failure
+        """
+        self.stopProducing()
+
+    def pauseProducing(self):
+        """
+        Block writes until the transport is ready for more data.
+        """
+        self._writable.clear()
+
+    def resumeProducing(self):
+        """
+        Allow writes to continue.
+        """
+        self._writable.set()
+
+    def stopProducing(self):
+        """
+        Abort the response; any further write raises ClientDisconnected.
+        """
+        self.disconnected = True
+        self._writable.set()
+
     def close(self):
         """
         Forward the call to close the 'file' to the request.finish method.
@@ -244,11 +626,11 @@ class Responder(object):
 
         If finish is called after the client disconnects, a RuntimeError is
         raised and Twisted logs the stack trace. Clients disconnecting before
-        Twisted gets around to calling ``finish`` is not uncommon. Ultimately
-        there should be a handler that stops streaming if the client disconnects,
-        but that is tricky with the current implementation's use of threads.
+        Twisted gets around to calling ``finish`` is not uncommon.
         """
         try:
+            if not self.disconnected:
+                self.request.unregisterProducer()
             self.request.finish()
         except RuntimeError as e:
             logger.debug(str(e))
@@ -256,9 +638,14 @@ class Responder(object):
     def write(self, data):
         """
         Forward the data to the request.write method, which writes data to
-        the transport (if not responding to a HEAD request).
+        the transport (if not responding to a HEAD request). This blocks while
+        the transport has paused the producer.
 
         :param data: A string to write to the response.
         :type  data: str
+        :raise ClientDisconnected: the client has disconnected.
         """
+        self._writable.wait()
+        if self.disconnected:
+            raise ClientDisconnected()
         reactor.callFromThread(self.request.write, data)
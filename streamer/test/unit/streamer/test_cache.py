@@ -0,0 +1,182 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from mock import Mock
+
+from pulp.common.compat import unittest
+from pulp.streamer.cache import ContentCache, PARTIAL_PREFIX
+
+
+class TestContentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ContentCache(self.cache_dir, 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _add(self, cache, path, data, headers=None):
+        fetch, owner = cache.join(path)
+        self.assertTrue(owner)
+        fetch.set_headers(headers or {})
+        fetch.write(data)
+        fetch.succeeded = True
+        fetch.close()
+        return fetch
+
+    def _read(self, cached):
+        chunks = []
+        cached.stream(chunks.append)
+        return ''.join(chunks)
+
+    def test_get_missing(self):
+        """
+        Paths that have not been cached are not found.
+        """
+        self.assertTrue(self.cache.get('/a/path') is None)
+
+    def test_add_and_get(self):
+        """
+        Content and headers written through a successful fetch are cached.
+        """
+        self._add(self.cache, '/a/path', 'abc', {'Content-Type': 'text/plain'})
+
+        cached = self.cache.get('/a/path')
+        self.assertEqual({'Content-Type': 'text/plain'}, cached.headers)
+        self.assertEqual('abc', self._read(cached))
+        self.assertEqual(3, self.cache.size)
+
+    def test_failed_fetch_not_cached(self):
+        """
+        The content of a failed fetch is discarded.
+        """
+        fetch, owner = self.cache.join('/a/path')
+        fetch.write('abc')
+        fetch.close()
+
+        self.assertTrue(self.cache.get('/a/path') is None)
+        self.assertFalse(os.path.exists(fetch.partial_path))
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_too_large_not_cached(self):
+        """
+        Content larger than the cache itself is not cached.
+        """
+        self._add(self.cache, '/a/path', 'a' * 11)
+        self.assertTrue(self.cache.get('/a/path') is None)
+        self.assertEqual(0, self.cache.size)
+
+    def test_evict_least_recently_used(self):
+        """
+        The least recently used content is evicted once the cache is full.
+        """
+        self._add(self.cache, '/a', 'aaaa')
+        self._add(self.cache, '/b', 'bbbb')
+        self._read(self.cache.get('/a'))
+
+        self._add(self.cache, '/c', 'cccc')
+        self.assertTrue(self.cache.get('/b') is None)
+        self.assertEqual('aaaa', self._read(self.cache.get('/a')))
+        self.assertEqual('cccc', self._read(self.cache.get('/c')))
+        self.assertEqual(8, self.cache.size)
+
+    def test_join_in_progress(self):
+        """
+        Joining a path that is already being fetched returns the existing fetch.
+        """
+        fetch, owner = self.cache.join('/a/path')
+        joined, joined_owner = self.cache.join('/a/path')
+        self.assertTrue(owner)
+        self.assertFalse(joined_owner)
+        self.assertTrue(fetch is joined)
+
+    def test_load_existing(self):
+        """
+        Content already in the cache directory is adopted and partial files are removed.
+        """
+        self._add(self.cache, '/a/path', 'abc')
+        partial = os.path.join(self.cache_dir, PARTIAL_PREFIX + 'leftover')
+        open(partial, 'w').close()
+
+        cache = ContentCache(self.cache_dir, 10)
+        self.assertEqual('abc', self._read(cache.get('/a/path')))
+        self.assertFalse(os.path.exists(partial))
+
+    def test_stream_follows_fetch(self):
+        """
+        A joined request streams the content as it is written by the fetch owner.
+        """
+        fetch, owner = self.cache.join('/a/path')
+        fetch.write('abc')
+        chunks = []
+        result = []
+        content = fetch.wait()
+        follower = threading.Thread(
+            target=lambda: result.append(fetch.stream(content, chunks.append)))
+        follower.start()
+        fetch.write('def')
+        fetch.succeeded = True
+        fetch.close()
+        follower.join()
+
+        self.assertEqual('abcdef', ''.join(chunks))
+        self.assertEqual([True], result)
+
+    def test_readers(self):
+        """
+        The fetch counts the requests streaming from it, including ones that fail to write.
+        """
+        fetch, owner = self.cache.join('/a/path')
+        fetch.write('abc')
+        content = fetch.wait()
+        self.assertEqual(1, fetch.readers)
+
+        def write(data):
+            raise IOError()
+
+        self.assertRaises(IOError, fetch.stream, content, write)
+        self.assertEqual(0, fetch.readers)
+        self.assertTrue(content.closed)
+
+    def test_abandoned(self):
+        """
+        The fetch is abandoned when the last reader stops before the download is done.
+        """
+        fetch, owner = self.cache.join('/a/path')
+        fetch.abandoned = Mock()
+        fetch.write('abc')
+        first = fetch.wait()
+        second = fetch.wait()
+
+        def write(data):
+            raise IOError()
+
+        self.assertRaises(IOError, fetch.stream, first, write)
+        self.assertEqual(0, fetch.abandoned.call_count)
+        self.assertRaises(IOError, fetch.stream, second, write)
+        fetch.abandoned.assert_called_once_with()
+
+    def test_not_abandoned_when_done(self):
+        """
+        The fetch is not abandoned by readers that stream all the content.
+        """
+        fetch, owner = self.cache.join('/a/path')
+        fetch.abandoned = Mock()
+        fetch.write('abc')
+        content = fetch.wait()
+        fetch.succeeded = True
+        fetch.close()
+
+        self.assertTrue(fetch.stream(content, lambda data: None))
+        self.assertEqual(0, fetch.abandoned.call_count)
+
+    def test_wait_failed(self):
+        """
+        Waiting on a fetch that failed before producing content returns None.
+        """
+        fetch, owner = self.cache.join('/a/path')
+        fetch.close()
+        self.assertTrue(fetch.wait() is None)
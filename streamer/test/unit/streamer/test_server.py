@@ -2,11 +2,17 @@ from httplib import INTERNAL_SERVER_ERROR, NOT_FOUND
 
 from mock import Mock, patch
 from mongoengine import NotUniqueError
+from nectar.config import DownloaderConfig
+from nectar.downloaders.threaded import HTTPThreadedDownloader
+from nectar.report import DOWNLOAD_CANCELED
 from twisted.web.server import Request
 
 from pulp.common.compat import unittest
 from pulp.plugins.loader.exceptions import PluginNotFound
+from pulp.server.util import TTLCache
 from pulp.streamer import Responder, StreamerListener, Streamer
+from pulp.streamer.server import (ClientDisconnected, DownloaderCache, _ClientWriter,
+                                  _NOT_CACHED)
 
 
 MODULE_PREFIX = 'pulp.streamer.server.'
@@ -32,6 +38,19 @@ class TestStreamerListener(unittest.TestCase):
                                     listener.request.setHeader.call_args_list):
             self.assertEqual(expected, actual[0])
 
+    def test_download_headers_fetch(self):
+        """
+        The headers are recorded on the cache fetch, if there is one, rather than on
+        the response.
+        """
+        mock_report = Mock(headers={'key': 'value'})
+        mock_fetch = Mock()
+        listener = StreamerListener(Mock(), Mock(), mock_fetch)
+
+        listener.download_headers(mock_report)
+        mock_fetch.set_headers.assert_called_once_with({'key': 'value'})
+        self.assertEqual(0, listener.request.setHeader.call_count)
+
     def test_download_failed(self):
         """
         The content-length is corrected since Nectar does not download anything if
@@ -49,6 +68,33 @@ class TestStreamerListener(unittest.TestCase):
                          listener.request.setHeader.call_args_list[1][0])
         listener.request.setResponseCode.assert_called_once_with('418')
 
+    @patch(MODULE_PREFIX + 'logger')
+    def test_download_failed_canceled(self, mock_logger):
+        """
+        Canceled downloads are not reported as failures and leave the response alone.
+        """
+        mock_report = Mock(state=DOWNLOAD_CANCELED, url='https://example.com/teapot/')
+        listener = StreamerListener(Mock(), Mock())
+
+        listener.download_failed(mock_report)
+        mock_logger.debug.assert_called_with('Download of https://example.com/teapot/ '
+                                             'was canceled.')
+        self.assertEqual(0, mock_logger.info.call_count)
+        self.assertEqual(0, listener.request.setHeader.call_count)
+        self.assertEqual(0, listener.request.setResponseCode.call_count)
+
+    def test_download_failed_fetch(self):
+        """
+        The response is left alone when the download is shared through a cache fetch.
+        """
+        mock_report = Mock()
+        mock_report.error_report = {'response_code': '418', 'response_msg': 'I am a teapot.'}
+        listener = StreamerListener(Mock(), Mock(), Mock())
+
+        listener.download_failed(mock_report)
+        self.assertEqual(0, listener.request.setHeader.call_count)
+        self.assertEqual(0, listener.request.setResponseCode.call_count)
+
     @patch(MODULE_PREFIX + 'model.DeferredDownload', autospec=True)
     def test_download_succeeded(self, mock_deferred_download):
         """Assert a deferred download entry is made."""
@@ -67,6 +113,16 @@ class TestStreamerListener(unittest.TestCase):
         mock_deferred_download.assert_called_once_with(unit_id='abc', unit_type_id='123')
         mock_deferred_download.return_value.save.assert_called_once_with()
 
+    @patch(MODULE_PREFIX + 'model.DeferredDownload', autospec=True)
+    def test_download_succeeded_fetch(self, mock_deferred_download):
+        """Assert the cache fetch is marked as succeeded."""
+        mock_data = {'catalog_entry': Mock(), 'client_request': Mock()}
+        mock_fetch = Mock(succeeded=False)
+        listener = StreamerListener(Mock(), Mock(), mock_fetch)
+
+        listener.download_succeeded(Mock(data=mock_data))
+        self.assertTrue(mock_fetch.succeeded)
+
     @patch(MODULE_PREFIX + 'model.DeferredDownload', autospec=True)
     def test_download_succeeded_entry_not_unique(self, mock_deferred_download):
         """Assert NotUniqueError exceptions are ignored."""
@@ -104,9 +160,69 @@ class TestStreamer(unittest.TestCase):
 
     def setUp(self):
         self.config = Mock()
+        self.config.getint.return_value = 0
         self.streamer = Streamer(self.config)
         self.request = Mock(spec=Request)
 
+    @patch(MODULE_PREFIX + 'ContentCache', autospec=True)
+    def test_init_cache(self, mock_cache):
+        """
+        The content cache is created with the configured directory and size.
+        """
+        self.config.getint.return_value = 2
+        self.config.get.return_value = '/cache/dir'
+
+        streamer = Streamer(self.config)
+        self.config.getint.assert_any_call('streamer', 'cache_size')
+        self.config.get.assert_called_with('streamer', 'cache_dir')
+        mock_cache.assert_called_once_with('/cache/dir', 2 * 1024 * 1024)
+        self.assertEqual(mock_cache.return_value, streamer.cache)
+
+    def test_init_cache_disabled(self):
+        """
+        The content cache is disabled when the cache size is 0.
+        """
+        self.assertTrue(self.streamer.cache is None)
+
+    @patch(MODULE_PREFIX + 'model')
+    def test_get_catalog_entry(self, mock_model):
+        """
+        Catalog entries are looked up once and then served from the catalog cache.
+        """
+        self.streamer.catalog_cache = TTLCache(10, 60)
+        query_set = mock_model.LazyCatalogEntry.objects.return_value
+        entry = query_set.order_by.return_value.first.return_value
+
+        self.assertEqual(entry, self.streamer._get_catalog_entry('/a/resource'))
+        self.assertEqual(entry, self.streamer._get_catalog_entry('/a/resource'))
+        mock_model.LazyCatalogEntry.objects.assert_called_once_with(path='/a/resource')
+        query_set.order_by.assert_called_once_with('importer_id')
+
+    @patch(MODULE_PREFIX + 'model')
+    def test_get_catalog_entry_negative(self, mock_model):
+        """
+        Paths without a catalog entry are cached with the negative TTL.
+        """
+        self.streamer.catalog_cache = Mock()
+        self.streamer.catalog_cache.get.return_value = _NOT_CACHED
+        self.streamer.catalog_cache_negative_ttl = 5
+        query_set = mock_model.LazyCatalogEntry.objects.return_value
+        query_set.order_by.return_value.first.return_value = None
+
+        self.assertTrue(self.streamer._get_catalog_entry('/a/resource') is None)
+        self.streamer.catalog_cache.set.assert_called_once_with('/a/resource', None, ttl=5)
+
+    @patch(MODULE_PREFIX + 'model')
+    def test_get_catalog_entry_cached_negative(self, mock_model):
+        """
+        A cached negative lookup does not query the database.
+        """
+        self.streamer.catalog_cache = TTLCache(10, 60)
+        self.streamer.catalog_cache.set('/a/resource', None)
+
+        self.assertTrue(self.streamer._get_catalog_entry('/a/resource') is None)
+        self.assertEqual(0, mock_model.LazyCatalogEntry.objects.call_count)
+
     @patch(MODULE_PREFIX + 'reactor', autospec=True)
     def test_render_GET(self, mock_reactor):
         """
@@ -149,7 +265,7 @@ class TestStreamer(unittest.TestCase):
         When the _download helper method fails to find the plugin, it raises an exception.
         """
         self.request.uri = '/a/resource?k=v'
-        mock_repo_controller.get_importer_by_id.side_effect = PluginNotFound()
+        mock_repo_controller.get_importer_revision.side_effect = PluginNotFound()
 
         self.streamer._handle_get(self.request)
         self.request.setResponseCode.assert_called_once_with(INTERNAL_SERVER_ERROR)
@@ -169,6 +285,22 @@ class TestStreamer(unittest.TestCase):
                                                   'with path "/a/resource".')
         self.request.setResponseCode.assert_called_once_with(NOT_FOUND)
 
+    @patch(MODULE_PREFIX + 'logger')
+    @patch(MODULE_PREFIX + 'Streamer._download')
+    @patch(MODULE_PREFIX + 'model')
+    def test_handle_get_client_disconnected(self, mock_model, mock_download, mock_logger):
+        """
+        When the client disconnects, the download is abandoned without an error.
+        """
+        self.request.uri = '/a/resource?k=v'
+        mock_download.side_effect = ClientDisconnected()
+
+        self.streamer._handle_get(self.request)
+        mock_logger.debug.assert_called_once_with('The client requesting "/a/resource" '
+                                                  'disconnected.')
+        self.assertEqual(0, mock_logger.exception.call_count)
+        self.assertEqual(0, self.request.setResponseCode.call_count)
+
     @patch(MODULE_PREFIX + 'logger')
     @patch(MODULE_PREFIX + 'model')
     def test_handle_get_unexpected_failure(self, mock_model, mock_logger):
@@ -185,45 +317,404 @@ class TestStreamer(unittest.TestCase):
                                                       'handling the request.')
         self.request.setResponseCode.assert_called_once_with(INTERNAL_SERVER_ERROR)
 
+    @patch(MODULE_PREFIX + 'Streamer._download_upstream')
+    def test_download_no_cache(self, mock_download_upstream):
+        """
+        When the cache is disabled, the content is downloaded from upstream.
+        """
+        self.streamer._download('entry', self.request, 'responder')
+        mock_download_upstream.assert_called_once_with('entry', self.request, 'responder')
+
+    @patch(MODULE_PREFIX + 'Streamer._download_upstream')
+    def test_download_cached(self, mock_download_upstream):
+        """
+        Cached content is streamed from the cache with the stored headers.
+        """
+        self.streamer.cache = Mock()
+        cached = self.streamer.cache.get.return_value
+        cached.headers = {'key': 'value'}
+        mock_catalog = Mock(path='/a/path')
+        mock_responder = Mock()
+
+        self.streamer._download(mock_catalog, self.request, mock_responder)
+        self.streamer.cache.get.assert_called_once_with('/a/path')
+        cached.stream.assert_called_once_with(mock_responder.write)
+        self.request.setHeader.assert_any_call('key', 'value')
+        self.assertEqual(0, self.streamer.cache.join.call_count)
+        self.assertEqual(0, mock_download_upstream.call_count)
+
+    @patch(MODULE_PREFIX + 'threading.Thread')
+    @patch(MODULE_PREFIX + 'Streamer._download_upstream')
+    def test_download_owner(self, mock_download_upstream, mock_thread):
+        """
+        The request that starts a fetch downloads the content into it in a separate
+        thread, and streams the content from the fetch like any other request.
+        """
+        self.streamer.cache = Mock()
+        self.streamer.cache.get.return_value = None
+        mock_fetch = Mock(headers={'key': 'value'})
+        mock_fetch.stream.return_value = True
+        self.streamer.cache.join.return_value = (mock_fetch, True)
+        mock_catalog = Mock(path='/a/path')
+        mock_responder = Mock()
+
+        self.streamer._download(mock_catalog, self.request, mock_responder)
+        mock_thread.assert_called_once_with(target=self.streamer._fetch_upstream,
+                                            args=(mock_catalog, self.request, mock_fetch))
+        self.assertTrue(mock_thread.return_value.daemon)
+        mock_thread.return_value.start.assert_called_once_with()
+        mock_fetch.stream.assert_called_once_with(mock_fetch.wait.return_value,
+                                                  mock_responder.write)
+        self.request.setHeader.assert_any_call('key', 'value')
+        self.assertEqual(0, mock_download_upstream.call_count)
+
+    @patch(MODULE_PREFIX + 'Streamer._download_upstream')
+    def test_fetch_upstream(self, mock_download_upstream):
+        """
+        The content is downloaded into the fetch, which is then closed.
+        """
+        mock_catalog = Mock()
+        mock_fetch = Mock()
+
+        self.streamer._fetch_upstream(mock_catalog, self.request, mock_fetch)
+        mock_download_upstream.assert_called_once_with(mock_catalog, self.request,
+                                                       mock_fetch, mock_fetch)
+        mock_fetch.close.assert_called_once_with()
+
+    @patch(MODULE_PREFIX + 'logger')
+    @patch(MODULE_PREFIX + 'Streamer._download_upstream')
+    def test_fetch_upstream_failure(self, mock_download_upstream, mock_logger):
+        """
+        The fetch is closed even when the download raises an exception.
+        """
+        mock_fetch = Mock()
+        mock_download_upstream.side_effect = OSError('Disaster.')
+
+        self.streamer._fetch_upstream(Mock(path='/a/path'), self.request, mock_fetch)
+        mock_logger.exception.assert_called_once_with('The shared download of /a/path failed.')
+        mock_fetch.close.assert_called_once_with()
+
+    @patch(MODULE_PREFIX + 'Streamer._download_upstream')
+    def test_download_joined(self, mock_download_upstream):
+        """
+        A request for content that is already being downloaded streams it from the fetch.
+        """
+        self.streamer.cache = Mock()
+        self.streamer.cache.get.return_value = None
+        mock_fetch = Mock(headers={'key': 'value'})
+        mock_fetch.stream.return_value = True
+        self.streamer.cache.join.return_value = (mock_fetch, False)
+        mock_responder = Mock()
+
+        self.streamer._download(Mock(), self.request, mock_responder)
+        mock_fetch.stream.assert_called_once_with(mock_fetch.wait.return_value,
+                                                  mock_responder.write)
+        self.request.setHeader.assert_any_call('key', 'value')
+        self.assertEqual(0, mock_download_upstream.call_count)
+
+    @patch(MODULE_PREFIX + 'Streamer._download_upstream')
+    def test_download_joined_failed(self, mock_download_upstream):
+        """
+        When the shared download fails before producing content, the request makes its own
+        download attempt.
+        """
+        self.streamer.cache = Mock()
+        self.streamer.cache.get.return_value = None
+        mock_fetch = Mock()
+        mock_fetch.wait.return_value = None
+        self.streamer.cache.join.return_value = (mock_fetch, False)
+        mock_catalog = Mock()
+        mock_responder = Mock()
+
+        self.streamer._download(mock_catalog, self.request, mock_responder)
+        mock_download_upstream.assert_called_once_with(mock_catalog, self.request,
+                                                       mock_responder)
+        self.assertEqual(0, mock_fetch.stream.call_count)
+
+    @patch(MODULE_PREFIX + 'reactor')
+    @patch(MODULE_PREFIX + 'Streamer._download_upstream')
+    def test_download_joined_failed_while_streaming(self, mock_download_upstream,
+                                                    mock_reactor):
+        """
+        When the shared download fails part way through, the client connection is closed.
+        """
+        self.streamer.cache = Mock()
+        self.streamer.cache.get.return_value = None
+        mock_fetch = Mock(headers={})
+        mock_fetch.stream.return_value = False
+        self.streamer.cache.join.return_value = (mock_fetch, False)
+
+        self.streamer._download(Mock(), self.request, Mock())
+        mock_reactor.callFromThread.assert_called_once_with(self.request.loseConnection)
+        self.assertEqual(0, mock_download_upstream.call_count)
+
     @patch(MODULE_PREFIX + 'nectar_request.DownloadRequest')
-    @patch(MODULE_PREFIX + 'repo_controller', autospec=True)
-    def test_download(self, mock_repo_controller, mock_dl_request):
+    def test_download_upstream(self, mock_dl_request):
         # Setup
         mock_catalog = Mock()
-        mock_catalog.importer_id = 'mock_id'
-        mock_catalog.url = 'http://dev.null/'
-        mock_catalog.data = {'k': 'v'}
         mock_request = Mock()
-        mock_data = {'catalog_entry': mock_catalog, 'client_request': mock_request}
         mock_responder = Mock()
-        mock_importer = Mock()
-        mock_importer_config = Mock()
-        mock_downloader = mock_importer.get_downloader.return_value
-        mock_repo_controller.get_importer_by_id.return_value = (mock_importer,
-                                                                mock_importer_config)
+        self.streamer.downloaders = Mock()
+        mock_downloader = self.streamer.downloaders.get.return_value.__enter__.return_value
 
         # Test
-        self.streamer._download(mock_catalog, mock_request, mock_responder)
-        mock_repo_controller.get_importer_by_id.assert_called_once_with(mock_catalog.importer_id)
-        mock_dl_request.assert_called_once_with(mock_catalog.url, mock_responder, data=mock_data)
-        mock_importer.get_downloader.assert_called_once_with(
-            mock_importer_config, mock_catalog.url, **mock_catalog.data)
+        self.streamer._download_upstream(mock_catalog, mock_request, mock_responder)
+        self.streamer.downloaders.get.assert_called_once_with(mock_catalog)
+        data = mock_dl_request.call_args[1]['data']
+        self.assertEqual(mock_catalog, data['catalog_entry'])
+        self.assertEqual(mock_request, data['client_request'])
         self.assertEqual(mock_request, mock_downloader.event_listener.request)
         self.assertEqual(self.config, mock_downloader.event_listener.streamer_config)
+        writer = mock_dl_request.call_args[0][1]
+        self.assertTrue(isinstance(writer, _ClientWriter))
+        self.assertEqual(mock_responder, writer.responder)
+        self.assertEqual(mock_downloader, writer.downloader)
+        mock_dl_request.assert_called_once_with(mock_catalog.url, writer, data=data)
         mock_downloader.download_one.assert_called_once_with(mock_dl_request.return_value,
                                                              events=True)
-        mock_downloader.config.finalize.assert_called_once_with()
+        self.streamer.downloaders.get.return_value.__exit__.assert_called_once_with(
+            None, None, None)
+
+    @patch(MODULE_PREFIX + 'model')
+    @patch(MODULE_PREFIX + 'logger')
+    @patch(MODULE_PREFIX + 'nectar_threaded.build_session')
+    @patch(MODULE_PREFIX + 'repo_controller', autospec=True)
+    def test_download_upstream_client_disconnected(self, mock_repo_controller,
+                                                   mock_build_session, mock_logger, mock_model):
+        """
+        When the client disconnects, nectar cancels the download rather than failing it.
+        """
+        mock_importer = Mock()
+        mock_importer.get_downloader.return_value = HTTPThreadedDownloader(DownloaderConfig())
+        mock_repo_controller.get_importer_by_id.return_value = (mock_importer, Mock())
+        response = mock_build_session.return_value.get.return_value
+        response.status_code = 200
+        response.headers = {'content-length': '3'}
+        response.iter_content.return_value = iter(['a', 'b', 'c'])
+        mock_catalog = Mock(url='http://dev.null/file', data={})
+        mock_responder = Mock()
+        mock_responder.write.side_effect = ClientDisconnected()
+
+        self.streamer._download_upstream(mock_catalog, self.request, mock_responder)
+        mock_responder.write.assert_called_once_with('a')
+        mock_logger.debug.assert_any_call('Download of http://dev.null/file was canceled.')
+        self.assertEqual(0, mock_logger.info.call_count)
+        self.assertEqual(0, self.request.setResponseCode.call_count)
+        self.assertEqual(0, mock_model.DeferredDownload.call_count)
+
+    @patch(MODULE_PREFIX + 'nectar_request.DownloadRequest')
+    def test_download_upstream_fetch(self, mock_dl_request):
+        """
+        The download into a fetch is canceled once the fetch is abandoned.
+        """
+        mock_fetch = Mock()
+        self.streamer.downloaders = Mock()
+        mock_downloader = self.streamer.downloaders.get.return_value.__enter__.return_value
+
+        self.streamer._download_upstream(Mock(), Mock(), mock_fetch, mock_fetch)
+        self.assertEqual(mock_downloader.cancel, mock_fetch.abandoned)
+        self.assertEqual(mock_fetch, mock_downloader.event_listener.fetch)
+        mock_dl_request.assert_called_once_with(mock_dl_request.call_args[0][0], mock_fetch,
+                                                data=mock_dl_request.call_args[1]['data'])
+
+
+@patch(MODULE_PREFIX + 'repo_controller', autospec=True)
+class TestDownloaderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = DownloaderCache()
+        self.catalog_entry = Mock(importer_id='mock_id', url='http://dev.null/', data={'k': 'v'})
+
+    def test_build(self, mock_repo_controller):
+        """
+        A downloader is built from the importer of the catalog entry.
+        """
+        mock_importer = Mock()
+        mock_config = Mock()
+        mock_repo_controller.get_importer_by_id.return_value = (mock_importer, mock_config)
+
+        with self.cache.get(self.catalog_entry) as downloader:
+            self.assertEqual(mock_importer.get_downloader.return_value.config, downloader.config)
+        mock_repo_controller.get_importer_revision.assert_called_once_with('mock_id')
+        mock_repo_controller.get_importer_by_id.assert_called_once_with('mock_id')
+        mock_importer.get_downloader.assert_called_once_with(mock_config, 'http://dev.null/',
+                                                             k='v')
+        self.assertEqual(0, downloader.config.finalize.call_count)
+
+    def test_reuse(self, mock_repo_controller):
+        """
+        The downloader is reused while the importer revision is unchanged.
+        """
+        mock_importer = Mock()
+        mock_repo_controller.get_importer_by_id.return_value = (mock_importer, Mock())
+
+        with self.cache.get(self.catalog_entry) as first:
+            pass
+        with self.cache.get(self.catalog_entry) as second:
+            pass
+        self.assertTrue(first.config is second.config)
+        self.assertEqual(1, mock_importer.get_downloader.call_count)
+        self.assertEqual(2, mock_repo_controller.get_importer_revision.call_count)
+
+    @patch(MODULE_PREFIX + 'nectar_threaded.build_session')
+    def test_per_request_state(self, mock_build_session, mock_repo_controller):
+        """
+        Each request gets its own HTTP downloader, with no failed locations or
+        cancellation carried over from earlier requests, which share a single session.
+        """
+        mock_importer = Mock()
+        mock_importer.get_downloader.return_value = HTTPThreadedDownloader(DownloaderConfig())
+        mock_repo_controller.get_importer_by_id.return_value = (mock_importer, Mock())
+
+        with self.cache.get(self.catalog_entry) as first:
+            first.failed_netlocs.add('dev.null')
+            first.cancel()
+        with self.cache.get(self.catalog_entry) as second:
+            self.assertEqual(set(), second.failed_netlocs)
+            self.assertFalse(second.is_canceled)
+        self.assertFalse(first is second)
+        mock_build_session.assert_called_once_with(first.config)
+        self.assertEqual(mock_build_session.return_value,
+                         second._download_one.keywords['session'])
+
+    @patch(MODULE_PREFIX + 'nectar_threaded.build_session')
+    def test_session_closed(self, mock_build_session, mock_repo_controller):
+        """
+        The shared session is closed along with the stale downloader.
+        """
+        mock_importer = Mock()
+        mock_importer.get_downloader.side_effect = \
+            lambda *args, **kwargs: HTTPThreadedDownloader(DownloaderConfig())
+        mock_repo_controller.get_importer_by_id.return_value = (mock_importer, Mock())
+        mock_repo_controller.get_importer_revision.return_value = 'one'
+
+        with self.cache.get(self.catalog_entry):
+            pass
+        self.assertEqual(0, mock_build_session.return_value.close.call_count)
+        mock_repo_controller.get_importer_revision.return_value = 'two'
+        with self.cache.get(self.catalog_entry):
+            pass
+        mock_build_session.return_value.close.assert_called_once_with()
+
+    def test_revision_changed(self, mock_repo_controller):
+        """
+        The downloader is rebuilt when the importer changes, and the stale one is finalized.
+        """
+        mock_importer = Mock()
+        mock_importer.get_downloader.side_effect = lambda *args, **kwargs: Mock()
+        mock_repo_controller.get_importer_by_id.return_value = (mock_importer, Mock())
+        mock_repo_controller.get_importer_revision.return_value = 'one'
+
+        with self.cache.get(self.catalog_entry) as first:
+            pass
+        mock_repo_controller.get_importer_revision.return_value = 'two'
+        with self.cache.get(self.catalog_entry) as second:
+            pass
+        self.assertFalse(first.config is second.config)
+        first.config.finalize.assert_called_once_with()
+        self.assertEqual(0, second.config.finalize.call_count)
+
+    def test_retired_in_use(self, mock_repo_controller):
+        """
+        A stale downloader is not finalized until it is no longer in use.
+        """
+        mock_importer = Mock()
+        mock_importer.get_downloader.side_effect = lambda *args, **kwargs: Mock()
+        mock_repo_controller.get_importer_by_id.return_value = (mock_importer, Mock())
+        mock_repo_controller.get_importer_revision.return_value = 'one'
+
+        with self.cache.get(self.catalog_entry) as first:
+            mock_repo_controller.get_importer_revision.return_value = 'two'
+            with self.cache.get(self.catalog_entry):
+                pass
+            self.assertEqual(0, first.config.finalize.call_count)
+        first.config.finalize.assert_called_once_with()
+
+    def test_separate_options(self, mock_repo_controller):
+        """
+        Catalog entries with different options do not share a downloader.
+        """
+        mock_importer = Mock()
+        mock_repo_controller.get_importer_by_id.return_value = (mock_importer, Mock())
+        other_entry = Mock(importer_id='mock_id', url='http://dev.null/', data={'k': 'w'})
+
+        with self.cache.get(self.catalog_entry):
+            pass
+        with self.cache.get(other_entry):
+            pass
+        self.assertEqual(2, mock_importer.get_downloader.call_count)
+
+
+class TestClientWriter(unittest.TestCase):
+
+    def test_write(self):
+        """
+        `write` forwards the data to the responder.
+        """
+        writer = _ClientWriter(Mock(), Mock())
+        writer.write('some data')
+        writer.responder.write.assert_called_once_with('some data')
+        self.assertEqual(0, writer.downloader.cancel.call_count)
+
+    def test_write_disconnected(self):
+        """
+        The download is canceled when the client disconnects.
+        """
+        writer = _ClientWriter(Mock(), Mock())
+        writer.responder.write.side_effect = ClientDisconnected()
+        writer.write('some data')
+        writer.downloader.cancel.assert_called_once_with()
 
 
 class TestResponder(unittest.TestCase):
 
-    def test_enter(self):
+    @patch(MODULE_PREFIX + 'reactor')
+    def test_enter(self, mock_reactor):
         """
-        `__enter__` returns the instance of the class.
+        `__enter__` returns the instance of the class and registers it as a producer.
         """
         responder = Responder(Mock())
         result = responder.__enter__()
         self.assertTrue(responder is result)
+        mock_reactor.callFromThread.assert_called_once_with(responder.register)
+
+    def test_register(self):
+        """
+        `register` registers a streaming producer and watches for the connection to be lost.
+        """
+        responder = Responder(Mock())
+        responder.register()
+        responder.request.registerProducer.assert_called_once_with(responder, True)
+        responder.request.notifyFinish.return_value.addErrback.assert_called_once_with(
+            responder.connection_lost)
+
+    def test_connection_lost(self):
+        """
+        Writes raise ClientDisconnected once the connection is lost.
+        """
+        responder = Responder(Mock())
+        responder.connection_lost(Mock())
+        self.assertTrue(responder.disconnected)
+        self.assertRaises(ClientDisconnected, responder.write, 'some data')
+
+    def test_pause_resume(self):
+        """
+        Pausing the producer blocks writes until it is resumed.
+        """
+        responder = Responder(Mock())
+        responder.pauseProducing()
+        self.assertFalse(responder._writable.is_set())
+        responder.resumeProducing()
+        self.assertTrue(responder._writable.is_set())
+
+    def test_stop_while_paused(self):
+        """
+        Stopping the producer wakes up a paused writer, which raises ClientDisconnected.
+        """
+        responder = Responder(Mock())
+        responder.pauseProducing()
+        responder.stopProducing()
+        self.assertRaises(ClientDisconnected, responder.write, 'some data')
 
     def test_exit(self):
         """
@@ -248,6 +739,15 @@ class TestResponder(unittest.TestCase):
         """Assert the ``finish`` method is called by its wrapper"""
         responder = Responder(Mock())
         responder.finish_wrapper()
+        responder.request.unregisterProducer.assert_called_once_with()
+        responder.request.finish.assert_called_once_with()
+
+    def test_finish_wrapper_disconnected(self):
+        """Assert the producer is not unregistered when the client disconnected"""
+        responder = Responder(Mock())
+        responder.stopProducing()
+        responder.finish_wrapper()
+        self.assertEqual(0, responder.request.unregisterProducer.call_count)
         responder.request.finish.assert_called_once_with()
 
     @patch(MODULE_PREFIX + 'logger')
@@ -279,5 +779,6 @@ class TestResponder(unittest.TestCase):
             r.write('some data')
 
         mock_calls = mock_reactor.callFromThread.call_args_list
-        self.assertEqual((mock_request.write, 'some data'), mock_calls[0][0])
-        self.assertEqual((r.finish_wrapper,), mock_calls[1][0])
+        self.assertEqual((r.register,), mock_calls[0][0])
+        self.assertEqual((mock_request.write, 'some data'), mock_calls[1][0])
+        self.assertEqual((r.finish_wrapper,), mock_calls[2][0])